@@ -36,6 +36,7 @@ logging.getLogger().addHandler(handler)
 
 import networkx as nx
 import pandas as pd
+import hashlib
 import os
 import logging
 import plotly.graph_objects as go
@@ -44,12 +45,17 @@ from datetime import datetime
 
 
 try:
-    from utils.file_utils import extract_text_from_pdf
+    from utils.file_utils import copy_stream_to_file
     from utils.embedding import load_embedding_model
     from model.book_metadata import BookMetadata # Assuming this class definition exists
     from services.cache_service import (load_cached_books, get_cached_book_list,
                                        select_cached_book, save_book_metadata,
-                                       delete_cached_book)
+                                       delete_cached_book,
+                                       clear_cached_books, get_cache_stats)
+    from services.graph_cache import get_graph_cache
+    from services.prefetch_service import build_book_graph, prefetch_book, record_book_load, warm_up
+    from services.ingest_service import extract_book_text
+    from core.segmentation import segment_book
     from services.graph_service import (create_graph_from_book_metadata, create_graph_from_text,
                                        create_interactive_visualization,
                                        analyze_book_entities, analyze_book_relationships)
@@ -235,6 +241,8 @@ st.markdown("""
 # Initialize session state variables if they don't exist
 if 'current_graph' not in st.session_state:
     st.session_state.current_graph = None
+if 'current_graph_handle' not in st.session_state:
+    st.session_state.current_graph_handle = None
 if 'current_book_metadata' not in st.session_state:
     st.session_state.current_book_metadata = None
 if 'processing_status' not in st.session_state:
@@ -266,6 +274,9 @@ def main():
     st.markdown('### Dynamic Book Relationship Visualization System')
     st.markdown('Explore the intricate network of characters, locations, events, and more from your favorite books.')
 
+    # Build the most frequently loaded books in the background (once per process)
+    warm_up()
+
     # Create tabs for the app
     tabs = st.tabs(["Book Selection", "Graph Visualization", "Entity Explorer", "Analysis", "Settings"])
 
@@ -319,6 +330,12 @@ def book_selection_tab():
             )
             st.session_state.selected_cached_book = selected_book # Update state on change
 
+            # Start building the selected book's graph now so "Load Book" can reuse it
+            if selected_book and selected_book != "No cached books found":
+                prefetch_book(selected_book)
+                if get_graph_cache().is_cached(selected_book):
+                    st.caption("⚡ Ready to load")
+
             if st.button("Load Book", key="load_book_btn"):
                 if selected_book and selected_book != "No cached books found":
                     with st.spinner(f"Loading '{selected_book}'..."):
@@ -535,9 +552,17 @@ def entity_explorer_tab():
             st.info(f"No entities of type '{entity_type}' found.")
             return
 
+        # The book's entities are already in memory, so filter them here rather than re-reading the tables
+        table_entities = entities
+        if entity_type == 'CHARACTER':
+            significance_options = sorted({e.get('significance') for e in entities if e.get('significance')})
+            selected_significance = st.multiselect("Filter by significance:", significance_options)
+            if selected_significance:
+                table_entities = [e for e in entities if e.get('significance') in selected_significance]
+
         entity_data = []
         try:
-            for entity in entities:
+            for entity in table_entities:
                 # Basic info common to all entities
                 entry = {
                     'Key': entity.get('_key', 'N/A'),
@@ -1059,7 +1084,7 @@ def settings_tab():
                     if (st.session_state.current_book_metadata and
                         st.session_state.current_book_metadata.book_name == book_to_delete):
                         st.session_state.current_book_metadata = None
-                        st.session_state.current_graph = None
+                        set_current_graph(None)
                         st.session_state.current_book_name = ""
                         st.warning("The currently loaded book was deleted.")
                     # Clear potentially stale cached list selection state
@@ -1073,6 +1098,18 @@ def settings_tab():
     else:
         st.info("The local cache is empty.")
 
+    # Artifact store usage
+    cache_stats = get_cache_stats()
+    with st.expander("Cache Statistics", expanded=False):
+        st.write(f"**Size:** {cache_stats['bytes'] / 1024 / 1024:.1f} MB of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB ({cache_stats['policy'].upper()} eviction)")
+        st.write(f"**Entries:** {cache_stats['entries']} ({cache_stats['pinned_entries']} pinned), **Objects:** {cache_stats['objects']}")
+        st.write(f"**Hits:** {cache_stats['hits']}, **Misses:** {cache_stats['misses']}, **Hit Rate:** {cache_stats['hit_rate']:.0%}")
+        st.write(f"**Evictions:** {cache_stats['evictions']} ({cache_stats['evicted_bytes'] / 1024 / 1024:.1f} MB freed)")
+        graph_stats = get_graph_cache().stats()
+        st.write(f"**Shared graphs in memory:** {graph_stats['graphs']} ({graph_stats['in_use']} in use), "
+                 f"{graph_stats['bytes'] / 1024 / 1024:.1f} MB of {graph_stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+                 f"**Hits:** {graph_stats['hits']}, **Misses:** {graph_stats['misses']}")
+
     # Clear All Cache Button (use with caution)
     st.markdown("---")
     # Use a more descriptive key for the button
@@ -1082,7 +1119,7 @@ def settings_tab():
             st.session_state.confirm_delete_cache = False
 
         st.session_state.confirm_delete_cache = True
-        st.warning("This will delete all processed book data from the 'data' directory. Are you sure?")
+        st.warning("This will delete all processed book data from the 'data' directory and the cache store. Are you sure?")
 
     if st.session_state.get('confirm_delete_cache', False):
          # Show confirmation buttons only if primary button was clicked
@@ -1108,9 +1145,12 @@ def settings_tab():
                         else:
                              st.info("'data' directory not found.")
 
+                        # Unpinned books and extraction results in the artifact store
+                        deleted_count += clear_cached_books()
+
                         # Reset session state if a book was loaded
                         st.session_state.current_book_metadata = None
-                        st.session_state.current_graph = None
+                        set_current_graph(None)
                         st.session_state.current_book_name = ""
                         if 'selected_cached_book' in st.session_state:
                             del st.session_state['selected_cached_book'] # Clear selection state too
@@ -1137,6 +1177,15 @@ def settings_tab():
 
 # Helper functions for the UI
 
+def set_current_graph(handle):
+    """Point the session at a shared graph handle (or None), releasing the previous one"""
+    previous = st.session_state.get('current_graph_handle')
+    if previous is not None and previous is not handle:
+        previous.release()
+    st.session_state.current_graph_handle = handle
+    st.session_state.current_graph = handle.graph if handle else None
+
+
 def load_book(book_name):
     """Load a book from cache by name (Synchronous)"""
     logger.info(f"Attempting to load book: {book_name}")
@@ -1150,36 +1199,37 @@ def load_book(book_name):
             logger.warning(f"Book '{book_name}' not found in cache or failed to load.")
             # Reset state
             st.session_state.current_book_metadata = None
-            st.session_state.current_graph = None
+            set_current_graph(None)
             st.session_state.current_book_name = ""
             st.rerun() # Rerun to show the error and clear UI
             return # Stop execution here
 
-        logger.info(f"Book metadata loaded for '{book_name}'. Creating graph...")
-        # Create graph directly from the loaded book metadata
-        # This might also take time
-        graph = create_graph_from_book_metadata(book_metadata)
+        logger.info(f"Book metadata loaded for '{book_name}'. Getting shared graph...")
+        # The graph is built once per process and shared by every session;
+        # if a prefetch or another session is already building it we wait for that build
+        handle = get_graph_cache().acquire(book_name, lambda: build_book_graph(book_name))
 
-        if not isinstance(graph, nx.Graph): # Check if it's a valid graph object
+        if handle is None: # Build failed or did not return a NetworkX graph
              st.session_state.error_message = "Error: Failed to create graph from loaded book metadata. Check logs."
-             logger.error(f"Failed to create graph for '{book_name}' from metadata. Result was not a NetworkX graph.")
+             logger.error(f"Failed to create graph for '{book_name}' from metadata.")
              # Clear potentially partially loaded data
              st.session_state.current_book_metadata = None
-             st.session_state.current_graph = None
+             set_current_graph(None)
              st.session_state.current_book_name = ""
              st.rerun() # Rerun to show the error
              return # Stop execution
 
         # Log if graph is empty but proceed
-        if graph.number_of_nodes() == 0:
+        if handle.graph.number_of_nodes() == 0:
              logger.warning(f"Created an empty graph (0 nodes) for '{book_name}'.")
              # Decide if this should be an error or just a warning shown to user later
 
         # Update session state successfully
-        st.session_state.current_book_metadata = book_metadata
-        st.session_state.current_graph = graph
+        st.session_state.current_book_metadata = handle.book_metadata
+        set_current_graph(handle)
         st.session_state.current_book_name = book_name
         st.session_state.error_message = "" # Clear error on success
+        record_book_load(book_name)
 
         logger.info(f"Successfully loaded book and created graph for: {book_name}")
         # Let the calling function handle the rerun via spinner exit
@@ -1189,7 +1239,7 @@ def load_book(book_name):
         st.session_state.error_message = f"An unexpected error occurred loading '{book_name}': {e}"
         # Reset state in case of failure
         st.session_state.current_book_metadata = None
-        st.session_state.current_graph = None
+        set_current_graph(None)
         st.session_state.current_book_name = ""
         st.rerun() # Rerun to show error
 
@@ -1225,8 +1275,10 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
 
     logger.info(f"Saving uploaded file temporarily to: {temp_file_path}")
     try:
-        with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Stream the upload to disk in chunks rather than copying it as one buffer,
+        # hashing it on the way to key the extracted-text cache
+        pdf_hasher = hashlib.sha256()
+        copy_stream_to_file(uploaded_file, temp_file_path, hasher=pdf_hasher)
     except Exception as e:
         logger.error(f"Failed to write temporary file: {e}", exc_info=True)
         st.session_state.error_message = f"Error saving uploaded file: {e}"
@@ -1236,7 +1288,7 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
 
     # Reset state for the new processing task
     st.session_state.current_book_metadata = None
-    st.session_state.current_graph = None
+    set_current_graph(None)
     st.session_state.current_book_name = ""
     st.session_state.error_message = ""
 
@@ -1251,21 +1303,28 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
     start_time = time.time()
 
     try:
-        # 1. Extract Text
+        # 1. Extract Text (or reuse an earlier extraction of the same PDF bytes)
         update_progress("Extracting text from PDF...")
-        book_text = extract_text_from_pdf(str(temp_file_path)) # Pass path as string
-
-        # Check if extraction failed
-        if not book_text or (isinstance(book_text, str) and book_text.startswith("Error")):
-            processing_error = f"Text extraction failed: {book_text}" if book_text else "Text extraction failed: Empty result."
+        try:
+            book_text, text_info = extract_book_text(temp_file_path, pdf_hasher.hexdigest(),
+                                                     status_callback=update_progress)
+        except Exception as e:
+            processing_error = str(e) if str(e).startswith("Text extraction failed") else f"Text extraction failed: {e}"
             logger.error(processing_error)
             raise ValueError(processing_error) # Raise exception to go to finally block
 
         text_length = len(book_text)
-        logger.info(f"Text extracted successfully. Length: {text_length}.")
+        logger.info(f"Text extracted successfully. Length: {text_length}, pages: {text_info['page_count']}.")
         update_progress(f"Text extracted ({text_length:,} chars). Creating graph...")
 
-        graph, book_meta = create_graph_from_text(book_text, status_callback=update_progress)
+        # Chapters found from headings are reused instead of asking the model for them
+        book_structure = segment_book(book_text, text_info["page_offsets"])
+        update_progress(f"Detected {len(book_structure.chapters)} chapters. Creating graph...")
+
+        # Title/author from the PDF's document info and the page count spare the metadata call
+        book_info = {**text_info.get("pdf_info", {}), "page_count": text_info["page_count"]}
+        graph, book_meta = create_graph_from_text(book_text, status_callback=update_progress,
+                                                  book_structure=book_structure, book_info=book_info)
         
         # --- Add this logging ---
         logger.info(f"Returned book_meta type: {type(book_meta)}")
@@ -1295,6 +1354,8 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
         book_meta.processing_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         # Also set original file name
         book_meta.file_name = uploaded_file.name
+        # The PDF's real page count beats the model's estimate
+        book_meta.pages_count = text_info["page_count"]
 
         update_progress("Graph created. Saving metadata...")
 
@@ -1307,10 +1368,13 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
             logger.info(f"Book metadata saved successfully for '{book_name}'.")
             update_progress("Book processed and saved to cache.")
 
-        # 4. Update Session State (on success)
+        # 4. Update Session State (on success); share the new graph with other sessions under the
+        # name the library and store use, dropping any graph built from an earlier processing
+        cache_key = book_meta.book_name or book_name
+        get_graph_cache().invalidate(cache_key)
         st.session_state.current_book_metadata = book_meta
-        st.session_state.current_graph = graph
-        st.session_state.current_book_name = book_name
+        set_current_graph(get_graph_cache().put(cache_key, graph, book_meta))
+        st.session_state.current_book_name = cache_key
         st.session_state.error_message = "" # Clear any previous error
 
         end_time = time.time()
@@ -1326,7 +1390,7 @@ def process_uploaded_book(uploaded_file, book_name, status_callback=None):
         st.session_state.error_message = final_error_message
         # Reset potentially partially filled state
         st.session_state.current_book_metadata = None
-        st.session_state.current_graph = None
+        set_current_graph(None)
         st.session_state.current_book_name = ""
         update_progress(f"Error: {final_error_message}") # Update status one last time
 
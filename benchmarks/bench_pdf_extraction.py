@@ -0,0 +1,83 @@
+"""
+PDF text extraction time, sequential vs. sharded across worker processes,
+and the token reduction from stripping PDF artifacts.
+
+Uses the PDF given on the command line, or generates a text-only PDF with
+the requested number of pages.
+
+Run from the project root:
+    python benchmarks/bench_pdf_extraction.py [book.pdf] [--pages 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.file_utils import extract_pages_from_pdf, join_pages
+from utils.text_normalizer import normalize_pages
+
+
+def write_sample_pdf(path, pages, lines_per_page=40):
+    """Write a minimal PDF with ``pages`` pages of Helvetica text, a running header and page numbers"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_num in range(pages):
+        body = [f"Line {line} of page {page_num + 1}: the quick brown fox jumps over the lazy dog"
+                for line in range(lines_per_page)]
+        lines = " T* ".join(f"({line}) Tj" for line in ["A SAMPLE BOOK"] + body + [str(page_num + 1)])
+        stream = f"BT /F1 10 Tf 12 TL 50 760 Td {lines} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % obj_id + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to extract (default: generate one)")
+    parser.add_argument("--pages", type=int, default=1000, help="Pages of the generated PDF")
+    args = parser.parse_args()
+
+    pdf_path = args.pdf
+    if pdf_path is None:
+        pdf_path = os.path.join(tempfile.mkdtemp(), "sample.pdf")
+        write_sample_pdf(pdf_path, args.pages)
+
+    results = {}
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        pages = extract_pages_from_pdf(pdf_path, workers=workers)
+        text, page_offsets = join_pages(pages)
+        results[workers] = time.perf_counter() - start
+        print(f"{workers:>3} worker(s): {results[workers]:7.2f}s  "
+              f"({len(page_offsets)} pages, {len(text):,} chars)")
+    if len(results) > 1:
+        print(f"Speedup: {results[1] / results[max(results)]:.1f}x")
+
+    start = time.perf_counter()
+    _, report = normalize_pages(pages)
+    print(f"Normalization: {time.perf_counter() - start:.2f}s, ~{report['raw_tokens_est']:,} -> "
+          f"~{report['tokens_est']:,} tokens ({report['token_reduction']:.1%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
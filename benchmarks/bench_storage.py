@@ -0,0 +1,85 @@
+"""
+Disk footprint and load time of cached book artifacts on the sample books.
+
+Compares the pretty-printed JSON in data/ with compact JSON compressed by
+every available codec and with the per-type Parquet tables.
+
+Run from the project root:
+    python benchmarks/bench_storage.py
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import columnar_store
+from utils.compression import available_codecs, compress, decompress
+
+DATA_DIR = Path("data")
+REPEATS = 20
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def bench_book(book_dir):
+    files = [book_dir / name for name in ("metadata.json", "entities.json", "relationships.json")]
+    files = [f for f in files if f.exists()]
+    raw = {f.name: f.read_bytes() for f in files}
+    parsed = {name: json.loads(data) for name, data in raw.items()}
+    compact = {name: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+               for name, data in parsed.items()}
+
+    rows = [("pretty json", sum(len(d) for d in raw.values()),
+             _timed(lambda: [json.loads(d) for d in raw.values()]))]
+    rows.append(("compact json", sum(len(d) for d in compact.values()),
+                 _timed(lambda: [json.loads(d) for d in compact.values()])))
+
+    for codec in available_codecs():
+        blobs = [compress(d, codec) for d in compact.values()]
+        rows.append((codec, sum(len(b) for b in blobs),
+                     _timed(lambda: [json.loads(decompress(b)) for b in blobs])))
+
+    if columnar_store.is_available():
+        tables = {}
+        for kind in ("entities", "relationships"):
+            for type_name, records in parsed.get(f"{kind}.json", {}).items():
+                tables[(kind, type_name)] = columnar_store.encode_records(records)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        buffers = [pa.py_buffer(b) for b in tables.values()]
+        size = sum(len(b) for b in tables.values()) + len(compact.get("metadata.json", b""))
+        rows.append(("parquet", size,
+                     _timed(lambda: [columnar_store.table_to_records(pq.read_table(pa.BufferReader(b)))
+                                     for b in buffers])))
+    return rows
+
+
+def main():
+    book_dirs = sorted(d for d in DATA_DIR.iterdir() if (d / "metadata.json").exists())
+    totals = {}
+    for book_dir in book_dirs:
+        print(f"\n{book_dir.name}")
+        print(f"  {'format':<14}{'bytes':>10}{'ratio':>8}{'load ms':>10}")
+        rows = bench_book(book_dir)
+        baseline = rows[0][1]
+        for name, size, ms in rows:
+            print(f"  {name:<14}{size:>10,}{size / baseline:>8.2f}{ms:>10.2f}")
+            total = totals.setdefault(name, [0, 0.0])
+            total[0] += size
+            total[1] += ms
+
+    print("\nall sample books")
+    baseline = totals["pretty json"][0]
+    for name, (size, ms) in totals.items():
+        print(f"  {name:<14}{size:>10,}{size / baseline:>8.2f}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
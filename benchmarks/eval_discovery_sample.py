@@ -0,0 +1,92 @@
+"""
+Accuracy of entity/relationship discovery on a stratified sample of a book
+compared with discovery on the full text.
+
+For each book, discovery runs once on the full text and once per sample
+budget; the types found on the sample are scored against the full-text
+result (precision, recall, Jaccard). With --reference, both are also scored
+against the types that yielded rows in a cached extraction under data/.
+
+Needs GEMINI_API_KEY. Run from the project root:
+    python benchmarks/eval_discovery_sample.py book.pdf [book.txt ...] \\
+        [--budgets 20000 40000] [--reference data/the_little_prince]
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from core.discovery import discover_types
+from core.segmentation import segment_book
+from services.ingest_service import extract_book_text
+
+
+def load_book(path):
+    """Return (text, book_structure) of a PDF or plain-text book"""
+    if path.suffix.lower() == ".pdf":
+        text, info = extract_book_text(path)
+        return text, segment_book(text, info["page_offsets"])
+    text = path.read_text(encoding="utf-8")
+    return text, segment_book(text, None)
+
+
+def reference_types(folder):
+    """Entity and relationship types that yielded rows in a cached extraction"""
+    folder = Path(folder)
+    entities = json.loads((folder / "entities.json").read_text(encoding="utf-8"))
+    relationships = json.loads((folder / "relationships.json").read_text(encoding="utf-8"))
+    return ({name for name, rows in entities.items() if rows},
+            {name for name, rows in relationships.items() if rows})
+
+
+def score(found, expected):
+    """Precision, recall and Jaccard of a set of type names"""
+    found, expected = set(found), set(expected)
+    both = len(found & expected)
+    return {
+        "precision": round(both / len(found), 3) if found else None,
+        "recall": round(both / len(expected), 3) if expected else None,
+        "jaccard": round(both / len(found | expected), 3) if found | expected else None,
+    }
+
+
+def report(label, discovered, expected_entities, expected_relationships):
+    entities = score(discovered.get("Entities", []), expected_entities)
+    relationships = score(discovered.get("Relationships", []), expected_relationships)
+    print(f"  {label:<22} entities P={entities['precision']} R={entities['recall']} J={entities['jaccard']}   "
+          f"relationships P={relationships['precision']} R={relationships['recall']} J={relationships['jaccard']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("books", nargs="+", type=Path, help="PDF or .txt books")
+    parser.add_argument("--budgets", nargs="+", type=int, default=[20000, 40000], help="Sample token budgets")
+    parser.add_argument("--reference", help="Cached extraction folder (one per book, in order)", action="append")
+    parser.add_argument("--model", default="gemini-2.0-flash-lite")
+    args = parser.parse_args()
+
+    llm = ChatGoogleGenerativeAI(model=args.model, api_key=os.environ["GEMINI_API_KEY"], temperature=0)
+    for i, path in enumerate(args.books):
+        text, book_structure = load_book(path)
+        print(f"{path.name}: {len(text):,} chars, {len(book_structure.chapters)} chapters")
+        full = discover_types(llm, text, book_structure, sample_tokens=0)
+        samples = {budget: discover_types(llm, text, book_structure, sample_tokens=budget) for budget in args.budgets}
+
+        print(" vs full-text discovery")
+        for budget, discovered in samples.items():
+            report(f"sample {budget:,} tokens", discovered, full.get("Entities", []), full.get("Relationships", []))
+        if args.reference and i < len(args.reference):
+            expected_entities, expected_relationships = reference_types(args.reference[i])
+            print(f" vs non-empty types in {args.reference[i]}")
+            report("full text", full, expected_entities, expected_relationships)
+            for budget, discovered in samples.items():
+                report(f"sample {budget:,} tokens", discovered, expected_entities, expected_relationships)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import logging
+import os
+
+import numpy as np
+
+# Default input budget for the book text in a relationship prompt (0 sends the whole book)
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("MAGICBOOK_CONTEXT_TOKEN_BUDGET", 60000))
+# Characters of text kept around each mention
+WINDOW_CHARS = 1200
+# Longest passage merged windows may form before they are split, so dense mentions never outgrow the budget
+MAX_PASSAGE_CHARS = 6000
+# Rough characters per model token, for budgeting
+CHARS_PER_TOKEN = 4
+PASSAGE_SEPARATOR = "\n[...]\n"
+
+
+def _snap(text, offset, direction, slack=200):
+    """Move a window edge to the nearest line break, else sentence end, within ``slack`` characters"""
+    offset = min(max(0, offset), len(text))
+    for boundary in ("\n", ". "):
+        if direction < 0:
+            cut = text.rfind(boundary, max(0, offset - slack), offset)
+        else:
+            cut = text.find(boundary, offset, offset + slack)
+        if cut >= 0:
+            return cut + len(boundary)
+    return offset
+
+
+def select_context(text, mention_index, entity_types, token_budget=DEFAULT_TOKEN_BUDGET,
+                   window_chars=WINDOW_CHARS, entity_keys=None):
+    """
+    Pick the passages of a book where the given entity types are mentioned,
+    within a token budget.
+
+    Windows around mentions are merged where they overlap (up to
+    ``MAX_PASSAGE_CHARS``, longer runs are split) and ranked by how
+    many of the requested entity types, then how many distinct entities,
+    they mention, so passages where the entities of a relationship meet come
+    first. The chosen passages are returned in book order.
+
+    Args:
+        text: Book text
+        mention_index: core.mention_index.MentionIndex for the text
+        entity_types: Entity types referenced by the relationship (e.g. ["CHARACTER", "LOCATION"])
+        token_budget: Approximate token budget for the returned context
+        window_chars: Characters kept around each mention
+        entity_keys: Optional keys; windows are then only opened around
+            mentions of these entities (e.g. one shard of a large cast)
+
+    Returns:
+        tuple: (context, stats), or None when the whole text fits the
+        budget, selection is disabled or nothing relevant is mentioned
+    """
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    if not token_budget or mention_index is None or len(text) <= budget_chars:
+        return None
+
+    mask = mention_index.type_mask(entity_types)
+    if entity_keys is not None:
+        key_ids = [mention_index._key_to_id[key] for key in entity_keys if key in mention_index._key_to_id]
+        mask &= np.isin(mention_index.entity_ids, key_ids)
+    if not mask.any():
+        return None
+    positions = mention_index.starts[mask]
+    entity_ids = mention_index.entity_ids[mask]
+    type_names = sorted(set(entity_types))
+    type_lookup = np.asarray([type_names.index(entity_type) if entity_type in type_names else -1
+                              for entity_type in mention_index.entity_types], dtype=np.int32)
+    type_ids = type_lookup[entity_ids]
+
+    # Merge overlapping windows: a new window starts where the gap to the previous mention is too wide
+    half = window_chars // 2
+    new_window = np.empty(len(positions), dtype=bool)
+    new_window[0] = True
+    new_window[1:] = np.diff(positions) > window_chars
+    # Split long runs of dense mentions into spans that leave room for snapping and still fit the budget
+    max_span = max(1, min(MAX_PASSAGE_CHARS, budget_chars // 2) - window_chars)
+    run_start = positions[np.maximum.accumulate(np.where(new_window, np.arange(len(positions)), 0))]
+    span_ids = (positions - run_start) // max_span
+    new_window[1:] |= span_ids[1:] != span_ids[:-1]
+    first = np.flatnonzero(new_window)
+    last = np.append(first[1:], len(positions)) - 1
+
+    windows = []
+    for i, j in zip(first.tolist(), last.tolist()):
+        windows.append({
+            "start": _snap(text, int(positions[i]) - half, -1),
+            "end": _snap(text, int(positions[j]) + half, 1),
+            "types": len(np.unique(type_ids[i:j + 1])),
+            "entities": len(np.unique(entity_ids[i:j + 1])),
+        })
+    windows.sort(key=lambda window: (window["types"], window["entities"]), reverse=True)
+
+    chosen, used = [], 0
+    for window in windows:
+        size = window["end"] - window["start"] + len(PASSAGE_SEPARATOR)
+        if used + size > budget_chars:
+            continue
+        chosen.append(window)
+        used += size
+    if not chosen:
+        return None
+
+    chosen.sort(key=lambda window: window["start"])
+    passages, previous_end = [], 0
+    for window in chosen:
+        # Snapped edges of neighbouring windows may overlap slightly
+        passages.append(text[max(window["start"], previous_end):window["end"]])
+        previous_end = window["end"]
+    context = PASSAGE_SEPARATOR.join(passages)
+    stats = {
+        "passages": len(chosen),
+        "candidate_passages": len(windows),
+        "chars": len(context),
+        "book_chars": len(text),
+        "reduction": round(1 - len(context) / len(text), 4),
+    }
+    logging.info(f"Selected {stats['passages']}/{stats['candidate_passages']} passages for "
+                 f"{', '.join(type_names)}: {stats['chars']:,} of {stats['book_chars']:,} chars")
+    return context, stats
@@ -0,0 +1,196 @@
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+# "replace": co-occurrence rows stand in for the model call; "seed": the model is
+# still called and co-occurrence rows fill in the pairs it missed; "off": disabled
+COOCCURRENCE_MODE = os.environ.get("MAGICBOOK_COOCCURRENCE", "replace").lower()
+# Paragraphs without blank-line breaks (common in PDF text) are cut every this many characters
+PARAGRAPH_MAX_CHARS = 2000
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"'’”)\]]*\s+|\n\s*\n")
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+
+# Relationship types derived from co-occurrence:
+# (window, source type, target type, minimum co-occurrences, record fields)
+COOCCURRENCE_RELATIONSHIPS = {
+    "Interaction_APPEARED_TOGETHER": ("paragraph", "CHARACTER", "CHARACTER", 2,
+                                      ("character1_id", "character2_id")),
+    "Interaction_INTERACTED_WITH": ("sentence", "CHARACTER", "CHARACTER", 3,
+                                    ("character1_id", "character2_id")),
+}
+
+
+def _boundaries(text, pattern, max_chars=None):
+    """Sorted end offsets of the windows delimited by ``pattern``, splitting windows longer than ``max_chars``"""
+    ends = np.fromiter((match.end() for match in pattern.finditer(text)), dtype=np.int64)
+    if not max_chars:
+        return ends
+    edges = np.concatenate(([0], ends, [len(text)]))
+    long_gaps = np.flatnonzero(np.diff(edges) > max_chars)
+    extra = [np.arange(edges[i] + max_chars, edges[i + 1], max_chars, dtype=np.int64) for i in long_gaps]
+    return np.sort(np.concatenate([ends] + extra)) if extra else ends
+
+
+def window_ids(text, mention_index, window):
+    """
+    Assign every mention to a text window.
+
+    Args:
+        text: Book text
+        mention_index: core.mention_index.MentionIndex for the text
+        window: "sentence", "paragraph" or "chapter"
+
+    Returns:
+        numpy.ndarray: Window id per mention (-1 for mentions outside any
+        chapter when ``window`` is "chapter")
+    """
+    if window == "chapter":
+        return mention_index.chapter_ids.astype(np.int64)
+    if window == "sentence":
+        bounds = _boundaries(text, _SENTENCE_END, PARAGRAPH_MAX_CHARS)
+    elif window == "paragraph":
+        bounds = _boundaries(text, _PARAGRAPH_END, PARAGRAPH_MAX_CHARS)
+    else:
+        raise ValueError(f"Unknown co-occurrence window: {window}")
+    return np.searchsorted(bounds, mention_index.starts, side="right")
+
+
+def cooccurrence_pairs(text, mention_index, window, source_type, target_type):
+    """
+    Count how often pairs of entities are mentioned in the same window.
+
+    Mentions are reduced to distinct (window, entity) rows; pairs are then
+    formed by comparing each row with the rows ``d`` places after it in the
+    same window, for every ``d`` up to the largest window, so the work is
+    vectorized over the whole book instead of looping over windows.
+
+    Args:
+        text: Book text
+        mention_index: core.mention_index.MentionIndex for the text
+        window: "sentence", "paragraph" or "chapter"
+        source_type: Entity type of the first endpoint (e.g. "CHARACTER")
+        target_type: Entity type of the second endpoint (e.g. "LOCATION")
+
+    Returns:
+        tuple: (sources, targets, counts, chapters) arrays; sources/targets
+        index ``mention_index.entity_keys`` and chapters holds the chapter id
+        where each pair co-occurs most (-1 if unknown)
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    mask = mention_index.type_mask([source_type, target_type])
+    windows = window_ids(text, mention_index, window)[mask]
+    entities = mention_index.entity_ids[mask].astype(np.int64)
+    chapters = mention_index.chapter_ids[mask].astype(np.int64)
+    keep = windows >= 0
+    windows, entities, chapters = windows[keep], entities[keep], chapters[keep]
+    if len(windows) < 2:
+        return empty, empty, empty, empty
+
+    # Distinct (window, entity) rows, ordered by window then entity
+    n_entities = len(mention_index.entity_keys)
+    rows, first = np.unique(windows * n_entities + entities, return_index=True)
+    row_windows, row_entities, row_chapters = rows // n_entities, rows % n_entities, chapters[first]
+
+    is_source = np.asarray([entity_type == source_type for entity_type in mention_index.entity_types])
+    is_target = np.asarray([entity_type == target_type for entity_type in mention_index.entity_types])
+    sources, targets, pair_chapters = [], [], []
+    for d in range(1, len(rows)):
+        same = np.flatnonzero(row_windows[:-d] == row_windows[d:])
+        if not len(same):
+            break
+        a, b = row_entities[same], row_entities[same + d]
+        if source_type == target_type:
+            sources.append(a)
+            targets.append(b)
+        else:
+            forward = is_source[a] & is_target[b]
+            backward = is_source[b] & is_target[a]
+            sources.extend((a[forward], b[backward]))
+            targets.extend((b[forward], a[backward]))
+            same = np.concatenate((same[forward], same[backward]))
+        pair_chapters.append(row_chapters[same])
+    if not sources:
+        return empty, empty, empty, empty
+
+    pair_codes = np.concatenate(sources) * n_entities + np.concatenate(targets)
+    pair_chapters = np.concatenate(pair_chapters)
+    codes, counts = np.unique(pair_codes, return_counts=True)
+
+    # Chapter where each pair co-occurs most: count (pair, chapter) combinations,
+    # then keep the most frequent chapter per pair
+    n_chapters = int(pair_chapters.max()) + 2
+    combos, combo_counts = np.unique(pair_codes * n_chapters + pair_chapters + 1, return_counts=True)
+    combo_pairs = combos // n_chapters
+    order = np.lexsort((-combo_counts, combo_pairs))
+    best = order[np.concatenate(([True], np.diff(combo_pairs[order]) != 0))]
+    best_chapters = combos[best] % n_chapters - 1
+
+    return codes // n_entities, codes % n_entities, counts, best_chapters
+
+
+def cooccurrence_relationships(text, mention_index, relationship_name, book_structure=None):
+    """
+    Build relationship records from entity co-occurrence, without a model call.
+
+    Records use the id fields of the relationship's prompt (so they map to
+    graph edges like extracted ones), plus ``weight`` (number of windows in
+    which the entities co-occur), ``window``, ``chapter`` (where they
+    co-occur most, when chapters are known) and ``source: "cooccurrence"``.
+
+    Args:
+        text: Book text
+        mention_index: core.mention_index.MentionIndex for the text
+        relationship_name: Relationship type name (e.g. "Interaction_APPEARED_TOGETHER")
+        book_structure: Optional model.book.Book, for chapter titles
+
+    Returns:
+        list: Relationship records sorted by weight, or None if the
+        relationship type is not derived from co-occurrence
+    """
+    spec = COOCCURRENCE_RELATIONSHIPS.get(relationship_name)
+    if spec is None or mention_index is None:
+        return None
+    window, source_type, target_type, min_count, (source_field, target_field) = spec
+
+    start_time = time.perf_counter()
+    sources, targets, counts, chapters = cooccurrence_pairs(text, mention_index, window,
+                                                            source_type, target_type)
+    chapter_titles = [chapter.title for chapter in book_structure.chapters] if book_structure is not None else []
+    keys = mention_index.entity_keys
+    records = []
+    for i in np.flatnonzero(counts >= min_count)[np.argsort(-counts[counts >= min_count], kind="stable")]:
+        chapter = int(chapters[i])
+        records.append({
+            source_field: keys[sources[i]],
+            target_field: keys[targets[i]],
+            "weight": int(counts[i]),
+            "window": window,
+            "chapter": chapter_titles[chapter] if 0 <= chapter < len(chapter_titles) else None,
+            "source": "cooccurrence",
+        })
+    logging.info(f"{relationship_name}: {len(records)} co-occurrence edges ({window} windows, "
+                 f">= {min_count}) in {time.perf_counter() - start_time:.2f}s")
+    return records
+
+
+def merge_relationships(extracted, derived, id_fields):
+    """
+    Add derived rows for the entity pairs the model did not return.
+
+    Args:
+        extracted: Relationship records returned by the model
+        derived: Records from cooccurrence_relationships
+        id_fields: The (source, target) id fields of the relationship
+
+    Returns:
+        list: ``extracted`` followed by the derived rows for new pairs
+    """
+    source_field, target_field = id_fields
+    seen = {frozenset((record.get(source_field), record.get(target_field)))
+            for record in extracted if isinstance(record, dict)}
+    return list(extracted) + [record for record in derived
+                              if frozenset((record[source_field], record[target_field])) not in seen]
@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+
+from core.prompts.entity_discovery import ENTITY_RELATIONSHIPS_DISCOVERY_SYSTEM_PROMPT, ENTITY_RELATIONSHIPS_DISCOVERY_USER_PROMPT
+from core.sampling import sample_text
+from model.entity_types import EntityType, RelationshipType, enum_to_string
+from utils.file_utils import clean_json_string
+
+# Size of the book sample discovery reads (0 sends the whole book)
+DISCOVERY_SAMPLE_TOKENS = int(os.environ.get("MAGICBOOK_DISCOVERY_SAMPLE_TOKENS", 40000))
+
+
+def discover_types(llm, book_text, book_structure=None, sample_tokens=DISCOVERY_SAMPLE_TOKENS):
+    """
+    Ask which entity and relationship types apply to a book.
+
+    Discovery only returns enum names, so it reads a stratified sample: the
+    opening, passages from across the middle (one per chapter when chapters
+    are detected) and the ending, within ``sample_tokens``.
+
+    Args:
+        llm: Chat model
+        book_text: Book text
+        book_structure: Optional model.book.Book
+        sample_tokens: Token budget of the sample (0 sends the whole book)
+
+    Returns:
+        dict: {"Entities": [...], "Relationships": [...]}
+
+    Raises:
+        json.JSONDecodeError: If the model's answer is not JSON
+    """
+    sample = sample_text(book_text, sample_tokens, book_structure, anchor_ends=True) if sample_tokens else book_text
+    if len(sample) < len(book_text):
+        logging.info(f"Discovery reads a {len(sample):,}-char sample of {len(book_text):,} chars")
+        sample = ("(Passages sampled from the opening, middle and ending of the book, "
+                  f"separated by [...])\n{sample}")
+    messages = [
+        {"role": "system", "content": ENTITY_RELATIONSHIPS_DISCOVERY_SYSTEM_PROMPT.format(
+            entity_type_enum=enum_to_string(EntityType),
+            relationship_type_enum=enum_to_string(RelationshipType)
+        )},
+        {"role": "user", "content": ENTITY_RELATIONSHIPS_DISCOVERY_USER_PROMPT.format(book_text=sample)}
+    ]
+    response = llm.invoke(messages)
+    cleaned_json = clean_json_string(response.content)
+    logging.debug(f"Discovery JSON: {cleaned_json}")
+    return json.loads(cleaned_json)
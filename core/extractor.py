@@ -1,11 +1,65 @@
 from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
+import os
+import re
+import threading
 import time
 
 from model.book_metadata import BookMetadata
 from utils.file_utils import clean_json_string
-from utils.simple_cache import load as cache_load, save as cache_save
+from utils.simple_cache import load as cache_load, save as cache_save, writer_lock as cache_writer_lock
+from core.mention_index import build_mention_index
+from core.context_selector import select_context, DEFAULT_TOKEN_BUDGET, CHARS_PER_TOKEN
+from core.cooccurrence import (COOCCURRENCE_MODE, COOCCURRENCE_RELATIONSHIPS,
+                               cooccurrence_relationships, merge_relationships)
+from core.inverse_relations import inverse_source, derive_inverse, dedupe_symmetric
+from utils.extraction_stats import record_runs
+from core.prompts.grouped_extraction import GROUPED_EXTRACTION_SYSTEM_PROMPT, GROUPED_EXTRACTION_SECTION
+from core.prompts.book_metadata import (FRONT_MATTER_SYSTEM_PROMPT, BOOK_SUMMARY_SYSTEM_PROMPT,
+                                       CHAPTER_SUMMARY_SYSTEM_PROMPT)
+from core.sampling import sample_text
+from core.reference_format import REFERENCE_FORMAT, format_reference, payload_tokens
+from utils.graph_utils import extract_edge_ids
+
+# Relationship types sharing the same entity references are asked for together,
+# up to this many per call (1 makes one call per type)
+RELATIONSHIP_GROUP_SIZE = int(os.environ.get("MAGICBOOK_RELATIONSHIP_GROUP_SIZE", 6))
+# Entity types are packed into calls whose expected output stays under this many tokens
+# (0 makes one call per type); a type expected to exceed it gets a call of its own
+ENTITY_GROUP_OUTPUT_TOKENS = int(os.environ.get("MAGICBOOK_ENTITY_GROUP_TOKENS", 8000))
+# References larger than this many tokens are split into shards extracted in parallel
+# (0 sends every reference list whole)
+REFERENCE_SHARD_TOKENS = int(os.environ.get("MAGICBOOK_REFERENCE_SHARD_TOKENS", 6000))
+REFERENCE_SHARD_WORKERS = int(os.environ.get("MAGICBOOK_REFERENCE_SHARD_WORKERS", 4))
+# Opening text read for the title/author/genre when the PDF does not provide them
+FRONT_MATTER_TOKENS = int(os.environ.get("MAGICBOOK_FRONT_MATTER_TOKENS", 3000))
+# Input cap of the book summary call (chapter summaries or a sample of the text)
+SUMMARY_INPUT_TOKENS = 8000
+# Input cap of each chapter's summary call when chapters come from detected headings
+# (0 leaves those chapters without summaries)
+CHAPTER_SUMMARY_TOKENS = int(os.environ.get("MAGICBOOK_CHAPTER_SUMMARY_TOKENS", 4000))
+CHAPTER_SUMMARY_WORKERS = 4
+# Document-info titles that are file names or editor defaults rather than the book's title
+_PLACEHOLDER_TITLE = re.compile(r"^(untitled|microsoft\b|document\s*\d*$)|\.(docx?|pdf|indd|rtf|txt|tex)$", re.I)
+
+
+def _usable_title(title):
+    return bool(title) and not _PLACEHOLDER_TITLE.search(title.strip())
+
+
+# Typical output tokens of each entity type's array, for packing
+ENTITY_OUTPUT_TOKENS = {
+    "CHARACTER": 12000,
+    "EVENT": 6000,
+    "LOCATION": 5000,
+    "CHAPTER": 4000,
+    "ITEM": 3000,
+    "ORGANIZATION": 1500,
+    "CREATURE": 1500,
+    "CONCEPT": 1500,
+    "TIME_PERIOD": 800,
+}
 
 
 
@@ -22,10 +76,38 @@ class EntityRelationshipExtractor:
                  relationship_prompts_map=None,
                  reference_mappings=None,
                  book_text="",
-                 status_callback=None): 
+                 status_callback=None,
+                 book_structure=None,
+                 context_token_budget=DEFAULT_TOKEN_BUDGET,
+                 cooccurrence_mode=COOCCURRENCE_MODE,
+                 relationship_group_size=RELATIONSHIP_GROUP_SIZE,
+                 entity_group_output_tokens=ENTITY_GROUP_OUTPUT_TOKENS,
+                 book_info=None,
+                 reference_format=REFERENCE_FORMAT,
+                 reference_shard_tokens=REFERENCE_SHARD_TOKENS): 
         self.chat_model = chat_model
         self.book_text = book_text
+        # Detected chapters (model.book.Book); lets obvious structure skip the CHAPTER call
+        self.book_structure = book_structure
+        # Where each extracted entity occurs in the text (core.mention_index.MentionIndex)
+        self.mention_index = None
+        # Relationship prompts send only passages mentioning the referenced entity types,
+        # up to this many tokens (0 or None sends the whole book)
+        self.context_token_budget = context_token_budget
+        # How co-occurrence derived relationships (core.cooccurrence) are used:
+        # "replace" skips their model call, "seed" merges into it, "off" disables them
+        self.cooccurrence_mode = cooccurrence_mode
+        self.relationship_group_size = relationship_group_size
+        # Entity references in relationship prompts: "table" (key|name|... rows) or "json"
+        self.reference_format = reference_format
+        self._reference_cache = {}
+        self.reference_shard_tokens = reference_shard_tokens
+        # Guards step_stats when reference shards are extracted in parallel
+        self._stats_lock = threading.Lock()
+        self.entity_group_output_tokens = entity_group_output_tokens
         self.book_metadata = None
+        # Title/author/page_count read from the PDF (utils.file_utils.read_pdf_info), if any
+        self.book_info = book_info
         self.status_callback = status_callback 
 
 
@@ -53,6 +135,9 @@ class EntityRelationshipExtractor:
 
         self.book_chat_history = []
         self.collections_created = False
+        # Per-step calls, latency, tokens and method, persisted after a fresh extraction
+        self.step_stats = {}
+        self.genre = None
         logging.debug("EntityRelationshipExtractor initialized with Chat model")
         
     # --- Add a helper method for updating status ---
@@ -116,9 +201,34 @@ class EntityRelationshipExtractor:
             logging.error(err)
             return {"error": err}
 
-    def _chat_extract(self, messages, parse_json=True):
+    def _step(self, name):
+        """Cost/yield counters of one extraction step (recorded in utils.extraction_stats)"""
+        return self.step_stats.setdefault(name, {"method": "model", "calls": 0, "latency_s": 0.0,
+                                                 "input_tokens": 0, "output_tokens": 0})
+
+    def _record_call(self, steps, latency, response=None):
+        """Split the latency and token usage of one model call across the steps it served"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        share = 1 / len(steps)
+        with self._stats_lock:
+            self._record_shares(steps, share, latency, usage)
+
+    def _record_shares(self, steps, share, latency, usage):
+        for name in steps:
+            stats = self._step(name)
+            stats["calls"] += share
+            stats["latency_s"] += latency * share
+            stats["input_tokens"] += (usage.get("input_tokens") or 0) * share
+            stats["output_tokens"] += (usage.get("output_tokens") or 0) * share
+
+    def _chat_extract(self, messages, parse_json=True, steps=None):
         """
         Synchronous version of chat extraction
+
+        Args:
+            messages: Chat messages
+            parse_json: Parse the response as JSON
+            steps: Names of the entity/relationship types this call extracts, for the step stats
         """
         formatted = []
         for m in messages:
@@ -131,7 +241,10 @@ class EntityRelationshipExtractor:
 
         try:
 
+            call_start = time.perf_counter()
             response = self.chat_model.invoke(formatted)
+            if steps:
+                self._record_call(steps, time.perf_counter() - call_start, response)
             
             result = response.content
 
@@ -163,6 +276,15 @@ class EntityRelationshipExtractor:
         self.extraction_status[entity_name] = "in_progress"
         self._update_status(f"Extracting {entity_name}...")
 
+        if entity_name == "CHAPTER" and self.book_structure is not None and self.book_structure.confident:
+            data = self.book_structure.to_chapter_records(id_prefix or entity_name[:4])
+            self._step(entity_name)["method"] = "structure"
+            self._update_status(f"Detected {len(data)} chapters from headings; summarising each chapter...")
+            self._summarise_chapters(data)
+            self.extracted_entities[entity_name] = data
+            self.extraction_status[entity_name] = "completed"
+            self._update_status(f"Completed extraction for {entity_name} ({len(data)} chapters from headings).")
+            return {entity_name: data}
         
         system_prompt = self.entity_prompts_map.get(entity_type, "")
         if not system_prompt:
@@ -182,26 +304,14 @@ class EntityRelationshipExtractor:
         ]
 
         try:
-            data = self._chat_extract(messages)
+            data = self._chat_extract(messages, steps=[entity_name])
 
             if isinstance(data, dict) and "error" in data:
                 self.extraction_status[entity_name] = "failed"
                 self._update_status(f"Failed to extract {entity_name}.") 
                 return data
 
-            # Add _key to each entity
-            if id_prefix:
-                for i, item in enumerate(data):
-                    item["_key"] = f"{id_prefix}_{i+1:02d}"
-            else:
-                for i, item in enumerate(data):
-                    item["_key"] = f"{entity_name[:4]}_{i+1:02d}"
-
-            self.extracted_entities[entity_name] = data
-            self.extraction_status[entity_name] = "completed"
-            logging.debug(f"Extracted {len(data)} {entity_name}")
-            self._update_status(f"Completed extraction for {entity_name} ({len(data)} found).") 
-            return {entity_name: data}
+            return self._store_entities(entity_type, data, id_prefix)
         
         except Exception as e:
             self.extraction_status[entity_name] = "failed"
@@ -210,17 +320,144 @@ class EntityRelationshipExtractor:
             self._update_status(f"Error during {entity_name} extraction: {e}")
             return {"error": err}
 
-    def _build_reference_for(self, entity_key, transform=None):
+    def _summarise_chapters(self, records):
+        """
+        Add a summary to chapter records built from detected headings, with
+        one small call per chapter (in parallel) on the chapter's text capped
+        at CHAPTER_SUMMARY_TOKENS. Chapter nodes are embedded from their
+        summary, and the book summary is written from them.
+        """
+        if not CHAPTER_SUMMARY_TOKENS or not records:
+            return
+
+        def summarise(record):
+            chapter_text = self.book_text[record["start_offset"]:record["end_offset"]]
+            messages = [
+                {"role": "system", "content": CHAPTER_SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"{record['title']}\n{sample_text(chapter_text, CHAPTER_SUMMARY_TOKENS)}"}
+            ]
+            result = self._chat_extract(messages, steps=["CHAPTER"])
+            if isinstance(result, dict) and isinstance(result.get("summary"), str):
+                record["summary"] = result["summary"]
+                return True
+            return False
+
+        with ThreadPoolExecutor(max_workers=min(CHAPTER_SUMMARY_WORKERS, len(records)),
+                                thread_name_prefix="chapter-summary") as executor:
+            summarised = sum(executor.map(summarise, records))
+        if summarised < len(records):
+            logging.warning(f"Summarised {summarised}/{len(records)} chapters")
+
+    def _store_entities(self, entity_type, data, id_prefix=None):
+        """
+        Key the extracted records of an entity type and store them
         """
-        Creates a reference JSON for a specific entity type
+        entity_name = entity_type.name
+        # Add _key to each entity
+        if id_prefix:
+            for i, item in enumerate(data):
+                item["_key"] = f"{id_prefix}_{i+1:02d}"
+        else:
+            for i, item in enumerate(data):
+                item["_key"] = f"{entity_name[:4]}_{i+1:02d}"
+
+        self.extracted_entities[entity_name] = data
+        self.extraction_status[entity_name] = "completed"
+        logging.debug(f"Extracted {len(data)} {entity_name}")
+        self._update_status(f"Completed extraction for {entity_name} ({len(data)} found).") 
+        return {entity_name: data}
+
+    def _group_entity_types(self, entity_types):
+        """
+        Pack entity types into calls by expected output volume
+        (ENTITY_OUTPUT_TOKENS), largest first, each call staying under
+        ``entity_group_output_tokens``. Types answered without a model call
+        (confidently detected chapters) or without a prompt stay on their own.
+
+        Returns:
+            list: Lists of entity types
+        """
+        budget = self.entity_group_output_tokens or 0
+        if not self.book_text:
+            return [[entity_type] for entity_type in entity_types]
+        groups, packed = [], []
+        for entity_type in entity_types:
+            skips_model = (entity_type.name == "CHAPTER" and self.book_structure is not None
+                           and self.book_structure.confident)
+            if skips_model or entity_type not in self.entity_prompts_map:
+                groups.append([entity_type])
+            else:
+                packed.append(entity_type)
+
+        # First-fit decreasing
+        bins = []
+        for entity_type in sorted(packed, key=lambda item: ENTITY_OUTPUT_TOKENS.get(item.name, budget), reverse=True):
+            size = ENTITY_OUTPUT_TOKENS.get(entity_type.name, budget)
+            for entry in bins:
+                if entry[0] + size <= budget:
+                    entry[0] += size
+                    entry[1].append(entity_type)
+                    break
+            else:
+                bins.append([size, [entity_type]])
+        return groups + [types for _, types in bins]
+
+    def _extract_entity_group(self, entity_types):
+        """
+        Extract several entity types in one call (see _extract_grouped),
+        sending the book text once.
+        """
+        for entity_type in entity_types:
+            self.extraction_status[entity_type.name] = "in_progress"
+
+        def build_messages(types):
+            sections = "".join(GROUPED_EXTRACTION_SECTION.format(name=entity_type.name,
+                                                                 prompt=self.entity_prompts_map[entity_type])
+                               for entity_type in types)
+            system_prompt = GROUPED_EXTRACTION_SYSTEM_PROMPT.format(
+                kind="entity types", keys=", ".join(entity_type.name for entity_type in types), sections=sections)
+            names = ", ".join(entity_type.name.lower() for entity_type in types)
+            return [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Extract all {names} entities from the book and return a JSON object:\nBook:\n{self.book_text}"}
+            ]
+
+        self._extract_grouped(entity_types, build_messages,
+                              lambda entity_type: self._extract_entity(entity_type, entity_type.name[:4]),
+                              lambda entity_type, data: self._store_entities(entity_type, data, entity_type.name[:4]))
+
+    def _reference_payload(self, entity_key, transform=None):
+        """
+        Creates the reference payload of an entity type, memoized per
+        (entity type, transform) since many relationship types share one
+
+        Returns:
+            dict: payload, fence language, hint, and approximate tokens of
+            the payload and of the same references as indented JSON
         """
+        cache_key = (entity_key, transform, self.reference_format)
+        cached = self._reference_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         if not transform:
             transform = lambda item: {
                 "_key": item["_key"],
                 "name": item.get("name", "Unknown")
             }
+        rows = [transform(item) for item in self.extracted_entities[entity_key]]
+        payload, language, hint = format_reference(rows, self.reference_format)
+        cached = {"rows": rows, "payload": payload, "language": language, "hint": hint,
+                  "tokens": payload_tokens(payload),
+                  "json_tokens": payload_tokens(json.dumps(rows, indent=2))}
+        self._reference_cache[cache_key] = cached
+        return cached
 
-        return json.dumps([transform(item) for item in self.extracted_entities[entity_key]], indent=2)
+    def _build_reference_for(self, entity_key, transform=None):
+        """
+        Creates a reference payload for a specific entity type
+        """
+        return self._reference_payload(entity_key, transform)["payload"]
 
     def _get_entity_references(self, relationship_type):
         """
@@ -231,21 +468,22 @@ class EntityRelationshipExtractor:
 
         return self.reference_mappings.get(relationship_type.name, {})
 
-    def _extract_relationship_async(self, relationship_type):
+    def _build_relationship_prompt(self, relationship_type, shard=None):
         """
-        Generic function for extracting a relationship type
+        Build the user prompt of a relationship type: the reference JSON of
+        the entities it links, then the book text (or its relevant passages).
+
+        Args:
+            relationship_type: The relationship type
+            shard: Optional shard from _reference_shards; its slice replaces
+                the full reference list, and only passages mentioning its
+                entities are selected
+
+        Returns:
+            str: The prompt, or {"error": ...} if a required entity type was
+            not extracted
         """
         rel_name = relationship_type.name
-        self.extraction_status[rel_name] = "in_progress"
-        self._update_status(f"Extracting relationships: {rel_name}...")
-
-        system_prompt = self.relationship_prompts_map.get(relationship_type, "")
-        if not system_prompt:
-            self.extraction_status[rel_name] = "failed"
-            err = f"No prompt found for relationship type {rel_name}"
-            logging.error(err)
-            self._update_status(f"Error: No prompt for {rel_name}.")
-            return {"error": err}
 
         # Get required entity references for this relationship type
         required_refs = self._get_entity_references(relationship_type)
@@ -260,15 +498,67 @@ class EntityRelationshipExtractor:
                 self._update_status(f"Error: Missing entity {entity_key} for {rel_name}.")
                 return {"error": err}
 
-        # Build reference strings for each required entity
+        # Build reference payloads for each required entity
         refs = {}
         for ref_key, (entity_key, transform_func) in required_refs.items():
-            refs[ref_key] = self._build_reference_for(entity_key, transform_func)
+            refs[ref_key] = self._reference_payload(entity_key, transform_func)
+        if shard is not None:
+            refs[shard["ref_key"]] = shard["reference"]
+        if refs:
+            tokens = sum(ref["tokens"] for ref in refs.values())
+            json_tokens = sum(ref["json_tokens"] for ref in refs.values())
+            logging.info(f"{rel_name}: references ~{tokens:,} tokens as {self.reference_format} "
+                         f"(~{json_tokens:,} as indented JSON, {1 - tokens / max(json_tokens, 1):.0%} saved)")
+
+        # Create a base prompt that includes references; on long books only the
+        # passages where the referenced entities occur are sent
+        selected = select_context(self.book_text, self.mention_index,
+                                  [entity_key for entity_key, _ in required_refs.values()],
+                                  token_budget=self.context_token_budget,
+                                  entity_keys=shard["context_keys"] if shard else None) if required_refs else None
+        if selected:
+            context, stats = selected
+            self._update_status(f"{rel_name}: sending {stats['passages']} relevant passages "
+                                f"({stats['reduction']:.0%} less text than the full book).")
+            base_prompt = ("Extract information from these passages of the Book "
+                           f"(the parts where the referenced entities appear):\n{context}")
+        else:
+            base_prompt = f"Extract information from the Book:\n{self.book_text}"
+        for ref_key, ref in refs.items():
+            hint = f" ({ref['hint']})" if ref["hint"] else ""
+            base_prompt = (f"Using reference for {ref_key}{hint}:\n```{ref['language']}\n{ref['payload']}\n```\n"
+                           f"{base_prompt}")
+        return base_prompt
+
+    def _extract_relationship_async(self, relationship_type, shards=None):
+        """
+        Generic function for extracting a relationship type
 
-        # Create a base prompt that includes references
-        base_prompt = f"Extract information from the Book:\n{self.book_text}"
-        for ref_key, ref_data in refs.items():
-            base_prompt = f"Using reference for {ref_key}:\n```json\n{ref_data}\n```\n{base_prompt}"
+        Args:
+            relationship_type: The relationship type to extract
+            shards: The type's _reference_shards, if already computed ([] when
+                its references fit in one call); computed here when None
+        """
+        rel_name = relationship_type.name
+        self.extraction_status[rel_name] = "in_progress"
+        self._update_status(f"Extracting relationships: {rel_name}...")
+
+        system_prompt = self.relationship_prompts_map.get(relationship_type, "")
+        if not system_prompt:
+            self.extraction_status[rel_name] = "failed"
+            err = f"No prompt found for relationship type {rel_name}"
+            logging.error(err)
+            self._update_status(f"Error: No prompt for {rel_name}.")
+            return {"error": err}
+
+        if shards is None:
+            shards = self._reference_shards(relationship_type)
+        if shards:
+            return self._extract_relationship_sharded(relationship_type, system_prompt, shards)
+
+        base_prompt = self._build_relationship_prompt(relationship_type)
+        if isinstance(base_prompt, dict):
+            return base_prompt
 
         logging.debug(f"{rel_name.upper()}::::")
         messages = [
@@ -277,13 +567,14 @@ class EntityRelationshipExtractor:
         ]
 
         try:
-            data = self._chat_extract(messages)
+            data = self._chat_extract(messages, steps=[rel_name])
 
             if isinstance(data, dict) and "error" in data:
                 self.extraction_status[rel_name] = "failed"
                 self._update_status(f"Failed to extract {rel_name} relationships.") 
                 return data
 
+            data = dedupe_symmetric(rel_name, data)
             self.extracted_relationships[rel_name] = data
             self.extraction_status[rel_name] = "completed"
             logging.debug(f"Extracted {len(data)} {rel_name} relationships")
@@ -297,9 +588,291 @@ class EntityRelationshipExtractor:
             self._update_status(f"Error during {rel_name} extraction: {e}")
             return {"error": err}
 
+    def _reference_shards(self, relationship_type):
+        """
+        Split the largest reference list of a relationship into shards when
+        its references exceed ``reference_shard_tokens``.
+
+        Each shard carries a slice of that list; the other lists are sent
+        whole. When the relationship links the sharded type to itself
+        (character-character, event-event...), the list is cut into slices
+        of half the budget and each shard pairs two slices (every slice with
+        every other and with itself), so every pair of entities meets in
+        some call and no call carries the whole cast.
+
+        Returns:
+            list: Shards ({"ref_key", "reference", "context_keys"}), or None
+            when the references fit in one call
+        """
+        if not self.reference_shard_tokens:
+            return None
+        required_refs = self._get_entity_references(relationship_type)
+        if not required_refs or any(not self.extracted_entities.get(entity_key)
+                                    for entity_key, _ in required_refs.values()):
+            return None
+        payloads = {ref_key: self._reference_payload(entity_key, transform)
+                    for ref_key, (entity_key, transform) in required_refs.items()}
+        if sum(payload["tokens"] for payload in payloads.values()) <= self.reference_shard_tokens:
+            return None
+
+        ref_key = max(payloads, key=lambda key: payloads[key]["tokens"])
+        rows = payloads[ref_key]["rows"]
+        self_relationship = len(required_refs) == 1
+        fixed = sum(payload["tokens"] for key, payload in payloads.items() if key != ref_key)
+        room = max(self.reference_shard_tokens - fixed, self.reference_shard_tokens // 4)
+        if self_relationship:
+            room //= 2
+        slice_count = -(-payloads[ref_key]["tokens"] // room)
+        if slice_count <= 1:
+            return None
+
+        size = -(-len(rows) // slice_count)
+        slices = [rows[start:start + size] for start in range(0, len(rows), size)]
+        if self_relationship:
+            blocks = [slices[i] + (slices[j] if j != i else []) for i in range(len(slices))
+                      for j in range(i, len(slices))]
+        else:
+            blocks = slices
+        # Passages must also mention the other endpoints, which are sent whole
+        other_keys = [item.get("_key") for key, (entity_key, _) in required_refs.items() if key != ref_key
+                      for item in self.extracted_entities[entity_key] if isinstance(item, dict)]
+
+        shards = []
+        for block in blocks:
+            payload, language, hint = format_reference(block, self.reference_format)
+            shards.append({
+                "ref_key": ref_key,
+                "reference": {"rows": block, "payload": payload, "language": language, "hint": hint,
+                              "tokens": payload_tokens(payload),
+                              "json_tokens": payload_tokens(json.dumps(block, indent=2))},
+                "context_keys": [row.get("_key") for row in block] + other_keys,
+            })
+        return shards
+
+    def _extract_relationship_sharded(self, relationship_type, system_prompt, shards):
+        """
+        Extract a relationship once per reference shard, in parallel, and
+        merge the results: rows whose endpoints are not keys of extracted
+        entities are dropped, and rows returned by several shards are kept
+        once.
+        """
+        rel_name = relationship_type.name
+        self._update_status(f"{rel_name}: large reference lists, extracting in {len(shards)} shards...")
+        prompts = [self._build_relationship_prompt(relationship_type, shard) for shard in shards]
+        if any(isinstance(prompt, dict) for prompt in prompts):
+            return next(prompt for prompt in prompts if isinstance(prompt, dict))
+
+        def run(prompt):
+            return self._chat_extract([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ], steps=[rel_name])
+
+        with ThreadPoolExecutor(max_workers=min(REFERENCE_SHARD_WORKERS, len(prompts)),
+                                thread_name_prefix="reference-shard") as executor:
+            results = list(executor.map(run, prompts))
+
+        failed = [result for result in results if not isinstance(result, list)]
+        if len(failed) == len(results):
+            self.extraction_status[rel_name] = "failed"
+            self._update_status(f"Failed to extract {rel_name} relationships.")
+            return failed[0] if isinstance(failed[0], dict) else {"error": f"Invalid output for {rel_name}"}
+        if failed:
+            logging.warning(f"{rel_name}: {len(failed)}/{len(results)} reference shards failed")
+
+        valid_keys = {item.get("_key") for items in self.extracted_entities.values()
+                      for item in items or [] if isinstance(item, dict)}
+        data, seen, invalid = [], set(), 0
+        for result in results:
+            if not isinstance(result, list):
+                continue
+            for row in result:
+                # Optional endpoints (e.g. Item_USED_IN.event_id) may be null; check the ones given
+                endpoints = {key for key in extract_edge_ids(rel_name, row) if key is not None} \
+                    if isinstance(row, dict) else None
+                if not endpoints or not endpoints <= valid_keys:
+                    invalid += 1
+                    continue
+                signature = json.dumps(row, sort_keys=True, default=str)
+                if signature not in seen:
+                    seen.add(signature)
+                    data.append(row)
+        if invalid:
+            logging.warning(f"{rel_name}: dropped {invalid} rows with unknown entity keys")
+        data = dedupe_symmetric(rel_name, data)
+
+        self.extracted_relationships[rel_name] = data
+        self.extraction_status[rel_name] = "completed"
+        self._update_status(f"Completed extraction for {rel_name} relationships ({len(data)} found, "
+                            f"{len(shards)} shards).")
+        return {rel_name: data}
+
+    def _extract_grouped(self, types, build_messages, extract_single, store):
+        """
+        Ask for several entity or relationship types in one call returning
+        an object keyed by type name. If the output is invalid or truncated
+        (unparsable, a type's array missing, or an array holding something
+        other than objects), the group is split in half and each half
+        retried, down to one regular call per type.
+
+        Args:
+            types: Entity or relationship types to extract together
+            build_messages: Function returning the chat messages for a list of types
+            extract_single: Function extracting one type the regular way
+            store: Function storing the records returned for one type
+        """
+        if len(types) == 1:
+            extract_single(types[0])
+            return
+        names = [item_type.name for item_type in types]
+        self._update_status(f"Extracting {', '.join(names)} in one call...")
+        data = self._chat_extract(build_messages(types), steps=names)
+        if isinstance(data, dict) and all(isinstance(data.get(name), list)
+                                          and all(isinstance(item, dict) for item in data[name])
+                                          for name in names):
+            for item_type in types:
+                self._step(item_type.name)["method"] = "grouped"
+                store(item_type, data[item_type.name])
+            return
+        logging.warning(f"Grouped extraction of {', '.join(names)} returned invalid or truncated output; splitting")
+        middle = len(types) // 2
+        self._extract_grouped(types[:middle], build_messages, extract_single, store)
+        self._extract_grouped(types[middle:], build_messages, extract_single, store)
+
+    def _group_relationship_types(self, relationship_types, shards):
+        """
+        Group relationship types whose prompts carry the same entity
+        reference payload (same entity types through the same transforms, see
+        core.refference_mapping), at most ``relationship_group_size`` per group.
+
+        Args:
+            relationship_types: The relationship types to group
+            shards: {rel_name: _reference_shards} for those types
+
+        Returns:
+            list: Lists of relationship types, in first-seen order
+        """
+        size = max(1, self.relationship_group_size or 1)
+        groups = {}
+        for rel_type in relationship_types:
+            if size == 1 or rel_type not in self.relationship_prompts_map or shards.get(rel_type.name):
+                # Types whose references are sharded are extracted on their own
+                groups[rel_type.name] = [rel_type]
+                continue
+            refs = self._get_entity_references(rel_type)
+            payload = tuple(sorted((ref_key, entity_key, id(transform))
+                                   for ref_key, (entity_key, transform) in refs.items()))
+            groups.setdefault(payload, []).append(rel_type)
+        return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+    def _extract_relationship_group(self, relationship_types):
+        """
+        Extract relationship types sharing the same references in one call
+        (see _extract_grouped), sending the references and book text once.
+        """
+        for rel_type in relationship_types:
+            self.extraction_status[rel_type.name] = "in_progress"
+        base_prompt = self._build_relationship_prompt(relationship_types[0])
+        if isinstance(base_prompt, dict):
+            for rel_type in relationship_types:
+                self.extraction_status[rel_type.name] = "failed"
+            return base_prompt
+
+        def build_messages(types):
+            sections = "".join(GROUPED_EXTRACTION_SECTION.format(name=rel_type.name,
+                                                                 prompt=self.relationship_prompts_map[rel_type])
+                               for rel_type in types)
+            system_prompt = GROUPED_EXTRACTION_SYSTEM_PROMPT.format(
+                kind="relationship types", keys=", ".join(rel_type.name for rel_type in types), sections=sections)
+            return [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": base_prompt}
+            ]
+
+        def store(rel_type, data):
+            rel_name = rel_type.name
+            data = dedupe_symmetric(rel_name, data)
+            self.extracted_relationships[rel_name] = data
+            self.extraction_status[rel_name] = "completed"
+            self._update_status(f"Completed extraction for {rel_name} relationships ({len(data)} found).")
+
+        # Grouped types are never sharded (see _group_relationship_types)
+        self._extract_grouped(relationship_types, build_messages,
+                              lambda rel_type: self._extract_relationship_async(rel_type, shards=[]), store)
+
+    def _extract_cooccurrence(self, relationship_type):
+        """
+        Derive a relationship type from entity co-occurrence in the text.
+
+        In "replace" mode the rows become the relationship's result and the
+        model call is skipped; in "seed" mode the model is called first and
+        the rows fill in the entity pairs it did not return.
+
+        Returns:
+            dict: {rel_name: records}, or None if the relationship is not
+            derived from co-occurrence (or no mention index is available)
+        """
+        rel_name = relationship_type.name
+        if self.cooccurrence_mode not in ("replace", "seed") or self.mention_index is None:
+            return None
+        try:
+            derived = cooccurrence_relationships(self.book_text, self.mention_index, rel_name, self.book_structure)
+        except Exception as e:
+            logging.error(f"Error computing co-occurrence for {rel_name}: {e}", exc_info=True)
+            return None
+        if derived is None:
+            return None
+
+        if self.cooccurrence_mode == "seed":
+            result = self._extract_relationship_async(relationship_type)
+            if isinstance(result, dict) and "error" in result:
+                extracted = []
+            else:
+                extracted = self.extracted_relationships.get(rel_name) or []
+            derived = merge_relationships(extracted, derived, COOCCURRENCE_RELATIONSHIPS[rel_name][4])
+
+        self.extracted_relationships[rel_name] = derived
+        self.extraction_status[rel_name] = "completed"
+        if self.cooccurrence_mode == "replace":
+            self._step(rel_name)["method"] = "cooccurrence"
+        self._update_status(f"Completed {rel_name} from entity co-occurrence ({len(derived)} found).")
+        return {rel_name: derived}
+
+    def _derive_inverse(self, relationship_type, source_name):
+        """
+        Fill a relationship type from the extracted rows of its declared
+        inverse (core.inverse_relations) instead of asking the model again.
+
+        Returns:
+            dict: {rel_name: records}, or None if the inverse was not extracted
+        """
+        rel_name = relationship_type.name
+        if self.extraction_status.get(source_name) != "completed":
+            return None
+        data = derive_inverse(rel_name, self.extracted_relationships.get(source_name))
+        self._step(rel_name)["method"] = "derived"
+        self.extracted_relationships[rel_name] = data
+        self.extraction_status[rel_name] = "completed"
+        self._update_status(f"Derived {rel_name} from {source_name} ({len(data)} found); skipped the model call.")
+        return {rel_name: data}
+
+    def _front_matter(self):
+        """The opening pages of the book (title page, copyright page...), within FRONT_MATTER_TOKENS"""
+        limit = FRONT_MATTER_TOKENS * CHARS_PER_TOKEN
+        if self.book_structure is not None:
+            front = [segment for segment in self.book_structure.segments if segment.kind == "front_matter"]
+            if front and len(front[0]) > 500:
+                limit = min(limit, front[0].end)
+        return self.book_text[:limit]
+
     def _extract_book_metadata_async(self):
         """
-        Function to extract book metadata and store it as a BookMetadata instance.
+        Build the book's BookMetadata without sending the whole book.
+
+        Title, author and page count come from the PDF (``book_info``) when
+        available; otherwise, or for missing fields, one call reads only the
+        front matter (FRONT_MATTER_TOKENS). The summary is filled in later
+        from the chapter summaries (see _summarise_book).
         """
         if not self.book_text:
             return {"error": "No book text available for analysis"}
@@ -307,34 +880,40 @@ class EntityRelationshipExtractor:
         self.extraction_status["metadata"] = "in_progress"
         self._update_status("Extracting book metadata...")
 
-        messages = [
-            {"role": "system", "content": """
-                You are a literary analyst tasked with extracting metadata from books.
-                Extract only the requested fields and return them in JSON format as follows:
-                book_name, author, pages_count, time_to_process, summary
-            """},
-            {"role": "user", "content": f"Return ONLY a JSON object and nothing else.\nBook text:\n{self.book_text}"}
-        ]
+        info = self.book_info or {}
+        title = info.get("title") if _usable_title(info.get("title")) else None
+        author = info.get("author")
+        result = {}
+        if not (title and author):
+            messages = [
+                {"role": "system", "content": FRONT_MATTER_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Return ONLY a JSON object and nothing else.\nOpening pages:\n{self._front_matter()}"}
+            ]
+            logging.debug("Metadata::::")
+            result = self._chat_extract(messages, steps=["metadata"])
+            if not isinstance(result, dict) or "error" in result:
+                logging.error(f"Front matter metadata extraction failed: {result}")
+                result = {}
+        else:
+            self._step("metadata")["method"] = "pdf_info"
 
         try:
-            logging.debug("Metadata::::")
-            result = self._chat_extract(messages)
-            if "error" in result:
-                self.extraction_status["metadata"] = "failed"
-                self._update_status("Failed to extract book metadata.")
-                
-                return result
-
-            # Convert the JSON dict into a BookMetadata instance
+            genre = result.get("genre")
+            self.genre = (genre.strip().lower() or None) if isinstance(genre, str) else None
+            # Convert the fields into a BookMetadata instance
             self.book_metadata = BookMetadata(
-                book_name=result.get("book_name", "Unknown"),
-                author=result.get("author", "Unknown"),
-                pages_count=result.get("pages_count", 0),
-                time_to_process=result.get("time_to_process", "Unknown"),
-                summary=result.get("summary", "")
+                book_name=title or result.get("book_name") or "Unknown",
+                author=author or result.get("author") or "Unknown",
+                pages_count=info.get("page_count") or 0,
+                time_to_process="Unknown",
+                summary=""
             )
-            self.extraction_status["metadata"] = "completed"
-            self.book_chat_history = messages.copy()
+            self.extraction_status["metadata"] = "completed" if (title or result) else "failed"
+            # Follow-up questions (ask_book) are asked about the whole book
+            self.book_chat_history = [
+                {"role": "system", "content": "You are a literary analyst answering questions about this book."},
+                {"role": "user", "content": f"Book text:\n{self.book_text}"}
+            ]
 
             # Update the global CURRENT_BOOK_METADATA variable
             global CURRENT_BOOK_METADATA
@@ -347,7 +926,7 @@ class EntityRelationshipExtractor:
                 )
 
             logging.debug(f"Book metadata extracted: {self.book_metadata}")
-            self._update_status("Book metadata extracted.")
+            self._update_status(f"Book metadata extracted: {self.book_metadata.book_name} by {self.book_metadata.author}.")
 
             return self.book_metadata
         except Exception as e:
@@ -356,6 +935,38 @@ class EntityRelationshipExtractor:
             logging.error(err)
             return {"error": err}
 
+    def _summarise_book(self):
+        """
+        Summarise the book from its chapter summaries (extracted with the
+        CHAPTER entities), or from a stratified sample of the text when
+        there are none, in one bounded call. The same call names the genre
+        when the front matter was not read.
+
+        Returns:
+            str: The summary, or "" if it could not be written
+        """
+        chapter_summaries = [f"{chapter.get('title') or ''}: {chapter['summary']}"
+                             for chapter in self.extracted_entities.get("CHAPTER") or []
+                             if isinstance(chapter, dict) and chapter.get("summary")]
+        limit = SUMMARY_INPUT_TOKENS * CHARS_PER_TOKEN
+        if chapter_summaries:
+            source = "Chapter summaries:\n" + "\n".join(chapter_summaries)[:limit]
+        else:
+            source = "Passages from the book:\n" + sample_text(self.book_text, SUMMARY_INPUT_TOKENS,
+                                                                 self.book_structure, anchor_ends=True)
+        messages = [
+            {"role": "system", "content": BOOK_SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": source}
+        ]
+        result = self._chat_extract(messages, steps=["summary"])
+        if not isinstance(result, dict) or not isinstance(result.get("summary"), str):
+            logging.error(f"Book summary failed: {result}")
+            return ""
+        # The front-matter call, which also asks for the genre, is skipped when the PDF names the book
+        if not self.genre and isinstance(result.get("genre"), str) and result["genre"].strip():
+            self.genre = result["genre"].strip().lower()
+        return result["summary"]
+
     def extract_all_items(self):
         """
         Run the complete extraction process synchronously for both entities and relationships.
@@ -367,34 +978,61 @@ class EntityRelationshipExtractor:
         if isinstance(metadata_result, dict) and "error" in metadata_result:
             logging.error("Metadata extraction failed; continuing with other extractions.")
 
-        # 🔒 guard -------------------------------------------------------------
+        # 🔒 guard (only complete entries load, so this is safe outside the writer lock) ----
         if self.book_metadata is not None:
             cached = cache_load(self.book_metadata.book_name, self.book_text)
             if cached:
                 self.extracted_entities      = cached["entities_map"]
                 self.extracted_relationships = cached["relationships_map"]
+                CURRENT_BOOK_METADATA.summary = CURRENT_BOOK_METADATA.summary or cached.get("summary", "")
                 self._update_status("Loaded entities/relationships from cache ✅")
                 return self._finalise()
         # --------------------------------------------------------------------
-        
-        # 0️⃣  try the cache first  ------------------------------------------
-        cached = cache_load(self.book_metadata.book_name, self.book_text)
-        if cached:
-            self.extracted_entities     = cached["entities_map"]
-            self.extracted_relationships = cached["relationships_map"]
-            self._update_status("Loaded entities/relationships from cache ✅")
-            return self._finalise()
-        # -------------------------------------------------------------------
-
-
-        # Extract all entity types in parallel
-        entity_tasks = []
+
+        # Only one worker extracts a given book at a time; others wait for its result
+        with cache_writer_lock(self.book_metadata.book_name, self.book_text,
+                               on_wait=lambda: self._update_status(
+                                   "Another worker is extracting this book; waiting for its results...")):
+            # 0️⃣  try the cache first (another worker may have just finished) --
+            cached = cache_load(self.book_metadata.book_name, self.book_text)
+            if cached:
+                self.extracted_entities     = cached["entities_map"]
+                self.extracted_relationships = cached["relationships_map"]
+                CURRENT_BOOK_METADATA.summary = CURRENT_BOOK_METADATA.summary or cached.get("summary", "")
+                self._update_status("Loaded entities/relationships from cache ✅")
+                return self._finalise()
+            # -------------------------------------------------------------------
+
+            self._run_extraction()
+            # Summarised once per extraction and cached with it, so reloads make no call
+            if not CURRENT_BOOK_METADATA.summary:
+                CURRENT_BOOK_METADATA.summary = self._summarise_book()
+
+            # 1️⃣  after successful extraction, stash it  ------------------------
+            cache_save(self.book_metadata.book_name, self.book_text,
+                       self.extracted_entities, self.extracted_relationships,
+                       summary=CURRENT_BOOK_METADATA.summary)
+            self._record_step_stats()
+            # -------------------------------------------------------------------
+        return self._finalise()
+
+    def _run_extraction(self):
+        """
+        Extract every configured entity type, then every relationship type.
+        """
+        # Extract all entity types in parallel; small types are asked for together
+        entity_tasks = {}
         self._update_status("Starting entity extraction...")
-        for entity_type in self.entity_types:
-            # Generate id_prefix from entity type name
-            id_prefix = entity_type.name[:4]
-            task = self._extract_entity(entity_type, id_prefix)
-            entity_tasks.append(task)
+        for group in self._group_entity_types(self.entity_types):
+            if len(group) == 1:
+                # Generate id_prefix from entity type name
+                id_prefix = group[0].name[:4]
+                entity_tasks[group[0].name] = self._extract_entity(group[0], id_prefix)
+                continue
+            self._extract_entity_group(group)
+            for entity_type in group:
+                entity_tasks[entity_type.name] = {entity_type.name: self.extracted_entities[entity_type.name]}
+        entity_tasks = [entity_tasks[entity_type.name] for entity_type in self.entity_types]
 
         # Process entity results
         for i, result in enumerate(entity_tasks):
@@ -404,12 +1042,45 @@ class EntityRelationshipExtractor:
                 self.extraction_status[entity_type.name] = "failed"
         self._update_status("Entity extraction phase complete.")
 
-        # Extract all relationship types in parallel
-        relationship_tasks = []
+        try:
+            self.mention_index = build_mention_index(self.book_text, self.extracted_entities, self.book_structure)
+        except Exception as e:
+            logging.error(f"Error building entity mention index: {e}", exc_info=True)
+
+        # References are built from the entities just extracted
+        self._reference_cache.clear()
+
+        # Extract all relationship types in parallel; inverses of extracted types are derived afterwards
+        relationship_names = {rel_type.name for rel_type in self.relationship_types}
+        relationship_tasks = {}
+        pending = []
         self._update_status("Starting relationship extraction...")
         for rel_type in self.relationship_types:
-            task = self._extract_relationship_async(rel_type)
-            relationship_tasks.append(task)
+            if inverse_source(rel_type.name, relationship_names):
+                continue
+            task = self._extract_cooccurrence(rel_type)
+            if task:
+                relationship_tasks[rel_type.name] = task
+            else:
+                pending.append(rel_type)
+        # Types sharing the same references are asked for together; sharded types go alone
+        shards = {rel_type.name: self._reference_shards(rel_type) or [] for rel_type in pending
+                  if rel_type in self.relationship_prompts_map}
+        for group in self._group_relationship_types(pending, shards):
+            if len(group) == 1:
+                relationship_tasks[group[0].name] = self._extract_relationship_async(
+                    group[0], shards=shards.get(group[0].name))
+                continue
+            self._extract_relationship_group(group)
+            for rel_type in group:
+                relationship_tasks[rel_type.name] = {rel_type.name: self.extracted_relationships[rel_type.name]}
+        for rel_type in self.relationship_types:
+            source_name = inverse_source(rel_type.name, relationship_names)
+            if source_name:
+                # Fall back to the model if the inverse could not be extracted
+                task = self._derive_inverse(rel_type, source_name) or self._extract_relationship_async(rel_type)
+                relationship_tasks[rel_type.name] = task
+        relationship_tasks = [relationship_tasks[rel_type.name] for rel_type in self.relationship_types]
 
         # Process relationship results
         for i, result in enumerate(relationship_tasks):
@@ -419,12 +1090,24 @@ class EntityRelationshipExtractor:
                 self.extraction_status[rel_type.name] = "failed"
         self._update_status("Relationship extraction phase complete.") 
 
-        # 1️⃣  after successful extraction, stash it  ------------------------
-        cache_save(self.book_metadata.book_name, self.book_text,
-                   self.extracted_entities, self.extracted_relationships)
-        # -------------------------------------------------------------------
-        return self._finalise()
 
+    def _record_step_stats(self):
+        """
+        Persist the yield and cost of every step of this extraction
+        (utils.extraction_stats), for the fast-profile planner.
+        """
+        runs = []
+        for kind, item_types, extracted in (("entity", self.entity_types, self.extracted_entities),
+                                            ("relationship", self.relationship_types, self.extracted_relationships)):
+            for item_type in item_types:
+                name = item_type.name
+                runs.append({"step_kind": kind, "step_name": name, "status": self.extraction_status.get(name),
+                             "rows": len(extracted.get(name) or []), **self._step(name)})
+        try:
+            record_runs(runs, book_name=self.book_metadata.book_name if self.book_metadata else None,
+                        genre=self.genre, model=getattr(self.chat_model, "model", None))
+        except Exception as e:
+            logging.warning(f"Could not record extraction stats: {e}")
 
     def extract_all(self):
        
@@ -0,0 +1,96 @@
+import json
+import logging
+
+# Relationship types that are the inverse of another: derived type -> (extracted type, field renames).
+# Both directions name their endpoints by role (earlier/later, cause/effect), so a derived row
+# keeps the fields of the extracted row and utils.graph_utils.extract_edge_ids flips the edge.
+INVERSE_RELATIONSHIPS = {
+    "Event_AFTER": ("Event_BEFORE", {}),
+    "Event_CAUSED_BY": ("Event_CAUSES", {}),
+}
+
+# Symmetric relationship types and their two endpoint fields; (A, B) and (B, A) are the same relation
+SYMMETRIC_RELATIONSHIPS = {
+    "Family_SIBLING_OF": ("sibling1_id", "sibling2_id"),
+    "Family_MARRIED_TO": ("spouse1_id", "spouse2_id"),
+    "Interaction_INTERACTED_WITH": ("character1_id", "character2_id"),
+    "Interaction_APPEARED_TOGETHER": ("character1_id", "character2_id"),
+    "Interaction_MET_AT": ("character1_id", "character2_id"),
+    "Event_SIMULTANEOUS_WITH": ("event1_id", "event2_id"),
+    "Event_OVERLAPS_WITH": ("event1_id", "event2_id"),
+    "ItemItem_COUNTERS": ("item1_id", "item2_id"),
+}
+
+
+def inverse_source(relationship_name, relationship_names):
+    """
+    Get the relationship type a relationship can be derived from.
+
+    Args:
+        relationship_name: Relationship type name (e.g. "Event_AFTER")
+        relationship_names: Names of the relationship types being extracted
+
+    Returns:
+        str: The extracted type to derive from, or None if the relationship
+        has no declared inverse among ``relationship_names``
+    """
+    source = INVERSE_RELATIONSHIPS.get(relationship_name)
+    if source is None or source[0] not in relationship_names:
+        return None
+    return source[0]
+
+
+def derive_inverse(relationship_name, records):
+    """
+    Build the rows of a relationship from the rows of its inverse.
+
+    Derived rows are copies with the declared fields renamed and
+    ``derived_from`` set to the extracted type.
+
+    Args:
+        relationship_name: The derived relationship type name
+        records: Rows of the extracted inverse relationship
+
+    Returns:
+        list: The derived rows
+    """
+    source_name, renames = INVERSE_RELATIONSHIPS[relationship_name]
+    derived = []
+    for record in records or []:
+        if not isinstance(record, dict):
+            continue
+        row = {renames.get(field, field): value for field, value in record.items()}
+        row["derived_from"] = source_name
+        derived.append(row)
+    logging.debug(f"Derived {len(derived)} {relationship_name} rows from {source_name}")
+    return derived
+
+
+def dedupe_symmetric(relationship_name, records):
+    """
+    Drop mirrored rows of a symmetric relationship: a row repeating another
+    with its two endpoints swapped and every other field equal.
+
+    Args:
+        relationship_name: Relationship type name
+        records: Relationship rows
+
+    Returns:
+        list: The rows, keeping the first of each mirrored pair
+    """
+    fields = SYMMETRIC_RELATIONSHIPS.get(relationship_name)
+    if fields is None or not isinstance(records, list):
+        return records
+    seen, unique = set(), []
+    for record in records:
+        if isinstance(record, dict):
+            rest = {field: value for field, value in record.items() if field not in fields}
+            pair = (frozenset((record.get(fields[0]), record.get(fields[1]))),
+                    json.dumps(rest, sort_keys=True, default=str))
+            if pair in seen:
+                continue
+            seen.add(pair)
+        unique.append(record)
+    if len(unique) < len(records):
+        logging.debug(f"Dropped {len(records) - len(unique)} mirrored {relationship_name} rows")
+    return unique
@@ -0,0 +1,176 @@
+import logging
+import re
+import time
+
+import numpy as np
+
+# Fields holding an entity's surface forms
+NAME_FIELDS = ("name", "title")
+ALIAS_FIELDS = ("aliases", "alias", "nicknames")
+# Entity types whose single-word name parts ("Frodo" of "Frodo Baggins") are also matched
+PARTIAL_NAME_TYPES = ("CHARACTER",)
+_HONORIFICS = {"mr", "mrs", "ms", "miss", "dr", "sir", "lady", "lord", "king", "queen", "prince",
+               "princess", "master", "mistress", "the", "of", "and", "de", "von", "van", "old", "young",
+               "professor", "captain", "uncle", "aunt"}
+
+_WORD = re.compile(r"\w+")
+
+
+def _tokens(text):
+    return [token.lower() for token in _WORD.findall(text)]
+
+
+def _surface_forms(entity, entity_type):
+    """Full names/aliases of an entity, and (for characters) the parts of its name"""
+    forms = []
+    for field in NAME_FIELDS:
+        if isinstance(entity.get(field), str):
+            forms.append(entity[field])
+    for field in ALIAS_FIELDS:
+        value = entity.get(field)
+        if isinstance(value, str):
+            forms.append(value)
+        elif isinstance(value, list):
+            forms.extend(alias for alias in value if isinstance(alias, str))
+
+    full = {tuple(_tokens(form)) for form in forms} - {()}
+    partial = set()
+    if entity_type in PARTIAL_NAME_TYPES:
+        for tokens in full:
+            if len(tokens) > 1:
+                partial.update((token,) for token in tokens
+                               if len(token) >= 3 and token not in _HONORIFICS and not token.isdigit())
+    return full, partial - full
+
+
+class MentionIndex:
+    """
+    Where each extracted entity is mentioned in the book text.
+
+    Mentions are stored as parallel NumPy arrays sorted by position:
+    ``starts``/``ends`` (character offsets), ``entity_ids`` (index into
+    ``entity_keys``) and ``chapter_ids`` (index into the book's chapters,
+    -1 outside any chapter).
+    """
+    def __init__(self, entity_keys, entity_types, starts, ends, entity_ids, chapter_ids):
+        self.entity_keys = entity_keys
+        self.entity_types = entity_types
+        self.starts = starts
+        self.ends = ends
+        self.entity_ids = entity_ids
+        self.chapter_ids = chapter_ids
+        self._key_to_id = {key: i for i, key in enumerate(entity_keys)}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _mask(self, entity_key):
+        entity_id = self._key_to_id.get(entity_key)
+        if entity_id is None:
+            return np.zeros(len(self.starts), dtype=bool)
+        return self.entity_ids == entity_id
+
+    def mentions(self, entity_key):
+        """
+        Get every mention of an entity.
+
+        Returns:
+            list: (start, end, chapter_id) tuples in text order
+        """
+        mask = self._mask(entity_key)
+        return list(zip(self.starts[mask].tolist(), self.ends[mask].tolist(), self.chapter_ids[mask].tolist()))
+
+    def count(self, entity_key):
+        """Number of mentions of an entity"""
+        return int(self._mask(entity_key).sum())
+
+    def counts(self):
+        """Mention count per entity key"""
+        totals = np.bincount(self.entity_ids, minlength=len(self.entity_keys))
+        return dict(zip(self.entity_keys, totals.tolist()))
+
+    def chapters_of(self, entity_key):
+        """Sorted chapter ids in which an entity is mentioned"""
+        chapters = np.unique(self.chapter_ids[self._mask(entity_key)])
+        return chapters[chapters >= 0].tolist()
+
+    def type_mask(self, entity_types):
+        """Boolean mask over mentions of the given entity types"""
+        type_ids = [i for i, entity_type in enumerate(self.entity_types) if entity_type in set(entity_types)]
+        return np.isin(self.entity_ids, type_ids)
+
+
+def build_mention_index(text, entities_map, book_structure=None, entity_types=None):
+    """
+    Find every mention of every entity name and alias in one pass over the text.
+
+    Names are matched case-insensitively on whole words through a word-level
+    trie keyed by first word (leftmost-longest, non-overlapping), so the cost
+    is linear in the text, not in the number of names. For characters,
+    single name parts ("Frodo", "Gandalf") are matched too unless shared by
+    several characters.
+
+    Args:
+        text: Book text
+        entities_map: Dict mapping entity type -> list of records with _key
+        book_structure: Optional model.book.Book, to tag mentions with chapters
+        entity_types: Entity types to index (default: all in entities_map)
+
+    Returns:
+        MentionIndex: The mention index
+    """
+    start_time = time.perf_counter()
+    entity_keys, key_types = [], []
+    full_forms, partial_forms = {}, {}
+    for entity_type, entities in entities_map.items():
+        if entity_types is not None and entity_type not in entity_types:
+            continue
+        for entity in entities or []:
+            if not isinstance(entity, dict) or not entity.get("_key"):
+                continue
+            entity_id = len(entity_keys)
+            entity_keys.append(entity["_key"])
+            key_types.append(entity_type)
+            full, partial = _surface_forms(entity, entity_type)
+            for form in full:
+                full_forms.setdefault(form, set()).add(entity_id)
+            for form in partial:
+                partial_forms.setdefault(form, set()).add(entity_id)
+
+    # A surface form must identify one entity; full names win over name parts
+    patterns = {form: next(iter(ids)) for form, ids in partial_forms.items()
+                if len(ids) == 1 and form not in full_forms}
+    patterns.update({form: next(iter(ids)) for form, ids in full_forms.items() if len(ids) == 1})
+    trie = {}
+    for form in sorted(patterns, key=len, reverse=True):
+        trie.setdefault(form[0], []).append((form, patterns[form]))
+
+    words = list(_WORD.finditer(text))
+    lowered = [match.group().lower() for match in words]
+    starts, ends, entity_ids = [], [], []
+    i = 0
+    while i < len(lowered):
+        for form, entity_id in trie.get(lowered[i], ()):
+            if tuple(lowered[i:i + len(form)]) == form:
+                starts.append(words[i].start())
+                ends.append(words[i + len(form) - 1].end())
+                entity_ids.append(entity_id)
+                i += len(form)
+                break
+        else:
+            i += 1
+
+    starts = np.asarray(starts, dtype=np.int64)
+    chapter_ids = np.full(len(starts), -1, dtype=np.int32)
+    if book_structure is not None and book_structure.chapters:
+        chapter_starts = np.asarray([chapter.start for chapter in book_structure.chapters], dtype=np.int64)
+        chapter_ends = np.asarray([chapter.end for chapter in book_structure.chapters], dtype=np.int64)
+        positions = np.searchsorted(chapter_starts, starts, side="right") - 1
+        inside = (positions >= 0) & (starts < chapter_ends[np.clip(positions, 0, None)])
+        chapter_ids[inside] = positions[inside]
+
+    index = MentionIndex(entity_keys, key_types, starts, np.asarray(ends, dtype=np.int64),
+                         np.asarray(entity_ids, dtype=np.int32), chapter_ids)
+    logging.info(f"Indexed {len(index)} mentions of {len(entity_keys)} entities "
+                 f"({len(patterns)} surface forms) in {time.perf_counter() - start_time:.2f}s")
+    return index
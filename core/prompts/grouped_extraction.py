@@ -0,0 +1,20 @@
+GROUPED_EXTRACTION_SYSTEM_PROMPT = """
+You are a literary analyzer extracting several {kind} from a book in one pass.
+
+Return ONLY a JSON object with exactly these keys: {keys}.
+Map each key to a JSON array of objects for that type, following the instructions
+for that type below (use an empty array if there are none). Each type's instructions
+describe the objects of its array; where they say to return a bare JSON array,
+put that array under the type's key instead.
+
+{sections}
+
+IMPORTANT:
+- Return ONLY the JSON object. Do not include any markdown formatting, explanations, or extra text.
+- Ensure that the entire return object is parsable by json.loads()
+"""
+
+GROUPED_EXTRACTION_SECTION = """
+### {name}
+{prompt}
+"""
@@ -0,0 +1,59 @@
+import json
+import os
+import re
+
+from utils.text_normalizer import estimate_tokens
+
+# How entity references are written into relationship prompts: "table" or "json"
+REFERENCE_FORMAT = os.environ.get("MAGICBOOK_REFERENCE_FORMAT", "table").lower()
+# Line shown with a table reference so the model knows how to read it
+TABLE_HINT = "one entity per row, fields separated by |"
+
+_LINE_BREAK = re.compile(r"\n[ \t]*")
+
+
+def _cell(value):
+    """Render one field of a table row"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def format_reference_table(rows):
+    """
+    Write reference records as a header line of field names followed by one
+    ``|``-separated row per record, e.g. ``_key|name|significance``.
+
+    Args:
+        rows: Reference records (dicts)
+
+    Returns:
+        str: The table
+    """
+    columns = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    lines = ["|".join(columns)]
+    lines.extend("|".join(_cell(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def format_reference(rows, reference_format=REFERENCE_FORMAT):
+    """
+    Write reference records in the given format.
+
+    Returns:
+        tuple: (payload, fence language, hint) for the prompt
+    """
+    if reference_format == "json":
+        return json.dumps(rows, indent=2), "json", None
+    return format_reference_table(rows), "", TABLE_HINT
+
+
+def payload_tokens(text):
+    """Approximate tokens of a payload: words and punctuation plus each line break with its indentation"""
+    return estimate_tokens(text) + len(_LINE_BREAK.findall(text))
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+
+from core.cooccurrence import COOCCURRENCE_MODE, COOCCURRENCE_RELATIONSHIPS
+from core.inverse_relations import INVERSE_RELATIONSHIPS
+from core.prompts.relationship_probe import RELATIONSHIP_PROBE_SYSTEM_PROMPT, RELATIONSHIP_PROBE_USER_PROMPT
+from core.sampling import sample_text
+from model.entity_types import RelationshipType
+from utils.file_utils import clean_json_string
+
+# Size of the book sample the probe reads (0 disables probing)
+PROBE_SAMPLE_TOKENS = int(os.environ.get("MAGICBOOK_PROBE_SAMPLE_TOKENS", 30000))
+# Clear instances the sample must contain for a relationship type to be extracted
+PROBE_MIN_INSTANCES = int(os.environ.get("MAGICBOOK_PROBE_MIN_INSTANCES", 1))
+
+
+def _is_true(value):
+    """Read a JSON answer flag; string answers ("false", "yes", ...) are parsed, not truth-tested"""
+    if isinstance(value, str):
+        return value.strip().lower() in {"true", "yes", "1"}
+    return bool(value)
+
+
+def _needs_probe(relationship_name, relationship_names):
+    """Whether a relationship type would cost a model call of its own"""
+    if COOCCURRENCE_MODE == "replace" and relationship_name in COOCCURRENCE_RELATIONSHIPS:
+        return False
+    inverse = INVERSE_RELATIONSHIPS.get(relationship_name)
+    return not (inverse and inverse[0] in relationship_names)
+
+
+def probe_relationship_types(llm, book_text, relationship_names, book_structure=None,
+                             sample_tokens=PROBE_SAMPLE_TOKENS, min_instances=PROBE_MIN_INSTANCES):
+    """
+    Ask, in one call over a stratified sample of the book, which candidate
+    relationship types have at least ``min_instances`` clear instances, so
+    only those go on to full extraction.
+
+    Types derived without a model call (co-occurrence, inverses of another
+    candidate) are not probed; an inverse is kept or dropped with the type it
+    is derived from. If the probe fails, every candidate is kept.
+
+    Args:
+        llm: Chat model
+        book_text: Book text
+        relationship_names: Candidate relationship type names
+        book_structure: Optional model.book.Book, to sample across chapters
+        sample_tokens: Token budget of the sample (0 disables probing)
+        min_instances: Clear instances required to keep a type
+
+    Returns:
+        tuple: (kept relationship names, probe) where probe maps each probed
+        name to {"present": bool, "count": int}
+    """
+    names = set(relationship_names)
+    probed = [name for name in relationship_names if _needs_probe(name, names)]
+    if not sample_tokens or not probed:
+        return list(relationship_names), {}
+
+    candidates = "\n".join(f"- {name}: {RelationshipType[name].value}" for name in probed)
+    messages = [
+        {"role": "system", "content": RELATIONSHIP_PROBE_SYSTEM_PROMPT.format(
+            min_instances=min_instances, candidates=candidates)},
+        {"role": "user", "content": RELATIONSHIP_PROBE_USER_PROMPT.format(
+            sample=sample_text(book_text, sample_tokens, book_structure))}
+    ]
+    try:
+        response = llm.invoke(messages)
+        answers = json.loads(clean_json_string(response.content))
+        probe = {}
+        for name in probed:
+            answer = answers.get(name) if isinstance(answers, dict) else None
+            if not isinstance(answer, dict):
+                # Unanswered candidates are kept
+                answer = {"present": True, "count": None}
+            probe[name] = {"present": _is_true(answer.get("present")), "count": answer.get("count")}
+    except Exception as e:
+        logging.error(f"Relationship probe failed; keeping all candidates: {e}")
+        return list(relationship_names), {}
+
+    def keep(name):
+        if name in probe:
+            return probe[name]["present"]
+        inverse = INVERSE_RELATIONSHIPS.get(name)
+        if inverse and inverse[0] in probe:
+            return probe[inverse[0]]["present"]
+        return True
+
+    kept = [name for name in relationship_names if keep(name)]
+    dropped = [name for name in relationship_names if name not in kept]
+    logging.info(f"Relationship probe kept {len(kept)}/{len(relationship_names)} types; "
+                 f"dropped {', '.join(dropped) or 'none'}")
+    return kept, probe
+
+
+def log_probe_accuracy(probe, relationships_map, min_instances=PROBE_MIN_INSTANCES):
+    """
+    Compare probe answers with the full extraction and log how well they
+    agreed.
+
+    Only types the probe kept are extracted, so agreement is measured on
+    those: a kept type agrees when extraction returned at least
+    ``min_instances`` rows. Dropped types are listed as unverified.
+
+    Args:
+        probe: Probe answers from probe_relationship_types
+        relationships_map: Extracted relationship rows by type name
+        min_instances: Rows a kept type was expected to yield
+
+    Returns:
+        dict: {"kept", "confirmed", "precision", "dropped"}, or None without a probe
+    """
+    if not probe:
+        return None
+    kept = [name for name, answer in probe.items() if answer["present"] and name in relationships_map]
+    confirmed = [name for name in kept if len(relationships_map.get(name) or []) >= min_instances]
+    dropped = sorted(name for name, answer in probe.items() if not answer["present"])
+    stats = {
+        "kept": len(kept),
+        "confirmed": len(confirmed),
+        "precision": round(len(confirmed) / len(kept), 3) if kept else None,
+        "dropped": dropped,
+    }
+    empty = sorted(set(kept) - set(confirmed))
+    logging.info(f"Relationship probe accuracy: {stats['confirmed']}/{stats['kept']} kept types yielded "
+                 f">= {min_instances} rows (precision {stats['precision']}); "
+                 f"false positives: {', '.join(empty) or 'none'}; unverified drops: {', '.join(dropped) or 'none'}")
+    return stats
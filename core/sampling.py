@@ -0,0 +1,63 @@
+import numpy as np
+
+from core.context_selector import CHARS_PER_TOKEN, PASSAGE_SEPARATOR, _snap
+
+# Number of passages a sample is spread over when the book has no detected chapters
+SAMPLE_PIECES = 12
+
+
+def sample_text(text, token_budget, book_structure=None, pieces=SAMPLE_PIECES, anchor_ends=False):
+    """
+    Take a stratified sample of a book within a token budget.
+
+    The budget is split evenly across strata: the detected chapters when
+    ``book_structure`` has them (one passage from the middle of each,
+    spread across the book if there are more chapters than the budget
+    allows), otherwise ``pieces`` equal slices of the text. Passage edges
+    are snapped to line or sentence breaks. With ``anchor_ends`` the first
+    passage is the opening of the book and the last one its ending, instead
+    of the middles of the first and last strata.
+
+    Args:
+        text: Book text
+        token_budget: Approximate token budget of the sample
+        book_structure: Optional model.book.Book
+        pieces: Number of slices when there are no chapters
+        anchor_ends: Sample the opening and ending of the book
+
+    Returns:
+        str: The sample (the whole text if it fits the budget)
+    """
+    budget_chars = int(token_budget * CHARS_PER_TOKEN)
+    if not text or len(text) <= budget_chars:
+        return text
+
+    chapters = book_structure.chapters if book_structure is not None else []
+    if chapters:
+        strata = [(chapter.start, chapter.end) for chapter in chapters]
+    else:
+        edges = np.linspace(0, len(text), pieces + 1).astype(int)
+        strata = list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+    # Keep passages at least a few paragraphs long; drop strata evenly if the budget is short
+    min_passage = 2000
+    count = max(1, min(len(strata), budget_chars // min_passage))
+    if count < len(strata):
+        strata = [strata[i] for i in np.linspace(0, len(strata) - 1, count).round().astype(int)]
+    passage_chars = budget_chars // len(strata) - len(PASSAGE_SEPARATOR)
+
+    if anchor_ends:
+        strata[0] = (0, strata[0][1])
+        strata[-1] = (strata[-1][0], len(text))
+    last = len(strata) - 1
+    passages = []
+    for i, (start, end) in enumerate(strata):
+        if anchor_ends and i == 0:
+            lo = 0
+        elif anchor_ends and i == last:
+            lo = max(start, end - passage_chars)
+        else:
+            lo = max(start, (start + end) // 2 - passage_chars // 2)
+        hi = min(end, lo + passage_chars)
+        passages.append(text[_snap(text, lo, -1):_snap(text, hi, 1)])
+    return PASSAGE_SEPARATOR.join(passages)
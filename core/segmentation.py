@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import re
+
+from model.book import Book, Segment
+
+# Shortest span between two headings for both to count; anything closer is a
+# table of contents or a running header, not a chapter
+MIN_CHAPTER_CHARS = 1500
+# Chapters needed before the structure is trusted enough to skip the CHAPTER LLM call
+MIN_CONFIDENT_CHAPTERS = 3
+MAX_HEADING_CHARS = 80
+
+_NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                 "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+                 "eighteen", "nineteen", "twenty"]
+_TENS_WORDS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60,
+               "seventy": 70, "eighty": 80, "ninety": 90}
+_ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
+
+_NUMBER = r"\d{1,3}|[ivxlcdm]{1,8}|(?:(?:twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety)[\s-]?)?(?:" + \
+          "|".join(_NUMBER_WORDS[1:]) + r")|twenty|thirty|forty|fifty|sixty|seventy|eighty|ninety"
+_CHAPTER_HEADING = re.compile(rf"^(chapter|chap\.)\s+({_NUMBER})\b\.?\s*[:.\-–—]?\s*(.*)$", re.IGNORECASE)
+_PART_HEADING = re.compile(rf"^(part|book)\s+({_NUMBER})\b\.?\s*[:.\-–—]?\s*(.*)$", re.IGNORECASE)
+_SPECIAL_HEADING = re.compile(r"^(prologue|epilogue|interlude|afterword|foreword)\b\s*[:.\-–—]?\s*(.*)$",
+                              re.IGNORECASE)
+# Scene breaks: a line made only of asterisks, hashes, tildes or bullets
+_SCENE_BREAK = re.compile(r"^[ \t]*(?:[*#~•·][ \t]*){1,5}$")
+
+
+def parse_number(token):
+    """
+    Parse a chapter number written as digits, roman numerals or English words.
+
+    Returns:
+        int: The number, or None if it cannot be parsed
+    """
+    token = token.lower().strip()
+    if token.isdigit():
+        return int(token)
+    if all(c in _ROMAN for c in token):
+        total = 0
+        for i, c in enumerate(token):
+            value = _ROMAN[c]
+            total += -value if i + 1 < len(token) and _ROMAN[token[i + 1]] > value else value
+        return total
+    words = re.split(r"[\s-]+", token)
+    if len(words) == 1:
+        if words[0] in _NUMBER_WORDS:
+            return _NUMBER_WORDS.index(words[0])
+        return _TENS_WORDS.get(words[0])
+    if len(words) == 2 and words[0] in _TENS_WORDS and words[1] in _NUMBER_WORDS[1:10]:
+        return _TENS_WORDS[words[0]] + _NUMBER_WORDS.index(words[1])
+    return None
+
+
+def _iter_lines(text):
+    """Yield (start offset, line without newline) for every line"""
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        yield offset, line.rstrip("\r\n")
+        offset += len(line)
+
+
+def _next_title_line(lines, i):
+    """A heading like 'CHAPTER 3' is often followed by its title on the next line"""
+    for _, line in lines[i + 1:i + 3]:
+        candidate = line.strip()
+        if not candidate:
+            continue
+        if len(candidate) <= 60 and not candidate.endswith((".", ",", ";")) \
+                and not _CHAPTER_HEADING.match(candidate):
+            return candidate
+        return None
+    return None
+
+
+def _find_headings(text):
+    """Find candidate chapter/part/prologue headings as (offset, kind, number, title)"""
+    lines = list(_iter_lines(text))
+    headings = []
+    for i, (offset, line) in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or len(stripped) > MAX_HEADING_CHARS:
+            continue
+        match = _CHAPTER_HEADING.match(stripped)
+        if match:
+            number = parse_number(match.group(2))
+            title = match.group(3).strip() or _next_title_line(lines, i)
+            label = f"Chapter {number if number is not None else match.group(2)}"
+            headings.append((offset, "chapter", number, f"{label}: {title}" if title else label))
+            continue
+        match = _SPECIAL_HEADING.match(stripped)
+        if match and (not match.group(2) or len(match.group(2)) <= 60):
+            kind = match.group(1).lower()
+            title = match.group(2).strip()
+            headings.append((offset, "prologue" if kind == "prologue" else
+                             "epilogue" if kind == "epilogue" else "interlude",
+                             None, f"{kind.capitalize()}: {title}" if title else kind.capitalize()))
+            continue
+        match = _PART_HEADING.match(stripped)
+        if match:
+            number = parse_number(match.group(2))
+            title = match.group(3).strip()
+            label = f"{match.group(1).capitalize()} {match.group(2)}"
+            headings.append((offset, "part", number, f"{label}: {title}" if title else label))
+    return headings
+
+
+def _drop_table_of_contents(headings, text_length):
+    """
+    Remove headings too close to the next one (tables of contents, running
+    headers) and, when a chapter number repeats within one part, keep its
+    last occurrence. Numbering that restarts after a part/book heading is
+    kept, so "Book One, Chapter 1-12" and "Book Two, Chapter 1-10" both stay.
+    """
+    kept = []
+    for i, heading in enumerate(headings):
+        next_offset = headings[i + 1][0] if i + 1 < len(headings) else text_length
+        too_close = next_offset - heading[0] < MIN_CHAPTER_CHARS
+        # Part headings legitimately sit right before the first chapter of the part,
+        # but not right before another part heading (a contents listing of the parts)
+        if heading[1] == "part":
+            if too_close and i + 1 < len(headings) and headings[i + 1][1] == "part":
+                continue
+        elif too_close:
+            continue
+        kept.append(heading)
+
+    last_seen, part = {}, 0
+    parts = []
+    for i, (_, kind, number, _) in enumerate(kept):
+        if kind == "part":
+            part += 1
+        parts.append(part)
+        if kind == "chapter" and number is not None:
+            last_seen[(part, number)] = i
+    return [heading for i, heading in enumerate(kept)
+            if not (heading[1] == "chapter" and heading[2] is not None and last_seen[(parts[i], heading[2])] != i)]
+
+
+def _is_confident(chapters, text_length):
+    """Chapters are trusted if there are enough, numbered in order, covering most of the text"""
+    if len(chapters) < MIN_CONFIDENT_CHAPTERS:
+        return False
+    numbers = [chapter.number for chapter in chapters]
+    if any(number is None for number in numbers):
+        return False
+    in_order = sum(1 for a, b in zip(numbers, numbers[1:]) if b == a + 1 or b == 1)
+    covered = sum(len(chapter) for chapter in chapters)
+    return in_order >= 0.8 * (len(numbers) - 1) and covered >= 0.6 * text_length
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _find_scenes(book, chapter):
+    """Split a chapter at scene-break lines"""
+    breaks = []
+    chapter_text = book.segment_text(chapter)
+    for offset, line in _iter_lines(chapter_text):
+        if line.strip() and _SCENE_BREAK.match(line):
+            breaks.append((chapter.start + offset, chapter.start + offset + len(line) + 1))
+    if not breaks:
+        return []
+
+    scenes = []
+    start = chapter.start
+    for break_start, break_end in breaks + [(chapter.end, chapter.end)]:
+        if break_start - start > 0 and book.text[start:break_start].strip():
+            scenes.append(_make_segment(book, "scene", len(scenes), f"{chapter.title} - scene {len(scenes) + 1}",
+                                        start, break_start))
+        start = min(break_end, chapter.end)
+    return scenes if len(scenes) > 1 else []
+
+
+def _make_segment(book, kind, index, title, start, end, number=None):
+    return Segment(kind, index, title, start, end,
+                   first_page=book.page_for_offset(start),
+                   last_page=book.page_for_offset(max(start, end - 1)),
+                   number=number, text_hash=_hash(book.text[start:end]))
+
+
+def segment_book(text, page_offsets=None):
+    """
+    Detect chapters (and scenes within them) with heading and scene-break rules.
+
+    Args:
+        text: Book text
+        page_offsets: Start offset of each page in ``text`` (see utils.file_utils.join_pages)
+
+    Returns:
+        Book: The text with its segments; ``confident`` tells whether the
+        chapter structure is clear enough to use instead of asking the model
+    """
+    book = Book(text, page_offsets=page_offsets)
+    headings = _drop_table_of_contents(_find_headings(text), len(text))
+
+    segments = []
+    if headings and headings[0][0] > 0 and text[:headings[0][0]].strip():
+        segments.append(_make_segment(book, "front_matter", 0, "Front matter", 0, headings[0][0]))
+    for i, (offset, kind, number, title) in enumerate(headings):
+        end = headings[i + 1][0] if i + 1 < len(headings) else len(text)
+        segments.append(_make_segment(book, kind, len(segments), title, offset, end, number=number))
+    book.segments = segments
+
+    for chapter in book.chapters:
+        chapter.scenes = _find_scenes(book, chapter)
+
+    book.confident = _is_confident(book.chapters, len(text))
+    logging.info(f"Segmented book: {len(book.chapters)} chapters, "
+                 f"{sum(len(c.scenes) for c in book.chapters)} scenes, confident={book.confident}")
+    return book
@@ -0,0 +1,112 @@
+import bisect
+
+
+class Segment:
+    """
+    A contiguous span of the book text: a chapter (or prologue, epilogue,
+    front matter...) or a scene within one.
+    """
+    def __init__(self, kind, index, title, start, end, first_page=None, last_page=None,
+                 number=None, text_hash=None):
+        self.kind = kind                # "chapter", "prologue", "epilogue", "part", "front_matter" or "scene"
+        self.index = index              # Position among segments of the same level
+        self.title = title
+        self.number = number            # Chapter number as printed (int), if any
+        self.start = start              # Character offsets into Book.text
+        self.end = end
+        self.first_page = first_page    # 0-based page indexes, if page offsets are known
+        self.last_page = last_page
+        self.text_hash = text_hash      # sha256 of the segment text
+        self.scenes = []
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"Segment({self.kind!r}, {self.title!r}, {self.start}:{self.end})"
+
+    def to_dict(self):
+        """Convert to dictionary for serialization"""
+        return {
+            "kind": self.kind,
+            "index": self.index,
+            "title": self.title,
+            "number": self.number,
+            "start": self.start,
+            "end": self.end,
+            "first_page": self.first_page,
+            "last_page": self.last_page,
+            "text_hash": self.text_hash,
+            "scenes": [scene.to_dict() for scene in self.scenes],
+        }
+
+
+class Book:
+    """
+    A book's text together with its detected structure.
+
+    ``segments`` cover the text in order (front matter, prologue, chapters,
+    epilogue...), each with character offsets, page range and content hash,
+    so work can be split or targeted per chapter instead of per book.
+    """
+    def __init__(self, text, segments=None, page_offsets=None, confident=False):
+        self.text = text
+        self.segments = segments or []
+        self.page_offsets = page_offsets or []
+        # True when chapter headings were found consistently enough to trust
+        self.confident = confident
+
+    @property
+    def chapters(self):
+        """Numbered chapters only (no front matter, prologue or epilogue)"""
+        return [segment for segment in self.segments if segment.kind == "chapter"]
+
+    def segment_text(self, segment):
+        """Return the text of a segment"""
+        return self.text[segment.start:segment.end]
+
+    def page_for_offset(self, offset):
+        """Return the 0-based page index containing a character offset (None without page offsets)"""
+        if not self.page_offsets:
+            return None
+        return max(0, bisect.bisect_right(self.page_offsets, offset) - 1)
+
+    def segment_for_offset(self, offset):
+        """Return the top-level segment containing a character offset"""
+        starts = [segment.start for segment in self.segments]
+        i = bisect.bisect_right(starts, offset) - 1
+        if i >= 0 and offset < self.segments[i].end:
+            return self.segments[i]
+        return None
+
+    def to_chapter_records(self, id_prefix="CHAP"):
+        """
+        Build CHAPTER entity records from the detected chapters.
+
+        Returns:
+            list: Records with _key, title, position, offsets, pages and hash
+        """
+        records = []
+        for i, chapter in enumerate(self.chapters):
+            record = {
+                "_key": f"{id_prefix}_{i+1:02d}",
+                "title": chapter.title,
+                "position": chapter.number if chapter.number is not None else i + 1,
+                "start_offset": chapter.start,
+                "end_offset": chapter.end,
+                "text_hash": chapter.text_hash,
+                "scenes": len(chapter.scenes),
+            }
+            if chapter.first_page is not None:
+                record["first_page"] = chapter.first_page + 1
+                record["last_page"] = chapter.last_page + 1
+            records.append(record)
+        return records
+
+    def to_dict(self):
+        """Convert to dictionary for serialization (without the text)"""
+        return {
+            "confident": self.confident,
+            "page_count": len(self.page_offsets),
+            "segments": [segment.to_dict() for segment in self.segments],
+        }
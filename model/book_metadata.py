@@ -1,8 +1,33 @@
+import threading
+
+# Guards lazy map loads when several sessions open the same book at once
+_LOAD_LOCK = threading.Lock()
+
+
 class BookMetadata:
     """
     Class representing metadata of a book, including extracted entities and relationships.
+
+    Changes are tracked so saves can write only what changed: assigning a
+    metadata field marks it dirty, assigning ``entities_map`` or
+    ``relationships_map`` marks that whole map dirty, and ``set_records``
+    marks a single entity/relationship type. Code that edits the record
+    lists in place should call ``mark_dirty``. A new instance is fully dirty
+    until it is saved or ``mark_clean`` is called.
+
+    Books listed from the cache register a loader per map (see
+    ``set_map_loader``) so their records are only read the first time the
+    map is accessed.
     """
+    METADATA_FIELDS = ("book_name", "author", "pages_count", "time_to_process", "summary")
+    MAP_KINDS = {"entities_map": "entities", "relationships_map": "relationships"}
+
     def __init__(self, book_name, author, pages_count, time_to_process, summary):
+        # Change tracking state (set first: __setattr__ records into it)
+        object.__setattr__(self, "_dirty_fields", set())
+        object.__setattr__(self, "_replaced_maps", set())
+        object.__setattr__(self, "_dirty_types", {kind: set() for kind in self.MAP_KINDS.values()})
+        object.__setattr__(self, "_map_loaders", {})
         self.book_name = book_name
         self.author = author
         self.pages_count = pages_count
@@ -37,6 +62,107 @@ class BookMetadata:
             summary=data.get("Summary", "")
         )
     
+    def __getattr__(self, name):
+        # Only called when the attribute is missing: a map whose loader has not run yet
+        loader = self.__dict__.get("_map_loaders", {}).get(name)
+        if loader is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        with _LOAD_LOCK:
+            if name not in self.__dict__:
+                object.__setattr__(self, name, loader())
+                self._map_loaders.pop(name, None)
+        return self.__dict__[name]
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.MAP_KINDS:
+            self._map_loaders.pop(name, None)
+        if name in self.METADATA_FIELDS:
+            self._dirty_fields.add(name)
+        elif name in self.MAP_KINDS:
+            self._replaced_maps.add(self.MAP_KINDS[name])
+            self._dirty_types[self.MAP_KINDS[name]].clear()
+
+    def set_map_loader(self, attr, loader):
+        """
+        Load a map on first access instead of now.
+
+        Args:
+            attr: "entities_map" or "relationships_map"
+            loader: Callable returning the map (or None)
+        """
+        self.__dict__.pop(attr, None)
+        self._map_loaders[attr] = loader
+
+    def is_loaded(self, attr):
+        """Return True if a map is in memory (not waiting on its loader)"""
+        return attr in self.__dict__
+
+    def set_records(self, kind, type_name, records):
+        """
+        Replace the records of one entity or relationship type.
+
+        Args:
+            kind: "entities" or "relationships"
+            type_name: Type name, e.g. "CHARACTER"
+            records: List of records, or None to remove the type
+        """
+        attr = f"{kind}_map"
+        records_map = getattr(self, attr)
+        if records_map is None:
+            if records is None:
+                return
+            records_map = {}
+            object.__setattr__(self, attr, records_map)
+        if records is None:
+            records_map.pop(type_name, None)
+        else:
+            records_map[type_name] = records
+        self.mark_dirty(kind, type_name)
+
+    def mark_dirty(self, kind=None, type_name=None):
+        """
+        Mark data as changed after editing it in place.
+
+        Args:
+            kind: "entities" or "relationships"; None marks everything dirty
+            type_name: Single type within ``kind``; None marks the whole map
+        """
+        if kind is None:
+            self._dirty_fields.update(self.METADATA_FIELDS)
+            self._replaced_maps.update(self.MAP_KINDS.values())
+        elif type_name is None:
+            self._replaced_maps.add(kind)
+        elif kind not in self._replaced_maps:
+            self._dirty_types[kind].add(type_name)
+
+    def mark_clean(self):
+        """Mark everything as saved"""
+        self._dirty_fields.clear()
+        self._replaced_maps.clear()
+        for types in self._dirty_types.values():
+            types.clear()
+
+    def is_dirty(self):
+        """Return True if anything changed since the last save"""
+        return bool(self._dirty_fields or self._replaced_maps
+                    or any(self._dirty_types.values()))
+
+    def changes(self):
+        """
+        Describe what changed since the last save.
+
+        Returns:
+            dict: {"fields": set of metadata fields,
+                   "maps": set of kinds whose whole map changed,
+                   "types": {kind: set of changed type names}}
+        """
+        return {
+            "fields": set(self._dirty_fields),
+            "maps": set(self._replaced_maps),
+            "types": {kind: set(types) for kind, types in self._dirty_types.items()},
+        }
+
     def update_maps(self, entities_map, relationships_map):
         """Update entities and relationships maps"""
         self.entities_map = entities_map
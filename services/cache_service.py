@@ -1,31 +1,120 @@
 import os
 import json
 import logging
+import shutil
+import threading
 import requests
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Any, Optional
 
 from model.book_metadata import BookMetadata
-from utils.file_utils import save_json, load_json
+from utils.file_utils import load_json, save_json, atomic_write_bytes
+from utils import columnar_store
+from utils.artifact_store import (get_store, put_records_map, put_records, remove_records,
+                                  get_records_map, encode_json, decode_json)
+from services.graph_cache import get_graph_cache
 
 # Global variable to hold all BookMetadata instances
 BOOK_METADATA_COLLECTION = []
+# Streamlit serves every session from one process, so guard the collection
+_COLLECTION_LOCK = threading.RLock()
 
-def load_cached_books():
+DATA_DIR = Path("data")
+TABLES_DIR_NAME = "tables"
+BOOKS_NAMESPACE = "books/"
+
+# Sample library sync
+SYNC_MANIFEST_NAME = ".sync_manifest.json"
+SYNC_MAX_WORKERS = int(os.environ.get("MAGICBOOK_SYNC_WORKERS", 8))
+SYNC_TIMEOUT = 30
+
+def _book_slug(book_name):
+    """Return the filesystem/cache-safe identifier for a book name"""
+    return book_name.replace(" ", "_").lower()
+
+def _book_dir(book_name):
+    """Return the legacy data/ directory for a book name"""
+    return DATA_DIR / _book_slug(book_name)
+
+def _book_entry(book_name):
+    """Return the artifact store entry id for a book name"""
+    return BOOKS_NAMESPACE + _book_slug(book_name)
+
+def _book_from_metadata_dict(metadata_dict):
+    """Build a BookMetadata (without maps) from a saved metadata dict"""
+    return BookMetadata(
+        book_name=metadata_dict.get("book_name", ""),
+        author=metadata_dict.get("author", ""),
+        pages_count=metadata_dict.get("pages_count", ""),
+        time_to_process=metadata_dict.get("time_to_process", ""),
+        summary=metadata_dict.get("summary", "")
+    )
+
+def _load_records_map(book_dir, kind):
     """
-    Load metadata of all cached books from the data directory
-    
+    Load the entities or relationships map for a book directory,
+    preferring the columnar tables over the legacy JSON file.
+
+    Args:
+        book_dir: Book cache directory
+        kind: "entities" or "relationships"
+
+    Returns:
+        dict: type name -> list of records, or None if nothing is stored
+    """
+    records_map = columnar_store.read_tables(book_dir / TABLES_DIR_NAME / kind)
+    if records_map is not None:
+        return records_map
+
+    json_file = book_dir / f"{kind}.json"
+    if json_file.exists():
+        return load_json(json_file)
+    return None
+
+def _load_store_books():
+    """
+    List every book saved in the artifact store; entities and relationships
+    are loaded on first access
+
+    Returns:
+        list: List of BookMetadata objects
+    """
+    store = get_store()
+    books = []
+    for entry_id in store.entries(BOOKS_NAMESPACE):
+        try:
+            metadata_bytes = store.get(entry_id, "metadata.json")
+            if metadata_bytes is None:
+                continue
+
+            book = _book_from_metadata_dict(decode_json(metadata_bytes))
+            # Records are parsed when a book is opened, not for every book at startup
+            for attr, kind in BookMetadata.MAP_KINDS.items():
+                book.set_map_loader(attr, lambda kind=kind, entry_id=entry_id:
+                                    get_records_map(store, entry_id, kind))
+            book.mark_clean()
+            books.append(book)
+            logging.info(f"Loaded book: {book.book_name}")
+        except Exception as e:
+            logging.error(f"Error loading book {entry_id} from cache store: {e}")
+    return books
+
+def _load_data_dir_books(skip_names):
+    """
+    Load books from the data directory (the sample library shipped with the
+    repository and books saved before the artifact store existed)
+
+    Args:
+        skip_names: Book names already loaded from the store
+
     Returns:
         list: List of BookMetadata objects
     """
-    global BOOK_METADATA_COLLECTION
-    
-    # If collection is already populated, return it
-    if BOOK_METADATA_COLLECTION:
-        return BOOK_METADATA_COLLECTION
-    
     # Ensure data directory exists
-    data_dir = Path("data")
+    data_dir = DATA_DIR
     if not data_dir.exists():
         data_dir.mkdir(parents=True)
         logging.info(f"Created data directory at {data_dir.absolute()}")
@@ -37,31 +126,21 @@ def load_cached_books():
     
     for book_dir in book_dirs:
         metadata_file = book_dir / "metadata.json"
-        entities_file = book_dir / "entities.json"
-        relationships_file = book_dir / "relationships.json"
         
         if not metadata_file.exists():
             continue
             
         try:
             metadata_dict = load_json(metadata_file)
-            if not metadata_dict:
+            if not metadata_dict or metadata_dict.get("book_name", "") in skip_names:
                 continue
                 
-            book = BookMetadata(
-                book_name=metadata_dict.get("book_name", ""),
-                author=metadata_dict.get("author", ""),
-                pages_count=metadata_dict.get("pages_count", ""),
-                time_to_process=metadata_dict.get("time_to_process", ""),
-                summary=metadata_dict.get("summary", "")
-            )
+            book = _book_from_metadata_dict(metadata_dict)
             
-            # Load entities and relationships if they exist
-            if entities_file.exists():
-                book.entities_map = load_json(entities_file)
-                
-            if relationships_file.exists():
-                book.relationships_map = load_json(relationships_file)
+            # Load entities and relationships when the book is opened
+            for attr, kind in BookMetadata.MAP_KINDS.items():
+                book.set_map_loader(attr, lambda kind=kind, book_dir=book_dir:
+                                    _load_records_map(book_dir, kind))
                 
             loaded_books.append(book)
             logging.info(f"Loaded book: {book.book_name}")
@@ -69,8 +148,29 @@ def load_cached_books():
         except Exception as e:
             logging.error(f"Error loading book metadata from {metadata_file}: {e}")
     
-    BOOK_METADATA_COLLECTION = loaded_books
-    return BOOK_METADATA_COLLECTION
+    return loaded_books
+
+def load_cached_books():
+    """
+    Load metadata of all cached books from the artifact store and the data directory
+    
+    Entities and relationships are read the first time a book's maps are accessed.
+    
+    Returns:
+        list: List of BookMetadata objects
+    """
+    global BOOK_METADATA_COLLECTION
+    
+    with _COLLECTION_LOCK:
+        # If collection is already populated, return it
+        if BOOK_METADATA_COLLECTION:
+            return list(BOOK_METADATA_COLLECTION)
+        
+        loaded_books = _load_store_books()
+        loaded_books += _load_data_dir_books({book.book_name for book in loaded_books})
+        
+        BOOK_METADATA_COLLECTION = loaded_books
+        return list(BOOK_METADATA_COLLECTION)
 
 def select_cached_book(book_name):
     """
@@ -100,12 +200,18 @@ def get_cached_book_list():
     books = load_cached_books()
     return [book.book_name for book in books] if books else ["No cached books found"]
 
-def save_book_metadata(book_metadata):
+def save_book_metadata(book_metadata, pinned=None):
     """
-    Save book metadata to cache directory
+    Save book metadata to the artifact store
+    
+    Only what changed since the book was loaded or last saved is written
+    (see BookMetadata change tracking): the metadata part if a field changed,
+    and only the dirty entity/relationship types. A book the store has
+    never seen is written in full.
     
     Args:
         book_metadata: BookMetadata object to save
+        pinned: If given, pin (or unpin) the book so eviction never removes it
         
     Returns:
         bool: True if successful, False otherwise
@@ -114,10 +220,11 @@ def save_book_metadata(book_metadata):
         logging.error("Cannot save book: Invalid book metadata")
         return False
     
-    # Create book directory
-    book_name_safe = book_metadata.book_name.replace(" ", "_").lower()
-    book_dir = Path("data") / book_name_safe
-    book_dir.mkdir(parents=True, exist_ok=True)
+    store = get_store()
+    entry_id = _book_entry(book_metadata.book_name)
+    if not store.contains(entry_id):
+        book_metadata.mark_dirty()
+    changes = book_metadata.changes()
     
     # Save metadata
     metadata_dict = {
@@ -128,43 +235,245 @@ def save_book_metadata(book_metadata):
         "summary": book_metadata.summary
     }
     
-    metadata_saved = save_json(metadata_dict, book_dir / "metadata.json")
-    
-    # Save entities and relationships if they exist
-    entities_saved = True
-    relationships_saved = True
-    
-    if book_metadata.entities_map:
-        entities_saved = save_json(book_metadata.entities_map, book_dir / "entities.json")
+    try:
+        if changes["fields"]:
+            store.put(entry_id, "metadata.json", encode_json(metadata_dict), pinned=pinned)
+        elif pinned is not None:
+            store.pin(entry_id, pinned)
         
-    if book_metadata.relationships_map:
-        relationships_saved = save_json(book_metadata.relationships_map, book_dir / "relationships.json")
+        # Save entities and relationships that changed
+        for attr, kind in BookMetadata.MAP_KINDS.items():
+            if not (kind in changes["maps"] or changes["types"][kind]):
+                continue  # Unchanged: do not load a lazy map just to skip it
+            records_map = getattr(book_metadata, attr)
+            if kind in changes["maps"]:
+                put_records_map(store, entry_id, kind, records_map or {})
+                continue
+            for type_name in changes["types"][kind]:
+                if records_map and type_name in records_map:
+                    put_records(store, entry_id, kind, type_name, records_map[type_name])
+                else:
+                    remove_records(store, entry_id, kind, type_name)
+    except Exception as e:
+        logging.error(f"Error saving book '{book_metadata.book_name}' to cache store: {e}")
+        return False
+    
+    book_metadata.mark_clean()
     
     # Update global collection if not already present
     global BOOK_METADATA_COLLECTION
     book_exists = False
     
-    for i, book in enumerate(BOOK_METADATA_COLLECTION):
-        if book.book_name == book_metadata.book_name:
-            BOOK_METADATA_COLLECTION[i] = book_metadata
-            book_exists = True
-            break
-            
-    if not book_exists:
-        BOOK_METADATA_COLLECTION.append(book_metadata)
+    with _COLLECTION_LOCK:
+        for i, book in enumerate(BOOK_METADATA_COLLECTION):
+            if book.book_name == book_metadata.book_name:
+                BOOK_METADATA_COLLECTION[i] = book_metadata
+                book_exists = True
+                break
+                
+        if not book_exists:
+            BOOK_METADATA_COLLECTION.append(book_metadata)
     
-    return metadata_saved and entities_saved and relationships_saved
+    return True
 
-def download_repo_contents(api_url, local_dir='.', metadata_list=None):
+def create_http_session(pool_size=SYNC_MAX_WORKERS, retries=3):
     """
-    Recursively downloads JSON and TXT files from a GitHub repo via its API,
-    preserving the repository's folder structure locally.
+    Create a pooled HTTP session for talking to GitHub (or a stand-in server)
     
-    For each folder:
-    - Temporarily stores JSON files (for entities and relationships).
-    - When a file named 'book.txt' is found, parses it into a BookMetadata
-      and assigns any previously stored JSON data.
-    - If additional JSON files are found after 'book.txt', updates the object.
+    Args:
+        pool_size: Connections kept open per host (match the download parallelism)
+        retries: Retries for connection errors and 429/5xx responses
+        
+    Returns:
+        requests.Session: Session with keep-alive pooling and retries
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # A token raises GitHub's API rate limit from 60 to 5000 requests per hour
+    token = os.environ.get("GITHUB_TOKEN")
+    if token:
+        session.headers["Authorization"] = f"Bearer {token}"
+    return session
+
+def _conditional_get(session, url, etag=None):
+    """GET ``url``, sending If-None-Match when we have an ETag; returns the response"""
+    headers = {"If-None-Match": etag} if etag else {}
+    response = session.get(url, headers=headers, timeout=SYNC_TIMEOUT)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+def _fetch_listing(session, api_url, cached):
+    """
+    Fetch one directory listing, reusing the cached listing on 304.
+
+    Returns:
+        dict: {"etag", "items"} or None on failure
+    """
+    try:
+        response = _conditional_get(session, api_url, cached.get("etag") if cached else None)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching {api_url}: {e}")
+        return None
+    if response.status_code == 304:
+        return cached
+    return {"etag": response.headers.get("ETag"), "items": response.json()}
+
+def _sync_file(session, item, local_path, cached):
+    """
+    Download one file unless the local copy is known to be current.
+
+    Returns:
+        tuple: (status, manifest entry) with status "downloaded", "unchanged" or "failed"
+    """
+    sha = item.get("sha")
+    if cached and local_path.exists():
+        # GitHub listings carry the blob sha, so unchanged files need no request at all
+        if sha and cached.get("sha") == sha:
+            return "unchanged", cached
+        etag = cached.get("etag")
+    else:
+        etag = None
+
+    try:
+        response = _conditional_get(session, item["download_url"], etag)
+    except requests.RequestException as e:
+        logging.error(f"Error downloading {item['name']}: {e}")
+        return "failed", cached
+
+    if response.status_code == 304:
+        return "unchanged", {**cached, "sha": sha}
+
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(local_path, response.content)
+    logging.info(f"Downloaded {item['name']} to {local_path.parent}")
+    return "downloaded", {"etag": response.headers.get("ETag"), "sha": sha, "size": len(response.content)}
+
+def _book_from_folder(folder, file_names):
+    """
+    Build a BookMetadata from a synced folder's book.txt and JSON files.
+
+    JSON files with 'entities' in their name become the entities map and
+    those with 'relationship' the relationships map.
+    """
+    book_file = next((name for name in file_names if name.lower() == "book.txt"), None)
+    if book_file is None:
+        return None
+    try:
+        book = BookMetadata.from_txt((folder / book_file).read_text(encoding="utf-8"))
+    except Exception as e:
+        logging.error(f"Error parsing {folder / book_file}: {e}")
+        return None
+
+    for name in file_names:
+        if not name.endswith(".json") or not (folder / name).exists():
+            continue
+        if "entities" in name.lower():
+            book.entities_map = load_json(folder / name)
+        elif "relationship" in name.lower():
+            book.relationships_map = load_json(folder / name)
+    return book
+
+def sync_repo_contents(api_url, local_dir=".", max_workers=SYNC_MAX_WORKERS, session=None):
+    """
+    Mirror the JSON and TXT files of a GitHub repo folder into ``local_dir``
+    and register every folder containing a 'book.txt' as a cached book.
+    
+    Directory listings and files are fetched in parallel over one pooled
+    session. A manifest in ``local_dir`` remembers each listing's and file's
+    ETag (and GitHub blob sha), so repeat runs send conditional requests and
+    only download files that changed.
+    
+    Args:
+        api_url (str): GitHub contents API URL of the repository or folder.
+            Any server answering with the same JSON shape works (e.g. a local
+            stand-in for testing).
+        local_dir (str): The local directory where files will be saved.
+        max_workers (int): Maximum parallel requests.
+        session (requests.Session): Session to use; a pooled one is created if omitted.
+        
+    Returns:
+        dict: {"books": [BookMetadata], "downloaded": int, "unchanged": int, "failed": int}
+    """
+    local_dir = Path(local_dir)
+    local_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = local_dir / SYNC_MANIFEST_NAME
+    manifest = load_json(manifest_path) if manifest_path.exists() else None
+    if not isinstance(manifest, dict):
+        manifest = {}
+    listings = manifest.get("listings", {})
+    files = manifest.get("files", {})
+
+    owns_session = session is None
+    if owns_session:
+        session = create_http_session(pool_size=max_workers)
+
+    result = {"books": [], "downloaded": 0, "unchanged": 0, "failed": 0}
+    new_listings, new_files = {}, {}
+    folders = {}  # relative folder -> file names, in listing order
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Walk the tree level by level, fetching each level's listings in parallel
+            pending = [(api_url, PurePosixPath())]
+            downloads = []
+            while pending:
+                fetched = executor.map(lambda d: _fetch_listing(session, d[0], listings.get(d[0])), pending)
+                next_level = []
+                for (url, rel_dir), listing in zip(pending, fetched):
+                    if listing is None:
+                        continue
+                    new_listings[url] = listing
+                    for item in listing["items"]:
+                        if item["type"] == "dir":
+                            next_level.append((item["url"], rel_dir / item["name"]))
+                        elif item["type"] == "file" and item["name"].endswith((".json", ".txt")):
+                            if not item.get("download_url"):
+                                logging.warning(f"Missing download URL for {item['name']}")
+                                continue
+                            folders.setdefault(rel_dir, []).append(item["name"])
+                            downloads.append((item, str(rel_dir / item["name"])))
+                pending = next_level
+
+            futures = {rel_path: executor.submit(_sync_file, session, item,
+                                                 local_dir / rel_path, files.get(rel_path))
+                       for item, rel_path in downloads}
+            changed_folders = set()
+            for rel_path, future in futures.items():
+                status, entry = future.result()
+                result[status] += 1
+                if entry:
+                    new_files[rel_path] = entry
+                if status == "downloaded":
+                    changed_folders.add(PurePosixPath(rel_path).parent)
+    finally:
+        if owns_session:
+            session.close()
+
+    # Keep entries for folders we could not list this time so they are not refetched later
+    save_json({"listings": {**listings, **new_listings}, "files": {**files, **new_files}}, manifest_path)
+
+    store = get_store()
+    for rel_dir, file_names in folders.items():
+        book = _book_from_folder(local_dir / rel_dir, file_names)
+        if book is None:
+            continue
+        result["books"].append(book)
+        # Sample books are pinned so eviction keeps them; unchanged ones are already stored
+        if rel_dir in changed_folders or not store.contains(_book_entry(book.book_name)):
+            save_book_metadata(book, pinned=True)
+
+    logging.info(f"Synced {api_url}: {result['downloaded']} downloaded, "
+                 f"{result['unchanged']} unchanged, {result['failed']} failed")
+    return result
+
+def download_repo_contents(api_url, local_dir='.', metadata_list=None):
+    """
+    Download the sample library from a GitHub repo via its API, preserving the
+    repository's folder structure locally (see ``sync_repo_contents``).
     
     Args:
         api_url (str): The GitHub API URL for the repository or folder.
@@ -176,76 +485,7 @@ def download_repo_contents(api_url, local_dir='.', metadata_list=None):
     """
     if metadata_list is None:
         metadata_list = []
-        
-    try:
-        response = requests.get(api_url)
-        response.raise_for_status()
-        items = response.json()
-    except requests.RequestException as e:
-        logging.error(f"Error fetching {api_url}: {e}")
-        return metadata_list
-        
-    if not os.path.exists(local_dir):
-        os.makedirs(local_dir)
-        
-    # Temporary storage for JSON content in this folder
-    temp_entities = None
-    temp_relationships = None
-    current_book = None
-    
-    for item in items:
-        if item['type'] == 'file' and (item['name'].endswith('.json') or item['name'].endswith('.txt')):
-            file_url = item.get('download_url')
-            if not file_url:
-                logging.warning(f"Missing download URL for {item['name']}")
-                continue
-                
-            try:
-                file_response = requests.get(file_url)
-                file_response.raise_for_status()
-            except requests.RequestException as e:
-                logging.error(f"Error downloading {item['name']}: {e}")
-                continue
-                
-            file_path = os.path.join(local_dir, item['name'])
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(file_response.text)
-                
-            logging.info(f"Downloaded {item['name']} to {local_dir}")
-            
-            if item['name'].lower() == 'book.txt':
-                # Create BookMetadata from book.txt and assign any JSON data
-                try:
-                    current_book = BookMetadata.from_txt(file_response.text)
-                    current_book.entities_map = temp_entities
-                    current_book.relationships_map = temp_relationships
-                except Exception as e:
-                    logging.error(f"Error parsing {item['name']}: {e}")
-            elif item['name'].endswith('.json'):
-                # Load JSON data from the file
-                json_data = load_json(file_path)
-                if json_data is None:
-                    continue
-                    
-                if 'entities' in item['name'].lower():
-                    temp_entities = json_data
-                    if current_book is not None:
-                        current_book.entities_map = json_data
-                elif 'relationship' in item['name'].lower():
-                    temp_relationships = json_data
-                    if current_book is not None:
-                        current_book.relationships_map = json_data
-        elif item['type'] == 'dir':
-            new_local_dir = os.path.join(local_dir, item['name'])
-            download_repo_contents(item['url'], new_local_dir, metadata_list)
-            
-    # If a BookMetadata object was created in this folder, add it to the list
-    if current_book:
-        metadata_list.append(current_book)
-        
-        # Also save to local cache
-        save_book_metadata(current_book)
-        
+    metadata_list.extend(sync_repo_contents(api_url, local_dir)["books"])
     return metadata_list
 
 def delete_cached_book(book_name):
@@ -262,39 +502,69 @@ def delete_cached_book(book_name):
         logging.error("Cannot delete book: No book name provided")
         return False
     
+    # Drop the shared in-memory graph; sessions viewing it keep their handle
+    get_graph_cache().invalidate(book_name)
+    
     # Find the book in the collection
     global BOOK_METADATA_COLLECTION
     book_to_delete = None
     
-    for book in BOOK_METADATA_COLLECTION:
-        if book.book_name == book_name:
-            book_to_delete = book
-            break
-            
-    if not book_to_delete:
-        logging.error(f"Book '{book_name}' not found in cached collection")
-        return False
+    with _COLLECTION_LOCK:
+        for book in BOOK_METADATA_COLLECTION:
+            if book.book_name == book_name:
+                book_to_delete = book
+                break
+                
+        if not book_to_delete:
+            logging.error(f"Book '{book_name}' not found in cached collection")
+            return False
+        
+        # Remove from collection
+        BOOK_METADATA_COLLECTION.remove(book_to_delete)
     
-    # Remove from collection
-    BOOK_METADATA_COLLECTION.remove(book_to_delete)
+    # Delete from the artifact store
+    deleted_from_store = get_store().delete(_book_entry(book_name))
     
     # Delete directory
-    book_name_safe = book_name.replace(" ", "_").lower()
-    book_dir = Path("data") / book_name_safe
+    book_dir = _book_dir(book_name)
     
     if not book_dir.exists():
-        logging.warning(f"Book directory not found: {book_dir}")
+        if not deleted_from_store:
+            logging.warning(f"Book directory not found: {book_dir}")
         return True  # Book removed from collection successfully
     
     try:
-        # Delete all files in directory
-        for file in book_dir.iterdir():
-            file.unlink()
-        
-        # Delete directory
-        book_dir.rmdir()
+        # Delete directory and everything in it (including columnar tables)
+        shutil.rmtree(book_dir)
         logging.info(f"Deleted book directory: {book_dir}")
         return True
     except Exception as e:
         logging.error(f"Error deleting book directory: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def clear_cached_books(include_pinned=False):
+    """
+    Remove all cached books and extraction results from the artifact store
+    
+    Args:
+        include_pinned: Also remove pinned entries such as the sample library
+        
+    Returns:
+        int: Number of store entries removed
+    """
+    global BOOK_METADATA_COLLECTION
+    removed = get_store().clear(include_pinned=include_pinned)
+    with _COLLECTION_LOCK:
+        for book in BOOK_METADATA_COLLECTION:
+            get_graph_cache().invalidate(book.book_name)
+        BOOK_METADATA_COLLECTION = []
+    return removed
+
+def get_cache_stats():
+    """
+    Get usage, hit, miss and eviction statistics of the artifact store
+    
+    Returns:
+        dict: Store statistics
+    """
+    return get_store().stats()
@@ -0,0 +1,246 @@
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import networkx as nx
+
+# Memory budget for graphs no session is using; graphs in use are never evicted
+DEFAULT_MAX_BYTES = int(os.environ.get("MAGICBOOK_GRAPH_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def _value_bytes(value):
+    """Approximate deep size of an attribute value (embeddings are lists of floats)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + _value_bytes(v) for k, v in value.items())
+    return size
+
+
+def estimate_graph_bytes(G):
+    """
+    Estimate the memory held by a graph's node and edge attributes.
+
+    Args:
+        G: NetworkX graph
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sys.getsizeof(G)
+    for _, attrs in G.nodes(data=True):
+        size += _value_bytes(attrs)
+    for _, _, attrs in G.edges(data=True):
+        size += _value_bytes(attrs)
+    return size
+
+
+class GraphHandle:
+    """
+    A session's reference to a shared, read-only graph.
+
+    Sessions keep the handle (not a copy of the graph) and call ``release``
+    when they switch books. If a session simply goes away, the reference is
+    dropped when the handle is garbage collected.
+    """
+
+    def __init__(self, cache, key, entry):
+        self.key = key
+        self.graph = entry["graph"]
+        self.book_metadata = entry["book_metadata"]
+        self._finalizer = weakref.finalize(self, cache._release, entry)
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def release(self):
+        """Drop this session's reference (safe to call more than once)"""
+        self._finalizer()
+
+
+class GraphCache:
+    """
+    Thread-safe, process-wide cache of frozen book graphs shared by every
+    Streamlit session.
+
+    Each book's graph is built once (concurrent requests for the same book
+    wait for the same build), frozen so no session can mutate it, and
+    reference counted through ``GraphHandle`` objects. Graphs with no
+    handles are evicted least-recently-used first when the cache exceeds
+    ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._building = {}
+        # Bumped by invalidate/put so a build that started earlier is not cached
+        self._generations = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def acquire(self, key, build_fn):
+        """
+        Get a handle to the graph for ``key``, building it if needed.
+
+        Args:
+            key: Cache key (the book name)
+            build_fn: Callable returning ``(graph, book_metadata)``; called at
+                most once per key even if several sessions ask concurrently
+
+        Returns:
+            GraphHandle: Handle to the shared graph, or None if the build failed
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._stats["hits"] += 1
+                return self._new_handle(key, entry)
+
+            self._stats["misses"] += 1
+            future = self._building.get(key)
+            owner = future is None
+            if owner:
+                future = self._building[key] = Future()
+                generation = self._generations.get(key, 0)
+
+        if owner:
+            stale = False
+            try:
+                graph, book_metadata = build_fn()
+                if not isinstance(graph, nx.Graph):
+                    raise ValueError(f"Graph build for '{key}' returned {type(graph)}")
+                with self._lock:
+                    # Invalidated (or replaced) while building: the result is out of date
+                    stale = self._generations.get(key, 0) != generation
+                    if not stale:
+                        handle = self._new_handle(key, self._insert(key, graph, book_metadata))
+                if stale:
+                    logging.info(f"Discarding graph for '{key}' invalidated during its build")
+                    future.set_result(None)
+                else:
+                    future.set_result(True)
+                    return handle
+            except Exception as e:
+                logging.error(f"Error building graph for '{key}': {e}", exc_info=True)
+                future.set_result(False)
+                return None
+            finally:
+                with self._lock:
+                    if self._building.get(key) is future:
+                        self._building.pop(key)
+            return self.acquire(key, build_fn)
+
+        result = future.result()
+        if result is None:
+            # The build was discarded as stale; use (or start) a fresh one
+            return self.acquire(key, build_fn)
+        if not result:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            return self._new_handle(key, entry) if entry else None
+
+    def put(self, key, graph, book_metadata):
+        """
+        Add an already built graph (e.g. a freshly processed upload) and
+        return a handle to it. Replaces any graph cached under ``key``.
+        """
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            return self._new_handle(key, self._insert(key, graph, book_metadata))
+
+    def get_if_cached(self, key):
+        """Return a handle if the graph is already built, without building it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return self._new_handle(key, entry) if entry else None
+
+    def is_cached(self, key):
+        """Return True if the graph for ``key`` is built and in memory"""
+        with self._lock:
+            return key in self._entries
+
+    def is_building(self, key):
+        """Return True if a build for ``key`` is in progress"""
+        with self._lock:
+            return key in self._building
+
+    def invalidate(self, key):
+        """
+        Forget the graph for ``key`` (e.g. after the book was deleted or
+        reprocessed). Sessions holding handles keep their graph until released,
+        and a build already in progress for ``key`` is discarded when it ends.
+        """
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    def stats(self):
+        """Report cache usage and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                **self._stats,
+                "graphs": len(self._entries),
+                "in_use": sum(1 for e in self._entries.values() if e["refcount"] > 0),
+                "bytes": sum(e["bytes"] for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- internals -----------------------------------------------------
+
+    def _insert(self, key, graph, book_metadata):
+        graph = nx.freeze(graph)
+        entry = self._entries[key] = {
+            "graph": graph,
+            "book_metadata": book_metadata,
+            "bytes": estimate_graph_bytes(graph),
+            "refcount": 0,
+            "last_access": time.time(),
+        }
+        self._evict_over_budget(protect=key)
+        return entry
+
+    def _new_handle(self, key, entry):
+        entry["refcount"] += 1
+        entry["last_access"] = time.time()
+        return GraphHandle(self, key, entry)
+
+    def _release(self, entry):
+        with self._lock:
+            if entry["refcount"] > 0:
+                entry["refcount"] -= 1
+                entry["last_access"] = time.time()
+            self._evict_over_budget()
+
+    def _evict_over_budget(self, protect=None):
+        total = sum(e["bytes"] for e in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        idle = sorted((e["last_access"], k) for k, e in self._entries.items()
+                      if e["refcount"] == 0 and k != protect)
+        for _, key in idle:
+            total -= self._entries.pop(key)["bytes"]
+            self._stats["evictions"] += 1
+            logging.info(f"Evicted graph '{key}' from the shared graph cache")
+            if total <= self.max_bytes:
+                return
+
+
+_GRAPH_CACHE = None
+_GRAPH_CACHE_LOCK = threading.Lock()
+
+
+def get_graph_cache():
+    """Return the process-wide GraphCache"""
+    global _GRAPH_CACHE
+    with _GRAPH_CACHE_LOCK:
+        if _GRAPH_CACHE is None:
+            _GRAPH_CACHE = GraphCache()
+        return _GRAPH_CACHE
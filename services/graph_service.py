@@ -12,12 +12,14 @@ from core.extractor import EntityRelationshipExtractor
 from core.prompts.relationships_prompts_map import RELATIONSHIP_PROMPTS_MAP
 from core.prompts.entity_prompt_map import ENTITY_PROMPTS_MAP
 
-from core.prompts.entity_discovery import ENTITY_RELATIONSHIPS_DISCOVERY_SYSTEM_PROMPT, ENTITY_RELATIONSHIPS_DISCOVERY_USER_PROMPT
+from core.discovery import discover_types
 from core.refference_mapping import reference_mapping_creator
+from core.relationship_probe import probe_relationship_types, log_probe_accuracy
 from model.book_metadata import BookMetadata
 from model.entity_types import EntityType, RelationshipType, enum_to_string
 from utils.file_utils import extract_text_from_pdf, clean_json_string
 from utils.graph_utils import ensure_consistency
+from utils.extraction_stats import PROFILE
 from core.graph_builder import create_graph_with_embeddings
 from core.visualizer import create_plotly_graph
 
@@ -126,12 +128,16 @@ def filter_valid_relationship_types(relationship_types, enum_class):
 
 
 
-def create_graph_from_text(book_text, status_callback=None):
+def create_graph_from_text(book_text, status_callback=None, book_structure=None, book_info=None):
     """
     Create a graph from a book with synchronous processing.
     
     Args:
         book_text: Text content of the book
+        book_structure: Optional model.book.Book from core.segmentation; when its
+            chapters are confident they replace the CHAPTER extraction call
+        book_info: Optional title/author/page_count read from the PDF; spares
+            the metadata call when title and author are known
         
     Returns:
         Tuple of (graph, entities, relationships) or None if an error occurred
@@ -141,22 +147,12 @@ def create_graph_from_text(book_text, status_callback=None):
 
     if status_callback: status_callback("Extract entities and relationships...")
     try:
-        # Prepare messages for entity-relationship discovery
-        messages = [
-            {"role": "system", "content": ENTITY_RELATIONSHIPS_DISCOVERY_SYSTEM_PROMPT.format(
-                entity_type_enum=enum_to_string(EntityType),
-                relationship_type_enum=enum_to_string(RelationshipType)
-            )},
-            {"role": "user", "content": ENTITY_RELATIONSHIPS_DISCOVERY_USER_PROMPT.format(book_text=book_text)}
-        ]
-        
         llm = create_llm_client(status_callback)
         if not llm:
             return None
-        response = llm.invoke(messages)
-        cleaned_json = clean_json_string(response.content)
-        print("Cleaned JSON:", cleaned_json)
-        book_entities_json = json.loads(cleaned_json)
+        # Entity-relationship discovery on a stratified sample of the book
+        book_entities_json = discover_types(llm, book_text, book_structure=book_structure)
+        print("Discovered types:", book_entities_json)
         reference_mappings = reference_mapping_creator()
         
         if status_callback: status_callback(f"Found {len(book_entities_json['Entities'])} entities and {len(book_entities_json['Relationships'])} relationships")
@@ -165,9 +161,17 @@ def create_graph_from_text(book_text, status_callback=None):
             book_entities_json['Entities'],
             book_entities_json['Relationships'],
             reference_mappings,
-            threshold=2
+            threshold=2,
+            profile=PROFILE
         )
 
+        # Drop relationship types a cheap probe over a sample of the book finds no instances of
+        if status_callback: status_callback("Probing which relationship types occur in the book...")
+        ensured_relationships, probe = probe_relationship_types(llm, book_text, ensured_relationships,
+                                                                book_structure=book_structure)
+        if status_callback and probe:
+            status_callback(f"Probe kept {len(ensured_relationships)} relationship types for full extraction")
+
         # Initialize extractor
         extractor = EntityRelationshipExtractor(
             chat_model=llm,
@@ -177,12 +181,15 @@ def create_graph_from_text(book_text, status_callback=None):
             relationship_prompts_map=RELATIONSHIP_PROMPTS_MAP,
             reference_mappings=reference_mappings,
             book_text=book_text,
-            status_callback=status_callback
+            status_callback=status_callback,
+            book_structure=book_structure,
+            book_info=book_info
         )
         
         if status_callback: status_callback("Extracting entities and relationships...")
         # Extract entities and relationships
         filled_entities, filled_relationships = extractor.extract_all()
+        log_probe_accuracy(probe, filled_relationships)
         
         if status_callback: status_callback("Creating graph with embeddings...")
         # Create graph with embeddings
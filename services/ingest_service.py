@@ -0,0 +1,65 @@
+import logging
+
+from utils import text_cache
+from utils.file_utils import iter_pdf_pages, join_pages, hash_file, read_pdf_info
+from utils.text_normalizer import normalize_pages
+
+
+def extract_book_text(pdf_path, pdf_hash=None, status_callback=None):
+    """
+    Get the normalized text of a PDF, reusing an earlier extraction of the
+    same bytes.
+
+    Running headers/footers, page numbers, hyphenation breaks and whitespace
+    runs are stripped page by page (utils.text_normalizer) before the pages
+    are joined, since every extraction prompt resends the whole text. The
+    text cache is keyed by the sha256 of the PDF, so re-uploading a book
+    (from any session, under any name) skips PyPDF2 entirely.
+
+    Args:
+        pdf_path: Path to the PDF file
+        pdf_hash: sha256 of the file if already known (e.g. computed while
+            copying the upload); computed from the file otherwise
+        status_callback: Optional progress callback
+
+    Returns:
+        tuple: (text, info) where info holds page_count, page_offsets,
+        pdf_info (title/author from the document info), the normalization
+        report (token_reduction, ...) and the other extraction metadata
+        recorded by utils.text_cache
+
+    Raises:
+        ValueError: If no text could be extracted
+    """
+    def update_progress(message):
+        if status_callback:
+            status_callback(message)
+
+    pdf_hash = pdf_hash or hash_file(pdf_path)
+    cached = text_cache.load(pdf_hash)
+    if cached is not None:
+        text, info = cached
+        if "pdf_info" not in info:
+            # Cached before document info was recorded
+            info["pdf_info"] = read_pdf_info(str(pdf_path))
+        logging.info(f"Reusing extracted text for PDF {pdf_hash[:12]} ({info.get('page_count')} pages)")
+        update_progress(f"Reusing previously extracted text ({info.get('page_count')} pages)...")
+        return text, info
+
+    # Pages are streamed in order as they are extracted
+    pages = []
+    for page in iter_pdf_pages(str(pdf_path)):
+        pages.append(page["text"])
+        if (page["page_index"] + 1) % 50 == 0:
+            update_progress(f"Extracting text from PDF... {page['page_index'] + 1} pages")
+    pages, normalization = normalize_pages(pages)
+    text, page_offsets = join_pages(pages)
+    del pages
+
+    if not text:
+        raise ValueError("Text extraction failed: Empty result.")
+
+    update_progress(f"Removed PDF artifacts: ~{normalization['token_reduction']:.0%} fewer tokens per prompt")
+    info = text_cache.save(pdf_hash, text, page_offsets, normalization=normalization,
+                           pdf_info=read_pdf_info(str(pdf_path)))
+    return text, info
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services.cache_service import select_cached_book, get_cached_book_list
+from services.graph_cache import get_graph_cache
+from services.graph_service import create_graph_from_book_metadata
+from utils.artifact_store import get_store, encode_json, decode_json
+
+# How many of the most frequently loaded books to build when the process starts
+WARMUP_TOP_N = int(os.environ.get("MAGICBOOK_PREFETCH_TOP_N", 3))
+# Background graph builds running at the same time
+PREFETCH_WORKERS = int(os.environ.get("MAGICBOOK_PREFETCH_WORKERS", 2))
+
+LOAD_COUNTS_ENTRY = "stats/book_loads"
+LOAD_COUNTS_PART = "counts.json"
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_LOCK = threading.Lock()
+_PENDING = set()
+_WARMED_UP = False
+
+
+def build_book_graph(book_name):
+    """
+    Build the graph for a cached book (the GraphCache build function).
+
+    Args:
+        book_name: Name of a cached book
+
+    Returns:
+        tuple: (networkx.MultiDiGraph, BookMetadata)
+
+    Raises:
+        ValueError: If the book is not cached or its graph cannot be built
+    """
+    book_metadata = select_cached_book(book_name)
+    if not book_metadata:
+        raise ValueError(f"Book '{book_name}' not found in cache")
+    graph = create_graph_from_book_metadata(book_metadata)
+    if graph is None:
+        raise ValueError(f"Failed to create graph for '{book_name}' from metadata")
+    return graph, book_metadata
+
+
+def _prefetch_task(book_name):
+    try:
+        handle = get_graph_cache().acquire(book_name, lambda: build_book_graph(book_name))
+        if handle is not None:
+            # Hold no reference: the graph stays cached until a session uses it or it is evicted
+            handle.release()
+            logging.info(f"Prefetched graph for '{book_name}'")
+    finally:
+        with _LOCK:
+            _PENDING.discard(book_name)
+
+
+def prefetch_book(book_name):
+    """
+    Start building a book's graph in the background if it is not already
+    cached or being built. A later ``GraphCache.acquire`` for the same book
+    attaches to the in-flight build or returns the finished graph.
+
+    Args:
+        book_name: Name of a cached book
+
+    Returns:
+        bool: True if a background build was scheduled
+    """
+    cache = get_graph_cache()
+    with _LOCK:
+        if (not book_name or book_name in _PENDING
+                or cache.is_cached(book_name) or cache.is_building(book_name)):
+            return False
+        _PENDING.add(book_name)
+    _EXECUTOR.submit(_prefetch_task, book_name)
+    return True
+
+
+def _read_load_counts(store):
+    data = store.get(LOAD_COUNTS_ENTRY, LOAD_COUNTS_PART)
+    if data is None:
+        return {}
+    try:
+        return decode_json(data)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable book load counts: {e}")
+        return {}
+
+
+def get_load_counts():
+    """
+    Get how many times each book has been loaded, across restarts.
+
+    Returns:
+        dict: Book name -> load count
+    """
+    return _read_load_counts(get_store())
+
+
+def record_book_load(book_name):
+    """Count a load of ``book_name`` so warm-up favours popular books"""
+    store = get_store()
+    try:
+        with store.writer_lock(LOAD_COUNTS_ENTRY, timeout=5):
+            counts = _read_load_counts(store)
+            counts[book_name] = counts.get(book_name, 0) + 1
+            store.put(LOAD_COUNTS_ENTRY, LOAD_COUNTS_PART, encode_json(counts), pinned=True)
+    except Exception as e:
+        logging.warning(f"Could not record load of '{book_name}': {e}")
+
+
+def warm_up(top_n=WARMUP_TOP_N):
+    """
+    Prefetch the most frequently loaded cached books. Runs once per process;
+    later calls (e.g. from other sessions) do nothing.
+
+    Args:
+        top_n: Number of books to prefetch
+
+    Returns:
+        list: Names of the books scheduled for prefetch
+    """
+    global _WARMED_UP
+    with _LOCK:
+        if _WARMED_UP:
+            return []
+        _WARMED_UP = True
+
+    available = set(get_cached_book_list())
+    counts = get_load_counts()
+    popular = sorted((name for name in counts if name in available), key=lambda name: -counts[name])
+    scheduled = [name for name in popular[:top_n] if prefetch_book(name)]
+    if scheduled:
+        logging.info(f"Warming graph cache with: {', '.join(scheduled)}")
+    return scheduled
@@ -0,0 +1,25 @@
+from core.context_selector import CHARS_PER_TOKEN, select_context
+from core.mention_index import build_mention_index
+
+
+def test_dense_mentions_stay_within_budget():
+    # A 2M-char book with a character or location mentioned every ~600-1000 chars
+    filler = "The road went on and the day grew long. " * 20
+    paragraphs = []
+    for i in range(2_300):
+        name = "Frodo Baggins" if i % 2 else "the Shire"
+        paragraphs.append(f"{name} waited. {filler[:500 + (i * 37) % 400]}")
+    text = "\n".join(paragraphs)
+    assert len(text) > 1_500_000
+    entities = {
+        "CHARACTER": [{"_key": "CHAR_01", "name": "Frodo Baggins"}],
+        "LOCATION": [{"_key": "LOCA_01", "name": "the Shire"}],
+    }
+    index = build_mention_index(text, entities)
+
+    result = select_context(text, index, ["CHARACTER", "LOCATION"], token_budget=60000)
+
+    assert result is not None
+    context, stats = result
+    assert len(context) <= 60000 * CHARS_PER_TOKEN
+    assert stats["passages"] > 1
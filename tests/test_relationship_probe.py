@@ -0,0 +1,28 @@
+import json
+from types import SimpleNamespace
+
+from core.relationship_probe import probe_relationship_types
+
+
+class FakeModel:
+    def __init__(self, answers):
+        self.answers = answers
+
+    def invoke(self, messages):
+        return SimpleNamespace(content=json.dumps(self.answers))
+
+
+def test_string_answers_are_parsed():
+    model = FakeModel({
+        "Family_PARENT_OF": {"present": "false", "count": 0},
+        "Emotional_LOVES": {"present": "no", "count": 0},
+        "Emotional_TRUSTS": {"present": "Yes", "count": 2},
+        "Family_SIBLING_OF": {"present": True, "count": 1},
+    })
+    names = ["Family_PARENT_OF", "Emotional_LOVES", "Emotional_TRUSTS", "Family_SIBLING_OF"]
+
+    kept, probe = probe_relationship_types(model, "Frodo and Sam. " * 100, names, sample_tokens=1000)
+
+    assert kept == ["Emotional_TRUSTS", "Family_SIBLING_OF"]
+    assert probe["Family_PARENT_OF"]["present"] is False
+    assert probe["Emotional_TRUSTS"]["present"] is True
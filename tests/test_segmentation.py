@@ -0,0 +1,31 @@
+from core.segmentation import segment_book
+
+
+def _chapter(number, length=3000):
+    body = "Hobbits walked along the road and talked about the weather. " * (length // 60)
+    return f"Chapter {number}\n\n{body}\n\n"
+
+
+def test_numbering_restarts_in_each_part():
+    contents = "Contents\n" + "".join(f"Book {part}\n" + "".join(f"Chapter {n}\n" for n in range(1, count + 1))
+                                      for part, count in (("One", 12), ("Two", 10)))
+    text = (contents + "\n"
+            + "Book One\n\n" + "".join(_chapter(n) for n in range(1, 13))
+            + "Book Two\n\n" + "".join(_chapter(n) for n in range(1, 11)))
+
+    book = segment_book(text)
+
+    assert [chapter.number for chapter in book.chapters] == list(range(1, 13)) + list(range(1, 11))
+    assert all(len(chapter) > 3000 for chapter in book.chapters)
+    assert book.confident
+
+
+def test_table_of_contents_is_dropped():
+    contents = "Contents\n" + "".join(f"Chapter {n}\n" for n in range(1, 6))
+    preface = "A note on the text. " * 100 + "\n\n"
+    text = contents + preface + "".join(_chapter(n) for n in range(1, 6))
+
+    book = segment_book(text)
+
+    assert [chapter.number for chapter in book.chapters] == [1, 2, 3, 4, 5]
+    assert book.chapters[0].start > len(contents)
@@ -0,0 +1,19 @@
+from utils.text_normalizer import normalize_pages
+
+
+def _page(number):
+    body = "\n".join(f"Sentence {i} of page {number} tells more of the journey east." for i in range(15))
+    return f"{number} THE FELLOWSHIP OF THE RING\n{body}\nChapter Two - {number}\n"
+
+
+def test_numbered_headers_and_footers_are_stripped():
+    pages = [_page(number) for number in range(1, 41)]
+
+    cleaned, report = normalize_pages(pages)
+
+    headers = sum("FELLOWSHIP OF THE RING" in page for page in cleaned)
+    footers = sum("Chapter Two -" in page for page in cleaned)
+    assert headers <= 1
+    assert footers <= 1
+    assert report["token_reduction"] > 0
+    assert all("tells more of the journey" in page for page in cleaned)
@@ -0,0 +1,543 @@
+# utils/artifact_store.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.compression import compress, decompress
+from utils.file_utils import atomic_write_bytes, file_lock
+
+# Default location and limits; both can be overridden through the environment
+DEFAULT_ROOT = Path(os.environ.get("MAGICBOOK_CACHE_DIR", ".magic_cache"))
+DEFAULT_MAX_BYTES = int(os.environ.get("MAGICBOOK_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+DEFAULT_POLICY = os.environ.get("MAGICBOOK_CACHE_POLICY", "lru")
+
+# Access times are kept in memory and flushed at most this often on reads
+ACCESS_FLUSH_INTERVAL = 5.0
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for cached book artifacts.
+
+    Blobs are written once under ``objects/<sha256>`` and shared by every
+    entry that references the same content. An entry groups the parts of one
+    artifact (e.g. ``books/the_little_prince`` holds its metadata and one
+    table per entity/relationship type) and is the unit of eviction, so a
+    book is never left half evicted.
+
+    The store keeps total object bytes under ``max_bytes`` by evicting the
+    least recently used (``"lru"``) or least frequently used (``"lfu"``)
+    unpinned entries. Pinned entries, such as the sample library, are never
+    evicted.
+
+    Several processes (e.g. Streamlit workers) may share one store. Every
+    change to the index happens under an advisory file lock, after reloading
+    the index from disk, and both objects and the index are written with
+    write-then-rename so a crash never leaves a truncated file.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES, policy=DEFAULT_POLICY):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.locks_dir = self.root / "locks"
+        self.index_path = self.root / "index.json"
+        self.lock_path = self.root / "index.lock"
+        self.max_bytes = max_bytes
+        self.policy = policy
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._index_mtime = None
+        self._last_flush = 0.0
+        # Accesses recorded since the last write, merged into the index under the file lock
+        self._pending_access = {}
+        self._pending_stats = {"hits": 0, "misses": 0}
+        self._index = self._load_index()
+
+    # --- index persistence ---------------------------------------------
+
+    def _empty_index(self):
+        return {
+            "entries": {},
+            "objects": {},
+            "stats": {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0},
+        }
+
+    def _index_file_mtime(self):
+        try:
+            return self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self):
+        self._index_mtime = self._index_file_mtime()
+        if self._index_mtime is None:
+            return self._empty_index()
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            for key, value in self._empty_index().items():
+                index.setdefault(key, value)
+            return index
+        except Exception as e:
+            logging.error(f"Error reading cache index {self.index_path}, starting empty: {e}")
+            return self._empty_index()
+
+    def _refresh(self):
+        """Reload the index if another process has rewritten it"""
+        if self._index_file_mtime() != self._index_mtime:
+            self._index = self._load_index()
+
+    def _apply_pending(self):
+        for entry_id, access in self._pending_access.items():
+            entry = self._index["entries"].get(entry_id)
+            if entry:
+                entry["last_access"] = max(entry.get("last_access", 0), access["last_access"])
+                entry["hits"] = entry.get("hits", 0) + access["hits"]
+        for key, value in self._pending_stats.items():
+            self._index["stats"][key] += value
+        self._pending_access = {}
+        self._pending_stats = {"hits": 0, "misses": 0}
+
+    def _save_index(self):
+        atomic_write_bytes(self.index_path, json.dumps(self._index).encode("utf-8"))
+        self._index_mtime = self._index_file_mtime()
+        self._last_flush = time.time()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the store lock (thread and process wide) around a read-modify-write
+        of the index. The outermost holder reloads the index first and saves it
+        on exit, so nested calls share one transaction.
+        """
+        with self._lock:
+            outermost = self._lock_depth == 0
+            if not outermost:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            with file_lock(self.lock_path):
+                self._lock_depth += 1
+                try:
+                    self._index = self._load_index()
+                    self._apply_pending()
+                    yield
+                    self._save_index()
+                except BaseException:
+                    # Nothing was saved; drop the half-applied changes from memory too
+                    self._index = self._load_index()
+                    raise
+                finally:
+                    self._lock_depth -= 1
+
+    # --- helpers -------------------------------------------------------
+
+    def _object_path(self, digest):
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def _release(self, digest):
+        """Drop one reference to an object and delete it when unreferenced"""
+        obj = self._index["objects"].get(digest)
+        if not obj:
+            return 0
+        obj["refcount"] -= 1
+        if obj["refcount"] > 0:
+            return 0
+        del self._index["objects"][digest]
+        self._object_path(digest).unlink(missing_ok=True)
+        return obj["size"]
+
+    def _remove_entry(self, entry_id):
+        entry = self._index["entries"].pop(entry_id, None)
+        if not entry:
+            return 0
+        return sum(self._release(digest) for digest in entry["parts"].values())
+
+    # --- public API ----------------------------------------------------
+
+    def put(self, entry_id, part, data, pinned=None, codec=None):
+        """
+        Store ``data`` as ``part`` of an entry.
+
+        Args:
+            entry_id: Entry identifier, e.g. "books/the_little_prince"
+            part: Part name within the entry, e.g. "entities/CHARACTER"
+            data: Bytes to store
+            pinned: If given, set the entry's pinned flag
+            codec: Compression codec for the object on disk (see
+                utils.compression); "none" keeps it readable in place,
+                e.g. for Parquet, which compresses itself
+
+        Returns:
+            str: The sha256 digest of the (uncompressed) content
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._locked():
+            entry = self._index["entries"].setdefault(
+                entry_id, {"parts": {}, "created": time.time(), "last_access": time.time(),
+                           "hits": 0, "pinned": False})
+            if pinned is not None:
+                entry["pinned"] = pinned
+
+            previous = entry["parts"].get(part)
+            if previous == digest:
+                return digest
+
+            obj = self._index["objects"].get(digest)
+            path = self._object_path(digest)
+            if obj is None or not path.exists():
+                stored = compress(data, codec)
+                atomic_write_bytes(path, stored)
+                if obj is None:
+                    obj = self._index["objects"][digest] = {"size": len(stored), "refcount": 0}
+            obj["refcount"] += 1
+
+            entry["parts"][part] = digest
+            if previous:
+                self._release(previous)
+
+            entry["last_access"] = time.time()
+            self._evict_over_budget(protect=entry_id)
+            return digest
+
+    def get(self, entry_id, part):
+        """
+        Read a part of an entry, decompressing it if needed.
+
+        Returns:
+            bytes: The stored content, or None on a miss
+        """
+        path = self.path(entry_id, part)
+        if path is None:
+            return None
+        try:
+            return decompress(path.read_bytes())
+        except FileNotFoundError:
+            logging.warning(f"Cache object for {entry_id}/{part} is missing on disk")
+            return None
+
+    def path(self, entry_id, part):
+        """
+        Return the on-disk path of a part, e.g. for file-based readers
+        (only meaningful for parts stored with ``codec="none"``).
+        Counts as an access for hit/miss statistics and eviction order.
+
+        Returns:
+            Path: Object path, or None on a miss
+        """
+        with self._lock:
+            self._refresh()
+            entry = self._index["entries"].get(entry_id)
+            digest = entry["parts"].get(part) if entry else None
+            if digest is None:
+                self._pending_stats["misses"] += 1
+            else:
+                self._pending_stats["hits"] += 1
+                access = self._pending_access.setdefault(entry_id, {"last_access": 0, "hits": 0})
+                access["last_access"] = time.time()
+                access["hits"] += 1
+
+            if time.time() - self._last_flush > ACCESS_FLUSH_INTERVAL:
+                self.flush()
+            return self._object_path(digest) if digest else None
+
+    def flush(self):
+        """Persist access times and hit/miss counters recorded since the last write"""
+        with self._locked():
+            pass
+
+    def parts(self, entry_id, prefix=""):
+        """List the part names of an entry, optionally filtered by prefix"""
+        with self._lock:
+            self._refresh()
+            entry = self._index["entries"].get(entry_id)
+            if not entry:
+                return []
+            return sorted(p for p in entry["parts"] if p.startswith(prefix))
+
+    def remove_part(self, entry_id, part):
+        """Remove a single part from an entry"""
+        with self._locked():
+            entry = self._index["entries"].get(entry_id)
+            if not entry or part not in entry["parts"]:
+                return False
+            self._release(entry["parts"].pop(part))
+            return True
+
+    def entries(self, namespace=""):
+        """List entry ids, optionally restricted to a namespace such as "books/" """
+        with self._lock:
+            self._refresh()
+            return sorted(e for e in self._index["entries"] if e.startswith(namespace))
+
+    def contains(self, entry_id):
+        """Return True if the entry exists (does not count as an access)"""
+        with self._lock:
+            self._refresh()
+            return entry_id in self._index["entries"]
+
+    def delete(self, entry_id):
+        """Delete an entry and any objects only it referenced"""
+        with self._locked():
+            if entry_id not in self._index["entries"]:
+                return False
+            self._remove_entry(entry_id)
+            return True
+
+    def pin(self, entry_id, pinned=True):
+        """Pin (or unpin) an entry so eviction never removes it"""
+        with self._locked():
+            entry = self._index["entries"].get(entry_id)
+            if not entry:
+                return False
+            entry["pinned"] = pinned
+            return True
+
+    def clear(self, include_pinned=False):
+        """
+        Remove all entries (pinned ones only if ``include_pinned``).
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._locked():
+            victims = [e for e, meta in self._index["entries"].items()
+                       if include_pinned or not meta.get("pinned")]
+            for entry_id in victims:
+                self._remove_entry(entry_id)
+            return len(victims)
+
+    def total_bytes(self):
+        """Total size of all stored objects"""
+        with self._lock:
+            return sum(obj["size"] for obj in self._index["objects"].values())
+
+    def stats(self):
+        """
+        Report usage and hit/miss/eviction counters.
+
+        Returns:
+            dict: Store statistics
+        """
+        with self._locked():
+            stats = dict(self._index["stats"])
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "entries": len(self._index["entries"]),
+                "pinned_entries": sum(1 for e in self._index["entries"].values() if e.get("pinned")),
+                "objects": len(self._index["objects"]),
+                "bytes": self.total_bytes(),
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+            })
+            return stats
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several changes into one index update: parts put inside the
+        block become visible to other readers and processes together, on
+        exit, and none of them do if the process dies first.
+        """
+        with self._locked():
+            yield self
+
+    def writer_lock(self, entry_id, timeout=None):
+        """
+        Advisory lock that makes one process the single writer of an entry.
+
+        Hold it around expensive work that produces the entry (e.g. a book
+        extraction) so concurrent workers wait for the result instead of
+        redoing the work or overwriting each other.
+
+        Raises:
+            TimeoutError: If another process holds the lock past ``timeout``
+        """
+        name = hashlib.sha256(entry_id.encode("utf-8")).hexdigest()[:32]
+        return file_lock(self.locks_dir / f"{name}.lock", timeout=timeout)
+
+    # --- eviction ------------------------------------------------------
+
+    def _eviction_order(self, protect):
+        candidates = [(entry_id, meta) for entry_id, meta in self._index["entries"].items()
+                      if not meta.get("pinned") and entry_id != protect]
+        if self.policy == "lfu":
+            key = lambda item: (item[1].get("hits", 0), item[1].get("last_access", 0))
+        else:
+            key = lambda item: item[1].get("last_access", 0)
+        return [entry_id for entry_id, _ in sorted(candidates, key=key)]
+
+    def _evict_over_budget(self, protect=None):
+        if self.max_bytes is None:
+            return
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        for entry_id in self._eviction_order(protect):
+            freed = self._remove_entry(entry_id)
+            self._index["stats"]["evictions"] += 1
+            self._index["stats"]["evicted_bytes"] += freed
+            total -= freed
+            logging.info(f"Evicted cache entry {entry_id} ({freed} bytes)")
+            if total <= self.max_bytes:
+                return
+
+        if total > self.max_bytes:
+            logging.warning(f"Cache is over budget ({total} > {self.max_bytes} bytes) "
+                            "but only pinned or in-use entries remain")
+
+    def evict(self):
+        """Enforce the byte budget now"""
+        with self._locked():
+            self._evict_over_budget()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide ArtifactStore"""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ArtifactStore()
+        return _STORE
+
+
+def encode_json(data):
+    """Serialize JSON-compatible data the same way for every caller so identical content dedupes"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_json(data):
+    """Inverse of ``encode_json``"""
+    return json.loads(data.decode("utf-8"))
+
+
+# --- records maps (entities / relationships) ---------------------------------
+
+def _records_part(kind, type_name, suffix):
+    return f"{kind}/{type_name}{suffix}"
+
+
+def _records_format():
+    """Return (suffix, encode, codec) for record parts in this environment"""
+    from utils import columnar_store
+
+    # Parquet compresses its own pages (zstd), so the store does not compress it again
+    if columnar_store.is_available():
+        return columnar_store.TABLE_SUFFIX, columnar_store.encode_records, "none"
+    return ".json", encode_json, None
+
+
+def put_records(store, entry_id, kind, type_name, records, pinned=None):
+    """
+    Store the records of a single type, replacing any stored version.
+
+    Args:
+        store: ArtifactStore to write to
+        entry_id: Entry identifier
+        kind: "entities" or "relationships"
+        type_name: Type name, e.g. "CHARACTER"
+        records: List of records
+        pinned: Optional pinned flag for the entry
+
+    Returns:
+        str: The part name written
+    """
+    suffix, encode, codec = _records_format()
+    part = _records_part(kind, type_name, suffix)
+    store.put(entry_id, part, encode(records or []), pinned=pinned, codec=codec)
+    # Drop the other format's part if the environment changed since the last save
+    for stale in store.parts(entry_id, prefix=_records_part(kind, type_name, ".")):
+        if stale != part:
+            store.remove_part(entry_id, stale)
+    return part
+
+
+def remove_records(store, entry_id, kind, type_name):
+    """Remove a type's records from an entry, whichever format they were stored in"""
+    for part in store.parts(entry_id, prefix=_records_part(kind, type_name, ".")):
+        store.remove_part(entry_id, part)
+
+
+def put_records_map(store, entry_id, kind, records_map, pinned=None):
+    """
+    Store an entities or relationships map as one part per type.
+
+    Types are stored as Parquet tables when pyarrow is available and as JSON
+    otherwise. Both the extraction cache and the book library use this, so a
+    book saved by both is stored only once.
+
+    Args:
+        store: ArtifactStore to write to
+        entry_id: Entry identifier
+        kind: "entities" or "relationships"
+        records_map: Dict mapping type name -> list of records
+        pinned: Optional pinned flag for the entry
+    """
+    written = set()
+    for type_name, records in records_map.items():
+        written.add(put_records(store, entry_id, kind, type_name, records, pinned=pinned))
+
+    for part in store.parts(entry_id, prefix=f"{kind}/"):
+        if part not in written:
+            store.remove_part(entry_id, part)
+
+
+def get_records(store, entry_id, kind, type_name):
+    """
+    Read the records of a single type from an entry.
+
+    Returns:
+        list: Records, or None if the type is not stored
+    """
+    from utils import columnar_store
+
+    parquet_part = _records_part(kind, type_name, columnar_store.TABLE_SUFFIX)
+    if parquet_part in store.parts(entry_id, prefix=parquet_part):
+        path = store.path(entry_id, parquet_part)
+        if path is not None:
+            return columnar_store.read_table_file(path)
+        return None
+
+    data = store.get(entry_id, _records_part(kind, type_name, ".json"))
+    if data is None:
+        return None
+    return decode_json(data)
+
+
+def get_records_map(store, entry_id, kind):
+    """
+    Read a whole entities or relationships map from an entry.
+
+    Returns:
+        dict: type name -> list of records, or None if nothing is stored
+    """
+    parts = store.parts(entry_id, prefix=f"{kind}/")
+    if not parts:
+        return None
+
+    records_map = {}
+    for part in parts:
+        type_name = part[len(kind) + 1:].rsplit(".", 1)[0]
+        records = get_records(store, entry_id, kind, type_name)
+        if records is None:
+            return None
+        records_map[type_name] = records
+    return records_map
@@ -0,0 +1,203 @@
+import json
+import logging
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; callers fall back to JSON
+    pa = None
+    pq = None
+
+# Schema metadata key listing the columns whose values were JSON-encoded
+JSON_COLUMNS_KEY = b"magicbook.json_columns"
+TABLE_SUFFIX = ".parquet"
+
+
+def is_available():
+    """Return True if pyarrow is installed and columnar storage can be used"""
+    return pa is not None
+
+
+def _column_kind(values):
+    """
+    Pick the Arrow type for a column of Python values.
+
+    Homogeneous scalar columns keep their native type. Anything else (lists,
+    dicts, or a mix such as ``111`` and ``"unknown"``) is stored as JSON text.
+    """
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int):
+            kinds.add("int")
+        elif isinstance(value, float):
+            kinds.add("float")
+        elif isinstance(value, str):
+            kinds.add("str")
+        else:
+            kinds.add("json")
+
+    if not kinds:
+        return "str"
+    if len(kinds) == 1 and "json" not in kinds:
+        return kinds.pop()
+    return "json"
+
+
+_ARROW_TYPES = {
+    "bool": lambda: pa.bool_(),
+    "int": lambda: pa.int64(),
+    "float": lambda: pa.float64(),
+    "str": lambda: pa.string(),
+    "json": lambda: pa.string(),
+}
+
+
+def records_to_table(records):
+    """
+    Convert a list of entity or relationship dicts into an Arrow table.
+
+    Args:
+        records: List of dictionaries (one per entity/relationship)
+
+    Returns:
+        pyarrow.Table: Table with one column per key seen in the records
+    """
+    columns = []
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns.append(key)
+
+    arrays = []
+    json_columns = []
+    for column in columns:
+        values = [record.get(column) for record in records]
+        kind = _column_kind(values)
+        if kind == "json":
+            json_columns.append(column)
+            values = [None if v is None else json.dumps(v, ensure_ascii=False) for v in values]
+        arrays.append(pa.array(values, type=_ARROW_TYPES[kind]()))
+
+    metadata = {JSON_COLUMNS_KEY: json.dumps(json_columns).encode("utf-8")}
+    return pa.Table.from_arrays(arrays, names=columns, metadata=metadata)
+
+
+def table_to_records(table):
+    """
+    Convert an Arrow table produced by ``records_to_table`` back to dicts.
+
+    Null values are omitted from the resulting records; the rest of the app
+    reads entity fields with ``.get()`` so a missing key and ``None`` are
+    treated the same.
+    """
+    metadata = table.schema.metadata or {}
+    json_columns = set(json.loads(metadata.get(JSON_COLUMNS_KEY, b"[]")))
+
+    records = []
+    for row in table.to_pylist():
+        record = {}
+        for key, value in row.items():
+            if value is None:
+                continue
+            record[key] = json.loads(value) if key in json_columns else value
+        records.append(record)
+    return records
+
+
+def encode_records(records):
+    """
+    Serialize a list of records into Parquet bytes.
+
+    Args:
+        records: List of entity or relationship dicts
+
+    Returns:
+        bytes: Parquet file contents
+    """
+    sink = pa.BufferOutputStream()
+    pq.write_table(records_to_table(records or []), sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+
+def read_table_file(path, columns=None, filters=None):
+    """
+    Read records from a single Parquet file with projection and filter pushdown.
+
+    Args:
+        path: Path to the Parquet file (read memory-mapped)
+        columns: Optional list of columns to read; unknown columns are ignored
+        filters: Optional pyarrow filter expression or DNF list, e.g.
+            ``[("significance", "=", "Main")]``
+
+    Returns:
+        list: Records, or None if the file could not be read
+    """
+    if not is_available():
+        return None
+
+    try:
+        if columns is not None:
+            available = pq.read_schema(path, memory_map=True).names
+            columns = [c for c in columns if c in available]
+        table = pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+        return table_to_records(table)
+    except Exception as e:
+        logging.error(f"Error reading columnar table {path}: {e}")
+        return None
+
+
+def list_tables(directory):
+    """List the type names that have a table in a directory"""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(p.stem for p in directory.glob(f"*{TABLE_SUFFIX}"))
+
+
+def read_table(directory, type_name, columns=None, filters=None):
+    """
+    Read the table for a single type, optionally projecting columns and
+    pushing filters down to the Parquet reader.
+
+    Args:
+        directory: Directory holding the tables
+        type_name: Entity or relationship type name (e.g. "CHARACTER")
+        columns: Optional list of columns to read; unknown columns are ignored
+        filters: Optional pyarrow filter expression or DNF list, e.g.
+            ``[("significance", "=", "Main")]``
+
+    Returns:
+        list: Records of that type, or None if the table does not exist
+    """
+    if not is_available():
+        return None
+
+    path = Path(directory) / f"{type_name}{TABLE_SUFFIX}"
+    if not path.exists():
+        return None
+    return read_table_file(path, columns=columns, filters=filters)
+
+
+def read_tables(directory):
+    """
+    Read every table in a directory back into a records map.
+
+    Returns:
+        dict: type name -> list of records, or None if no tables exist
+    """
+    type_names = list_tables(directory)
+    if not type_names or not is_available():
+        return None
+
+    records_map = {}
+    for type_name in type_names:
+        records = read_table(directory, type_name)
+        if records is None:
+            return None
+        records_map[type_name] = records
+    return records_map
@@ -0,0 +1,102 @@
+# utils/compression.py
+import gzip
+import logging
+import lzma
+import os
+
+try:
+    import zstandard
+except ImportError:  # optional fast codec
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional fast codec
+    lz4_frame = None
+
+# Compressed blobs start with MAGIC followed by one codec id byte. The first
+# byte is not valid UTF-8 and differs from Parquet's "PAR1", so uncompressed
+# JSON and Parquet written before compression existed are still read as-is.
+MAGIC = b"\x89MBZ"
+
+_CODEC_IDS = {"gzip": 1, "lzma": 2, "zstd": 3, "lz4": 4}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+
+
+def available_codecs():
+    """List the codecs usable in this environment, fastest first"""
+    codecs = []
+    if zstandard is not None:
+        codecs.append("zstd")
+    if lz4_frame is not None:
+        codecs.append("lz4")
+    return codecs + ["gzip", "lzma"]
+
+
+def default_codec():
+    """
+    Codec used when none is given: ``MAGICBOOK_CACHE_CODEC`` if set, otherwise
+    zstd when installed, otherwise gzip.
+    """
+    codec = os.environ.get("MAGICBOOK_CACHE_CODEC")
+    if codec:
+        return codec
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def compress(data, codec=None):
+    """
+    Compress bytes and prefix them with the format header.
+
+    Args:
+        data: Bytes to compress
+        codec: "zstd", "lz4", "gzip", "lzma", or "none" (defaults to ``default_codec()``)
+
+    Returns:
+        bytes: Header + compressed payload, or ``data`` unchanged for "none"
+    """
+    codec = codec or default_codec()
+    if codec == "none":
+        return data
+    if codec not in available_codecs():
+        logging.warning(f"Compression codec '{codec}' is not available, using gzip")
+        codec = "gzip"
+
+    if codec == "zstd":
+        payload = zstandard.ZstdCompressor(level=10).compress(data)
+    elif codec == "lz4":
+        payload = lz4_frame.compress(data)
+    elif codec == "lzma":
+        payload = lzma.compress(data, preset=6)
+    else:
+        payload = gzip.compress(data, compresslevel=6, mtime=0)
+    return MAGIC + bytes([_CODEC_IDS[codec]]) + payload
+
+
+def is_compressed(data):
+    """Return True if the bytes carry the compression header"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def decompress(data):
+    """
+    Undo ``compress``. Data without the header is returned unchanged, so
+    files written before compression was introduced keep loading.
+
+    Raises:
+        ValueError: If the header names a codec that is unknown or not installed
+    """
+    if not is_compressed(data):
+        return data
+
+    codec = _CODEC_NAMES.get(data[len(MAGIC)])
+    payload = data[len(MAGIC) + 1:]
+    if codec == "gzip":
+        return gzip.decompress(payload)
+    if codec == "lzma":
+        return lzma.decompress(payload)
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == "lz4" and lz4_frame is not None:
+        return lz4_frame.decompress(payload)
+    raise ValueError(f"Cannot decompress data written with codec '{codec}' (not installed?)")
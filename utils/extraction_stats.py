@@ -0,0 +1,263 @@
+"""
+Per-step extraction statistics: for every processed book, how many rows each
+entity/relationship step yielded and what it cost (calls, latency, tokens).
+
+Stored in SQLite so cost versus value per step can be queried directly, e.g.
+
+    python -m utils.extraction_stats [--model gemini-2.0-flash] [--genre fantasy]
+    sqlite3 .magic_cache/extraction_stats.sqlite3 "SELECT * FROM step_runs"
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from utils.artifact_store import DEFAULT_ROOT
+
+STATS_DB = os.environ.get("MAGICBOOK_STATS_DB", str(DEFAULT_ROOT / "extraction_stats.sqlite3"))
+# "full" extracts every discovered step; "fast" skips or deprioritizes historically low-yield steps
+PROFILE = os.environ.get("MAGICBOOK_PROFILE", "full").lower()
+# A step needs this many recorded runs before the planner trusts its history
+MIN_RUNS = 3
+# Under the fast profile, steps empty in at least this share of runs are skipped
+MAX_EMPTY_RATE = 0.75
+# A skipped step runs again after this many skips in a row, so its history keeps
+# being checked against new books (0 never re-probes)
+REPROBE_EVERY = int(os.environ.get("MAGICBOOK_REPROBE_EVERY", 5))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS step_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_at REAL NOT NULL,
+    book_name TEXT,
+    genre TEXT,
+    model TEXT,
+    step_kind TEXT NOT NULL,        -- "entity" or "relationship"
+    step_name TEXT NOT NULL,        -- EntityType / RelationshipType name
+    method TEXT,                    -- "model", "grouped", "cooccurrence", "derived" or "structure"
+    status TEXT,
+    rows INTEGER,
+    calls REAL,
+    latency_s REAL,
+    input_tokens REAL,
+    output_tokens REAL
+);
+CREATE INDEX IF NOT EXISTS step_runs_step ON step_runs (step_kind, step_name);
+CREATE TABLE IF NOT EXISTS step_skips (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    skipped_at REAL NOT NULL,
+    profile TEXT,
+    step_kind TEXT NOT NULL,
+    step_name TEXT NOT NULL,
+    runs INTEGER,                   -- recorded runs the decision was based on
+    empty_rate REAL
+);
+CREATE INDEX IF NOT EXISTS step_skips_step ON step_skips (step_kind, step_name);
+"""
+_LOCK = threading.Lock()
+
+
+def _connect(db_path=None):
+    db_path = db_path or STATS_DB
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def record_runs(runs, book_name=None, genre=None, model=None, db_path=None):
+    """
+    Persist the step statistics of one processed book.
+
+    Args:
+        runs: List of dicts with step_kind, step_name, method, status, rows,
+            calls, latency_s, input_tokens, output_tokens
+        book_name: Name of the book
+        genre: Genre of the book, if known
+        model: Name of the chat model used
+        db_path: SQLite file (default MAGICBOOK_STATS_DB)
+    """
+    run_at = time.time()
+    columns = ("step_kind", "step_name", "method", "status", "rows", "calls", "latency_s",
+               "input_tokens", "output_tokens")
+    values = [(run_at, book_name, genre, model, *(run.get(column) for column in columns)) for run in runs]
+    with _LOCK, closing(_connect(db_path)) as connection, connection:
+        connection.executemany(
+            f"INSERT INTO step_runs (run_at, book_name, genre, model, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 4))})", values)
+    logging.info(f"Recorded extraction stats for {len(values)} steps of '{book_name}'")
+
+
+def step_summary(model=None, genre=None, db_path=None):
+    """
+    Aggregate the recorded runs per step. Failed steps are left out, so an
+    error is not mistaken for a step with nothing to find.
+
+    Args:
+        model: Only count runs with this chat model
+        genre: Only count runs of books of this genre
+        db_path: SQLite file (default MAGICBOOK_STATS_DB)
+
+    Returns:
+        dict: {(step_kind, step_name): {"runs", "avg_rows", "empty_rate",
+        "avg_calls", "avg_latency_s", "avg_tokens", "rows_per_1k_tokens"}}
+    """
+    where, params = ["status = 'completed'"], []
+    if model:
+        where.append("model = ?")
+        params.append(model)
+    if genre:
+        where.append("genre = ?")
+        params.append(genre)
+    query = f"""
+        SELECT step_kind, step_name, COUNT(*), AVG(rows), AVG(rows = 0), AVG(calls), AVG(latency_s),
+               AVG(COALESCE(input_tokens, 0) + COALESCE(output_tokens, 0))
+        FROM step_runs WHERE {" AND ".join(where)}
+        GROUP BY step_kind, step_name
+    """
+    try:
+        with _LOCK, closing(_connect(db_path)) as connection:
+            result = connection.execute(query, params).fetchall()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read extraction stats: {e}")
+        return {}
+
+    summary = {}
+    for kind, name, runs, avg_rows, empty_rate, avg_calls, avg_latency, avg_tokens in result:
+        summary[(kind, name)] = {
+            "runs": runs,
+            "avg_rows": round(avg_rows or 0, 2),
+            "empty_rate": round(empty_rate or 0, 3),
+            "avg_calls": round(avg_calls or 0, 2),
+            "avg_latency_s": round(avg_latency or 0, 2),
+            "avg_tokens": round(avg_tokens or 0),
+            "rows_per_1k_tokens": round(1000 * (avg_rows or 0) / avg_tokens, 3) if avg_tokens else None,
+        }
+    return summary
+
+
+def record_skips(skips, profile=PROFILE, db_path=None):
+    """
+    Persist the steps a profile skipped for one book.
+
+    Args:
+        skips: List of ((step_kind, step_name), step_summary stats) pairs
+        profile: Profile that made the decision
+        db_path: SQLite file (default MAGICBOOK_STATS_DB)
+    """
+    skipped_at = time.time()
+    values = [(skipped_at, profile, kind, name, stats["runs"], stats["empty_rate"])
+              for (kind, name), stats in skips]
+    with _LOCK, closing(_connect(db_path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO step_skips (skipped_at, profile, step_kind, step_name, runs, empty_rate) "
+            "VALUES (?, ?, ?, ?, ?, ?)", values)
+
+
+def skip_streaks(db_path=None):
+    """
+    Count, per step, how many times it was skipped since it last ran.
+
+    Returns:
+        dict: {(step_kind, step_name): skips since the step's latest recorded run}
+    """
+    query = """
+        SELECT s.step_kind, s.step_name, COUNT(*) FROM step_skips s
+        WHERE s.skipped_at > COALESCE((SELECT MAX(r.run_at) FROM step_runs r
+                                       WHERE r.step_kind = s.step_kind AND r.step_name = s.step_name), 0)
+        GROUP BY s.step_kind, s.step_name
+    """
+    try:
+        with _LOCK, closing(_connect(db_path)) as connection:
+            return {(kind, name): count for kind, name, count in connection.execute(query).fetchall()}
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read extraction skip stats: {e}")
+        return {}
+
+
+def plan_steps(entities, relationships, profile=PROFILE, summary=None, streaks=None, db_path=None):
+    """
+    Apply an extraction profile to the discovered steps using their history.
+
+    Under the "full" profile nothing changes. Under "fast", steps with at
+    least MIN_RUNS recorded runs that came back empty in MAX_EMPTY_RATE of
+    them are skipped, and the remaining relationship types are ordered by
+    rows per token, so low-value steps run last. A step skipped
+    REPROBE_EVERY - 1 times in a row runs again on the next book, so a step
+    whose history is out of date can earn its place back.
+
+    Args:
+        entities: Entity type names
+        relationships: Relationship type names
+        profile: "full" or "fast"
+        summary: step_summary() result; when None it is read from the stats
+            store, together with the skip streaks, and skip decisions are
+            recorded there
+        streaks: skip_streaks() result, when ``summary`` is given
+        db_path: SQLite file (default MAGICBOOK_STATS_DB)
+
+    Returns:
+        tuple: (entities, relationships) to extract
+    """
+    if profile != "fast":
+        return entities, relationships
+    from_store = summary is None
+    if from_store:
+        summary = step_summary(db_path=db_path)
+        streaks = skip_streaks(db_path)
+    streaks = streaks or {}
+    skips, reprobed = [], []
+
+    def skipped(kind, name):
+        stats = summary.get((kind, name))
+        if not (stats and stats["runs"] >= MIN_RUNS and stats["empty_rate"] >= MAX_EMPTY_RATE):
+            return False
+        if REPROBE_EVERY and streaks.get((kind, name), 0) >= REPROBE_EVERY - 1:
+            reprobed.append(name)
+            return False
+        skips.append(((kind, name), stats))
+        return True
+
+    def value(name):
+        stats = summary.get(("relationship", name))
+        # Steps without history keep their place ahead of known low-value ones
+        if not stats or stats["runs"] < MIN_RUNS or stats["rows_per_1k_tokens"] is None:
+            return float("inf")
+        return stats["rows_per_1k_tokens"]
+
+    kept_entities = [name for name in entities if not skipped("entity", name)]
+    kept_relationships = sorted((name for name in relationships if not skipped("relationship", name)),
+                                key=value, reverse=True)
+    dropped = sorted(set(entities) - set(kept_entities)) + sorted(set(relationships) - set(kept_relationships))
+    if dropped:
+        logging.info(f"Fast profile skips historically empty steps: {', '.join(dropped)}")
+    if reprobed:
+        logging.info(f"Fast profile re-probes long-skipped steps: {', '.join(reprobed)}")
+    if from_store and skips:
+        try:
+            record_skips(skips, profile, db_path)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not record skipped steps: {e}")
+    return kept_entities, kept_relationships
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost versus value of each extraction step")
+    parser.add_argument("--model", help="Only runs with this chat model")
+    parser.add_argument("--genre", help="Only runs of books of this genre")
+    parser.add_argument("--db", help="SQLite file (default MAGICBOOK_STATS_DB)")
+    args = parser.parse_args()
+
+    summary = step_summary(args.model, args.genre, args.db)
+    print(f"{'step':<40} {'runs':>5} {'rows':>7} {'empty':>6} {'calls':>6} {'latency':>8} {'tokens':>9} {'rows/1k tok':>11}")
+    for (kind, name), stats in sorted(summary.items(), key=lambda item: item[1]["rows_per_1k_tokens"] or 0):
+        print(f"{kind[:3] + ':' + name:<40} {stats['runs']:>5} {stats['avg_rows']:>7} {stats['empty_rate']:>6.0%} "
+              f"{stats['avg_calls']:>6} {stats['avg_latency_s']:>7}s {stats['avg_tokens']:>9} "
+              f"{stats['rows_per_1k_tokens'] if stats['rows_per_1k_tokens'] is not None else '-':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,324 @@
 import os
 import json
+import time
+import hashlib
 import logging
 import PyPDF2
 import tempfile
 import requests
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
 
-def extract_text_from_pdf(pdf_path):
+from utils.compression import compress, decompress
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Parallel PDF extraction: worker processes, and the fewest pages worth a worker
+PDF_WORKERS = int(os.environ.get("MAGICBOOK_PDF_WORKERS", os.cpu_count() or 1))
+PDF_MIN_PAGES_PER_WORKER = 32
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract the text of pages [start, stop) (runs in a worker process)"""
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    return [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, stop)]
+
+def _iter_page_range(pdf_path, start, stop):
+    """Extract pages [start, stop) in this process, one page at a time"""
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    for page_num in range(start, stop):
+        yield pdf_reader.pages[page_num].extract_text() or ""
+
+def read_pdf_info(pdf_path):
+    """
+    Read the title and author from a PDF's document info, and its page count.
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        dict: {"title", "author", "page_count"}; title/author are None when
+        missing or unreadable
+    """
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    info = {"title": None, "author": None, "page_count": len(pdf_reader.pages)}
+    try:
+        document_info = pdf_reader.metadata or {}
+        for field, key in (("title", "/Title"), ("author", "/Author")):
+            value = document_info.get(key)
+            if isinstance(value, str) and value.strip():
+                info[field] = value.strip()
+    except Exception as e:
+        logging.warning(f"Could not read PDF document info: {e}")
+    return info
+
+def _iter_page_texts(pdf_path, workers=None):
+    """
+    Yield the text of each page in order, sharding page ranges across a
+    process pool. At most two shards per worker are in flight, so the
+    workers never run far ahead of the consumer.
+    """
+    page_count = len(PyPDF2.PdfReader(pdf_path).pages)
+    workers = min(workers or PDF_WORKERS, max(1, page_count // PDF_MIN_PAGES_PER_WORKER))
+    if workers <= 1:
+        yield from _iter_page_range(pdf_path, 0, page_count)
+        return
+
+    # A few shards per worker so one slow range doesn't leave the others idle
+    shard_size = max(PDF_MIN_PAGES_PER_WORKER // 2, -(-page_count // (workers * 4)))
+    shards = iter([(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)])
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque(executor.submit(_extract_page_range, str(pdf_path), start, stop)
+                              for start, stop in islice(shards, workers * 2))
+            while in_flight:
+                page_texts = in_flight.popleft().result()
+                for start, stop in islice(shards, 1):
+                    in_flight.append(executor.submit(_extract_page_range, str(pdf_path), start, stop))
+                for page_text in page_texts:
+                    yield page_text
+                    done += 1
+    except (OSError, BrokenProcessPool) as e:
+        logging.warning(f"Parallel PDF extraction unavailable ({e}), extracting sequentially")
+        yield from _iter_page_range(pdf_path, done, page_count)
+
+def iter_pdf_pages(pdf_path, workers=None):
+    """
+    Stream the pages of a PDF as records, in page order.
+    
+    Offsets refer to the book text as assembled by ``join_pages`` (each
+    non-empty page followed by a newline), so pages can be processed and
+    reported on as they arrive. Only the extraction workers' window of pages
+    is bounded; callers that assemble the book still hold all of its text.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Worker processes (defaults to MAGICBOOK_PDF_WORKERS or the CPU count)
+        
+    Yields:
+        dict: {"page_index", "text", "start", "end"} where text[start:end]
+        of the joined book text is this page (including its newline)
+    """
+    offset = 0
+    for page_index, page_text in enumerate(_iter_page_texts(pdf_path, workers=workers)):
+        length = len(page_text) + 1 if page_text else 0
+        yield {"page_index": page_index, "text": page_text, "start": offset, "end": offset + length}
+        offset += length
+
+def extract_pages_from_pdf(pdf_path, workers=None):
+    """
+    Extract the text of every page of a PDF, in page order.
+    
+    Page ranges are sharded across a process pool (each worker opens the
+    file itself); small PDFs, ``workers=1`` or a pool that cannot start
+    fall back to extracting in this process.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Worker processes (defaults to MAGICBOOK_PDF_WORKERS or the CPU count)
+        
+    Returns:
+        list: Text of each page ("" for pages without text)
+    """
+    return list(_iter_page_texts(pdf_path, workers=workers))
+
+def copy_stream_to_file(stream, filepath, chunk_size=1024 * 1024, hasher=None):
+    """
+    Copy a file-like object (e.g. a Streamlit upload) to disk in chunks
+    instead of materialising it as one buffer.
+    
+    Args:
+        stream: Readable binary file-like object
+        filepath: Destination path
+        chunk_size: Bytes per read
+        hasher: Optional hashlib object updated with every chunk, so the
+            content hash comes for free with the copy
+    
+    Returns:
+        int: Bytes written
+    """
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    written = 0
+    with open(filepath, "wb") as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            written += len(chunk)
+    return written
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def join_pages(pages):
+    """
+    Join page texts into the book text, one newline after each non-empty page.
+    
+    Args:
+        pages: List of page texts
+        
+    Returns:
+        tuple: (text, page_offsets) where page_offsets[i] is the character
+        offset at which page i starts in text
+    """
+    parts = []
+    page_offsets = []
+    offset = 0
+    for page_text in pages:
+        page_offsets.append(offset)
+        if page_text:
+            parts.append(page_text)
+            parts.append("\n")
+            offset += len(page_text) + 1
+    return "".join(parts), page_offsets
+
+def extract_text_with_offsets(pdf_path, workers=None):
+    """
+    Extract the text of a PDF together with the offset of each page.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Worker processes (see ``extract_pages_from_pdf``)
+        
+    Returns:
+        tuple: (text, page_offsets)
+        
+    Raises:
+        Exception: Any error raised while reading the PDF
+    """
+    start_time = time.perf_counter()
+    pages = extract_pages_from_pdf(pdf_path, workers=workers)
+    text, page_offsets = join_pages(pages)
+    logging.debug(f"Extracted {len(text)} characters from {len(pages)} pages of {pdf_path} "
+                  f"in {time.perf_counter() - start_time:.2f}s")
+    return text, page_offsets
+
+def extract_text_from_pdf(pdf_path, workers=None):
     """
     Extract text from a PDF file with no length constraints.
     
     Args:
         pdf_path: Path to the PDF file
+        workers: Worker processes (see ``extract_pages_from_pdf``)
         
     Returns:
         str: Extracted text from PDF
     """
-    logging.debug(f"Starting PDF text extraction from file: {pdf_path}")
-    text = ""
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_path)
-        logging.debug(f"Opened PDF file successfully. Total pages: {len(pdf_reader.pages)}")
-        
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            page_text = page.extract_text()
-            
-            # Log the first 100 characters from the page's text for debugging
-            if page_text:
-                logging.debug(f"Page {page_num+1} extracted text (first 100 chars): {page_text[:100]}...")
-                text += page_text + "\n"
-            else:
-                logging.debug(f"No text found on page {page_num + 1}")
+        text, _ = extract_text_with_offsets(pdf_path, workers=workers)
     except Exception as e:
         error_msg = f"Error extracting text from PDF: {str(e)}"
         logging.error(error_msg)
         return error_msg
-    
-    logging.debug(f"Completed PDF text extraction. Total extracted text length: {len(text)} characters")
     return text
 
-def save_json(data, filepath):
-    """Save data as JSON to a file"""
+def atomic_write_bytes(filepath, data):
+    """
+    Write bytes to a file so readers only ever see the old or the new contents.
+
+    The data is written to a temporary file in the same directory, flushed to
+    disk and then renamed over the target, so a crash mid-write never leaves
+    a truncated file behind.
+
+    Args:
+        filepath: Target file path
+        data: Bytes to write
+    """
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+@contextmanager
+def file_lock(lock_path, timeout=None, poll_interval=0.1):
+    """
+    Hold an exclusive advisory lock on a lock file, across processes.
+
+    Args:
+        lock_path: Path of the lock file (created if missing)
+        timeout: Seconds to wait for the lock; None waits forever, 0 fails immediately
+        poll_interval: Seconds between attempts while waiting
+
+    Raises:
+        TimeoutError: If the lock could not be acquired within ``timeout``
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    with open(lock_path, 'a+b') as f:
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {lock_path}")
+                time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def save_json(data, filepath, codec=None):
+    """
+    Save data as JSON to a file (atomically).
+
+    With a ``codec`` (see utils.compression) the JSON is written compactly
+    and compressed; ``load_json`` reads both forms.
+    """
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if codec:
+            payload = compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), codec)
+        else:
+            payload = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        atomic_write_bytes(filepath, payload)
         return True
     except Exception as e:
         logging.error(f"Error saving JSON file: {e}")
         return False
 
 def load_json(filepath):
-    """Load JSON data from a file"""
+    """Load JSON data from a file, plain or compressed"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            return json.loads(decompress(f.read()).decode('utf-8'))
     except FileNotFoundError:
         logging.warning(f"File not found: {filepath}")
         return None
@@ -2,6 +2,7 @@ import logging
 import networkx as nx
 
 from model.entity_types import RelationshipType
+from utils.extraction_stats import plan_steps
 
 def extract_edge_ids(rel_type, relationship):
     """
@@ -99,13 +100,20 @@ def ensure_consistency(
         relationships: list[str],
         reference_mappings: dict,
         threshold: int = 1,
-        log_unknown: bool = True
+        log_unknown: bool = True,
+        profile: str = "full",
+        step_summary: dict | None = None
     ) -> tuple[list[str], list[str]]:
     """
     Remove relationship names that are not recognised and ensure that every
     kept relationship’s required entity types are present (adding them when
     they appear at least `threshold` times).
 
+    Under the "fast" profile, steps that were historically empty are
+    dropped first and low-yield relationships moved last
+    (utils.extraction_stats.plan_steps, using `step_summary` or the
+    recorded stats).
+
     Returns
     -------
     (updated_entities, updated_relationships)
@@ -125,6 +133,11 @@ def ensure_consistency(
             continue
         valid_relationships.append(rel)
 
+    # ── 1b. let the profile planner prune/reorder steps by their history ─
+    entities, valid_relationships = plan_steps(list(entities_set), valid_relationships,
+                                               profile=profile, summary=step_summary)
+    entities_set = set(entities)
+
     # ── 2. count missing entity occurrences in the valid relationships ──
     missing_counts: dict[str, int] = {}
     for rel in valid_relationships:
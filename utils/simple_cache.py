@@ -1,29 +1,79 @@
 # utils/simple_cache.py
-import json, hashlib, os
+import json, hashlib, logging, time
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
 
+from utils.artifact_store import get_store, put_records_map, get_records_map, encode_json, decode_json
+
 _CACHE_DIR = Path(".magic_cache")      # keep it local to the project root
-_CACHE_DIR.mkdir(exist_ok=True)
+_NAMESPACE = "extractions/"
+# Part written last by ``save``; entries without it are incomplete and count as misses
+_COMPLETE_PART = "complete"
 
-def _key(book_name: str, book_text: str) -> Path:
+def _slug_hash(book_name: str, book_text: str) -> str:
     """
-    Deterministic file name = slug(book_name) + 8‑char hash(book_text)
+    Deterministic id = slug(book_name) + 8‑char hash(book_text)
     """
     slug = "".join(c if c.isalnum() else "_" for c in book_name.lower())[:50]
     book_hash = hashlib.sha256(book_text.encode("utf-8")).hexdigest()[:8]
-    return _CACHE_DIR / f"{slug}_{book_hash}.json"
+    return f"{slug}_{book_hash}"
+
+def _legacy_path(book_name: str, book_text: str) -> Path:
+    """Flat JSON file used before the shared artifact store"""
+    return _CACHE_DIR / f"{_slug_hash(book_name, book_text)}.json"
 
 def load(book_name: str, book_text: str):
-    fp = _key(book_name, book_text)
+    store = get_store()
+    entry_id = _NAMESPACE + _slug_hash(book_name, book_text)
+    if _COMPLETE_PART in store.parts(entry_id, prefix=_COMPLETE_PART):
+        summary = store.get(entry_id, "summary.json")
+        return {"entities_map": get_records_map(store, entry_id, "entities") or {},
+                "relationships_map": get_records_map(store, entry_id, "relationships") or {},
+                "summary": decode_json(summary).get("summary", "") if summary else ""}
+
+    fp = _legacy_path(book_name, book_text)
     if fp.exists():
         try:
-            return json.loads(fp.read_text())
+            cached = json.loads(fp.read_text())
         except Exception:
-            fp.unlink(missing_ok=True)   # corrupted → ignore
+            # corrupted → set aside (never delete: it may be someone's finished extraction)
+            quarantined = fp.with_name(f"{fp.name}.corrupt-{int(time.time())}")
+            fp.replace(quarantined)
+            logging.warning(f"Unreadable cache file moved to {quarantined}")
+            return None
+        # copy the legacy file into the store so later loads read it from there; the file
+        # itself is left alone (the sample extractions are tracked in the repository)
+        save(book_name, book_text, cached["entities_map"], cached["relationships_map"])
+        return cached
     return None
 
-def save(book_name: str, book_text: str, entities_map, relationships_map):
-    fp = _key(book_name, book_text)
-    fp.write_text(json.dumps(
-        {"entities_map": entities_map, "relationships_map": relationships_map},
-        ensure_ascii=False))
+def save(book_name: str, book_text: str, entities_map, relationships_map, summary=None):
+    store = get_store()
+    entry_id = _NAMESPACE + _slug_hash(book_name, book_text)
+    # All parts land in one index update, and the completion marker goes last
+    with store.transaction():
+        put_records_map(store, entry_id, "entities", entities_map)
+        put_records_map(store, entry_id, "relationships", relationships_map)
+        if summary:
+            store.put(entry_id, "summary.json", encode_json({"summary": summary}))
+        store.put(entry_id, _COMPLETE_PART, b"1")
+
+@contextmanager
+def writer_lock(book_name: str, book_text: str, on_wait=None):
+    """
+    Make this process the single writer for a book's extraction.
+
+    If another worker already holds the lock, ``on_wait`` is called and we
+    block until it finishes; the caller should then re-check ``load`` and
+    reuse that worker's result instead of extracting again.
+    """
+    store = get_store()
+    entry_id = _NAMESPACE + _slug_hash(book_name, book_text)
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(store.writer_lock(entry_id, timeout=0))
+        except TimeoutError:
+            if on_wait:
+                on_wait()
+            stack.enter_context(store.writer_lock(entry_id))
+        yield
@@ -0,0 +1,52 @@
+# utils/text_cache.py
+import logging, time
+
+from utils.artifact_store import get_store, encode_json, decode_json
+
+_NAMESPACE = "texts/"
+# Bump when the stored text changes shape (e.g. new normalization) so old entries are not reused
+TEXT_FORMAT_VERSION = 2
+
+def _entry_id(pdf_hash: str) -> str:
+    return f"{_NAMESPACE}v{TEXT_FORMAT_VERSION}_{pdf_hash}"
+
+def load(pdf_hash: str):
+    """
+    Return ``(text, info)`` extracted earlier from a PDF with this sha256,
+    or None. ``info`` holds the extraction metadata (page_count,
+    page_offsets, chars, ...).
+    """
+    store = get_store()
+    entry_id = _entry_id(pdf_hash)
+    if not store.contains(entry_id):
+        return None
+    try:
+        text = store.get(entry_id, "text.txt")
+        info = store.get(entry_id, "info.json")
+        if text is None or info is None:
+            return None
+        return text.decode("utf-8"), decode_json(info)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable extracted text {entry_id}: {e}")
+        return None
+
+def save(pdf_hash: str, text: str, page_offsets, **extra):
+    """
+    Cache the text extracted from a PDF (compressed in the artifact store).
+
+    Args:
+        pdf_hash: sha256 of the PDF bytes
+        text: Extracted text
+        page_offsets: Start offset of each page in ``text``
+        extra: Additional metadata to record (e.g. source_bytes)
+
+    Returns:
+        dict: The recorded extraction metadata
+    """
+    info = {"page_count": len(page_offsets), "page_offsets": page_offsets,
+            "chars": len(text), "extracted_at": time.time(), **extra}
+    store = get_store()
+    entry_id = _entry_id(pdf_hash)
+    store.put(entry_id, "text.txt", text.encode("utf-8"))
+    store.put(entry_id, "info.json", encode_json(info))
+    return info
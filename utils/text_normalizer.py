@@ -0,0 +1,168 @@
+import logging
+import re
+from collections import Counter
+
+# Lines at the top/bottom of a page that may be running headers or footers
+EDGE_LINES = 3
+# A header/footer must repeat on at least this share of pages (and on 3 pages)
+MIN_REPEAT_FRACTION = 0.2
+
+# Digits or a well-formed lowercase roman numeral below 400 (front matter pages), so words
+# spelled with numeral letters ("mid", "civil", "vivid") are not taken for page numbers;
+# "IV" alone may be a chapter heading
+_ROMAN_PAGE = r"(?=[ivxlc])c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})"
+_PAGE_NUMBER = re.compile(rf"^\W*(?:[Pp]age\s+)?(?:\d{{1,4}}|{_ROMAN_PAGE})(?:\s+of\s+\d{{1,4}})?\W*$")
+_HYPHEN_BREAK = re.compile(r"([A-Za-z]{2,})-[ \t]*\n[ \t]*([a-z]{2,})")
+_WORD = re.compile(r"[A-Za-z]+(?:-[A-Za-z]+)*")
+_SPACE_RUN = re.compile(r"[ \t ]+")
+_BLANK_RUN = re.compile(r"\n{3,}")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Rough model token count: words and punctuation marks. Good enough to
+    compare two versions of the same text; not a tokenizer.
+    """
+    return len(_TOKEN.findall(text))
+
+
+def _signature(line):
+    """Normalize a line so 'Chapter 3 - 41' and 'Chapter 3 - 42' compare equal"""
+    return re.sub(r"\d+", "#", _SPACE_RUN.sub(" ", line.strip().lower()))
+
+
+def _edge_indexes(lines):
+    """Indexes of the first and last EDGE_LINES non-empty lines"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def find_repeated_lines(pages):
+    """
+    Find running headers and footers: edge lines whose signature appears on
+    many pages.
+
+    Args:
+        pages: List of page texts
+
+    Returns:
+        set: Line signatures to strip
+    """
+    counts = Counter()
+    pages_with_text = 0
+    for page_text in pages:
+        if not page_text:
+            continue
+        pages_with_text += 1
+        lines = page_text.splitlines()
+        counts.update({_signature(lines[i]) for i in _edge_indexes(lines)})
+    threshold = max(3, MIN_REPEAT_FRACTION * pages_with_text)
+    return {signature for signature, count in counts.items() if signature and count >= threshold}
+
+
+def book_vocabulary(pages):
+    """
+    Collect the words of a book, to decide how to rejoin words hyphenated
+    across line breaks (see ``clean_page``).
+
+    Returns:
+        tuple: (words, compounds) as lowercase sets; compounds are the
+        hyphenated forms written on one line ("well-known")
+    """
+    words, compounds = set(), set()
+    for page_text in pages:
+        for token in _WORD.findall(page_text or ""):
+            token = token.lower()
+            (compounds if "-" in token else words).add(token)
+    return words, compounds
+
+
+def _join_hyphen_break(match, vocabulary):
+    """
+    Rejoin a line-break hyphenation. With a vocabulary, the hyphen is
+    dropped only when the joined word occurs elsewhere in the book and the
+    hyphenated form does not, so "well-\\nknown" stays "well-known".
+    """
+    head, tail = match.group(1), match.group(2)
+    if vocabulary is not None:
+        words, compounds = vocabulary
+        joined = f"{head}{tail}".lower()
+        if f"{head}-{tail}".lower() in compounds or joined not in words:
+            return f"{head}-{tail}"
+    return f"{head}{tail}"
+
+
+def _is_artifact(line, repeated, seen):
+    stripped = line.strip()
+    if _PAGE_NUMBER.match(stripped):
+        return True
+    signature = _signature(line)
+    if signature not in repeated:
+        return False
+    # Keep the first occurrence: a chapter heading at the top of its first
+    # page looks like the running header that repeats it on later pages.
+    # Compare signatures, so headers carrying the page number count as repeats
+    if seen is None or signature in seen:
+        return True
+    seen.add(signature)
+    return False
+
+
+def clean_page(page_text, repeated=frozenset(), seen=None, vocabulary=None):
+    """
+    Strip header/footer and page-number lines from a page, rejoin words
+    hyphenated across line breaks and collapse whitespace.
+
+    Args:
+        page_text: Text of one page
+        repeated: Signatures from ``find_repeated_lines``
+        seen: Set shared across the pages of a book; when given, the first
+            occurrence of each repeated line is kept
+        vocabulary: Optional ``book_vocabulary`` result; when given, real
+            compounds broken across lines keep their hyphen
+
+    Returns:
+        str: The cleaned page text
+    """
+    if not page_text:
+        return page_text
+    lines = page_text.splitlines()
+    edges = _edge_indexes(lines)
+    kept = [line for i, line in enumerate(lines)
+            if i not in edges or not _is_artifact(line, repeated, seen)]
+    text = "\n".join(_SPACE_RUN.sub(" ", line).strip() for line in kept)
+    text = _HYPHEN_BREAK.sub(lambda match: _join_hyphen_break(match, vocabulary), text)
+    return _BLANK_RUN.sub("\n\n", text).strip("\n")
+
+
+def normalize_pages(pages):
+    """
+    Remove PDF artifacts from every page and measure the saving.
+
+    Args:
+        pages: List of page texts
+
+    Returns:
+        tuple: (cleaned pages, report) where report has raw/clean character
+        and estimated token counts, the token reduction (0-1) and how many
+        repeated header/footer patterns were found
+    """
+    repeated = find_repeated_lines(pages)
+    seen = set()
+    vocabulary = book_vocabulary(pages)
+    cleaned = [clean_page(page_text, repeated, seen, vocabulary) for page_text in pages]
+
+    raw_tokens = sum(estimate_tokens(page_text) for page_text in pages)
+    tokens = sum(estimate_tokens(page_text) for page_text in cleaned)
+    report = {
+        "raw_chars": sum(len(page_text) for page_text in pages),
+        "chars": sum(len(page_text) for page_text in cleaned),
+        "raw_tokens_est": raw_tokens,
+        "tokens_est": tokens,
+        "token_reduction": round(1 - tokens / raw_tokens, 4) if raw_tokens else 0.0,
+        "repeated_line_patterns": len(repeated),
+    }
+    logging.info(f"Normalized PDF text: ~{raw_tokens:,} -> ~{tokens:,} tokens "
+                 f"({report['token_reduction']:.1%} fewer, {len(repeated)} header/footer patterns)")
+    return cleaned, report